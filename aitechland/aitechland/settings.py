@@ -86,6 +86,20 @@ DATABASES = {
     }
 }
 
+# Caches
+# The metadata cache is file based so that the web server and every daemon
+# process see the same metadata registry version.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'metadata': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'metadata'),
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -126,6 +140,88 @@ file_name = 'best_main.pt'
 NEURAL_PATH = os.path.join(weights_folder, file_name)
 CAMERA_SAVE_INTERVAL = 120
 
+# Shared inference server: frames from all cameras are batched up to this size,
+# waiting at most INFERENCE_MAX_WAIT seconds after the first frame of a batch.
+INFERENCE_MAX_BATCH_SIZE = 16
+INFERENCE_MAX_WAIT = 0.05
+INFERENCE_TIMEOUT = 10
+# Shared-memory frame slots per camera; frames are passed to the inference server by reference.
+INFERENCE_RING_SLOTS = 8
+
+# Detector runtime: 'torch' runs NEURAL_PATH directly, 'onnxruntime' and 'openvino' run the
+# model written by `manage.py export_model` next to it unless INFERENCE_MODEL_PATH is set.
+INFERENCE_BACKEND = 'torch'
+INFERENCE_MODEL_PATH = None
+# Run the INT8 model written by `manage.py quantize_model` (onnxruntime backend only).
+INFERENCE_QUANTIZED = False
+
+# Host-wide scheduler: cameras send a frame every SCHEDULER_BASE_INTERVAL seconds, every
+# SCHEDULER_ACTIVE_INTERVAL while they detect a class in SCHEDULER_CLASS_PRIORITY and every
+# SCHEDULER_IDLE_INTERVAL after SCHEDULER_IDLE_AFTER quiet seconds. When the cameras need more than
+# SCHEDULER_BUDGET of the inference server's time, lower priorities are slowed down first, up to
+# SCHEDULER_MAX_INTERVAL.
+SCHEDULER_BUDGET = 0.9
+SCHEDULER_ACTIVE_INTERVAL = 0.25
+SCHEDULER_BASE_INTERVAL = 1.0
+SCHEDULER_IDLE_INTERVAL = 5.0
+SCHEDULER_MAX_INTERVAL = 30.0
+SCHEDULER_IDLE_AFTER = 120
+SCHEDULER_ACTIVE_HOLD = 30
+SCHEDULER_CLASS_PRIORITY = {'fire': 2, 'smoke': 2, 'head': 1}
+
+# Crashed camera workers are restarted after CAMERA_RESTART_BACKOFF seconds,
+# doubling on every consecutive crash up to CAMERA_RESTART_BACKOFF_MAX.
+CAMERA_RESTART_BACKOFF = 5
+CAMERA_RESTART_BACKOFF_MAX = 300
+
+# Camera connections: FFmpeg open/read timeouts (seconds) and the cap for the
+# jittered exponential reconnect backoff.
+CAMERA_OPEN_TIMEOUT = 10
+CAMERA_READ_TIMEOUT = 5
+CAMERA_RECONNECT_DELAY_MAX = 60
+
+# Detection persistence: frames waiting for JPEG encoding per camera, encoder
+# threads per camera, and the host-wide queue of records inserted in batches.
+DETECTION_QUEUE_SIZE = 64
+DETECTION_ENCODE_WORKERS = 2
+DETECTION_RECORD_QUEUE_SIZE = 10000
+DETECTION_BATCH_SIZE = 100
+DETECTION_FLUSH_INTERVAL = 1.0
+
+# Detections of one tracked object form a single event, saved once with its
+# best frame after EVENT_COOLDOWN seconds without a sighting. Events longer
+# than EVENT_MAX_DURATION seconds are saved and reopened.
+EVENT_COOLDOWN = 10
+EVENT_MAX_DURATION = 600
+
+# Motion gate: cameras whose scene does not change skip detection, except for
+# a forced keyframe every MOTION_KEYFRAME_INTERVAL seconds. The per-camera
+# sensitivity is Camera.motion_threshold.
+MOTION_KEYFRAME_INTERVAL = 5
+
+# Prometheus metrics of the daemon and all camera workers are served on
+# http://METRICS_HOST:METRICS_PORT/metrics; set METRICS_PORT = None to disable.
+# Workers push their metrics to the daemon every METRICS_PUSH_INTERVAL seconds.
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9108
+METRICS_PUSH_INTERVAL = 5
+
+# The alarm list counts the matching images at most once per ALARM_COUNT_CACHE_TIMEOUT seconds.
+ALARM_COUNT_CACHE_TIMEOUT = 60
+
+# Per-frame stage tracing. When enabled every daemon process keeps its last TRACE_CAPACITY spans;
+# `manage.py dump_trace` (or SIGUSR1 to the daemon) writes them to TRACE_DIR as Chrome trace JSON.
+TRACE_ENABLED = False
+TRACE_CAPACITY = 20000
+TRACE_DIR = BASE_DIR / 'traces'
+
+# `manage.py retention` keeps alarm images for IMAGE_RETENTION_DAYS days. Per-class and per-camera
+# (by IP address) entries override it; when several apply, the longest one wins.
+IMAGE_RETENTION_DAYS = 90
+IMAGE_RETENTION_CLASS_DAYS = {'fire': 365, 'smoke': 365}
+IMAGE_RETENTION_CAMERA_DAYS = {}
+IMAGE_ARCHIVE_ROOT = os.path.join(BASE_DIR, 'archive')
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
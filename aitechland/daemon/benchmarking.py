@@ -0,0 +1,141 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from daemon.camera_processing.camera_stream_viewer import CameraStreamViewer
+from daemon.metrics import registry
+
+
+class SyntheticSource:
+    """Generated frames: fixed noise with a square moving across it, the same for a given seed."""
+
+    def __init__(self, width: int = 1920, height: int = 1080, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        self.size = max(height // 8, 8)
+        self.position = seed * 97
+
+    def grab(self) -> bool:
+        self.position += 1
+        return True
+
+    def retrieve(self) -> np.ndarray:
+        height, width = self.background.shape[:2]
+        frame = self.background.copy()
+        x = self.position * 7 % (width - self.size)
+        y = self.position * 3 % (height - self.size)
+        cv2.rectangle(frame, (x, y), (x + self.size, y + self.size), (0, 0, 255), -1)
+        return frame
+
+    def release(self):
+        pass
+
+
+class VideoSource:
+    """A local video file decoded like a camera stream, looping at its end. Opened in the worker process."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.capture = None
+
+    def grab(self) -> bool:
+        if self.capture is None:
+            self.capture = cv2.VideoCapture(self.path)
+            if not self.capture.isOpened():
+                raise IOError(f"Cannot open video {self.path}")
+        if self.capture.grab():
+            return True
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return self.capture.grab()
+
+    def retrieve(self) -> np.ndarray:
+        ok, frame = self.capture.retrieve()
+        return frame if ok else None
+
+    def release(self):
+        if self.capture is not None:
+            self.capture.release()
+
+
+class ReplayCameraManager:
+    """
+    Stands in for `CameraManager` with a local source played back at `fps`.
+
+    Like the capture thread of a real camera, every frame that came due since the last read is
+    grabbed (decoded), and only the latest one is converted for analysis.
+    """
+
+    def __init__(self, camera_ip: str, source, fps: float = 25):
+        self.camera_ip = camera_ip
+        self.source = source
+        self.fps = fps
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.frames_grabbed = 0
+        self.frames_retrieved = 0
+        self.frame_seq = None
+
+    def read_frame(self):
+        with self.lock:
+            if self.stop_event.is_set():
+                return None
+            due = int((time.monotonic() - self.started_at) * self.fps) + 1
+            while self.frames_grabbed < due:
+                if not self.source.grab():
+                    return None
+                self.frames_grabbed += 1
+            self.frames_retrieved += 1
+            self.frame_seq = self.frames_grabbed
+            return self.source.retrieve()
+
+    def release(self):
+        self.stop_event.set()
+        with self.lock:
+            self.source.release()
+
+
+def run_benchmark_worker(camera_ip: str, source, inference_client, record_queue, result_queue, duration: float,
+                         frame_rate: float, source_fps: float, save_path: str, motion_threshold: float = 0):
+    """
+    Run the full per-camera pipeline of a daemon worker on `source` for `duration` seconds.
+
+    Puts the camera's analysed-frame latencies and counters on `result_queue` when done.
+    """
+    registry.reset()
+    camera_manager = ReplayCameraManager(camera_ip, source, source_fps)
+    viewer = CameraStreamViewer(f'benchmark://bench@{camera_ip}:0', inference_client, frame_rate, save_path,
+                                record_queue, motion_threshold, camera_manager=camera_manager)
+    processor = viewer.frame_processor
+    process_frame = processor.process_frame
+    latencies = []
+
+    def timed_process_frame(*args, **kwargs):
+        due_before = processor.last_frame_time
+        start = time.perf_counter()
+        result = process_frame(*args, **kwargs)
+        # Calls that came before the frame was due return at once and are not a frame's latency.
+        if processor.last_frame_time != due_before:
+            latencies.append(time.perf_counter() - start)
+        return result
+
+    processor.process_frame = timed_process_frame
+    timer = threading.Timer(duration, camera_manager.stop_event.set)
+    timer.start()
+    try:
+        viewer.start()
+    finally:
+        timer.cancel()
+        viewer.release()
+
+    counters = {name: value for (name, _), value in registry.snapshot()['counters'].items()}
+    result_queue.put({
+        'camera_ip': camera_ip,
+        'latencies': latencies,
+        'frames_grabbed': camera_manager.frames_grabbed,
+        'frames_analysed': len(latencies),
+        'frames_inferred': counters.get('frames_processed_total', 0),
+        'timeouts': counters.get('inference_timeouts_total', 0),
+    })
@@ -1,87 +1,233 @@
 import cv2
+import random
 import threading
 import time
-from datetime import datetime, timedelta
 import logging
+from daemon.metrics import registry
+from daemon.tracing import tracer
 from safety_detection.models import CameraState
 
 logging.basicConfig(level=logging.DEBUG)
 
 
+class ConnectionState:
+    CONNECTING = 'Connecting'
+    ONLINE = 'Online'
+    BACKOFF = 'Backoff'
+    STOPPED = 'Stopped'
+
+
 class CameraManager:
-    def __init__(self, video_url: str, frame_rate: int, reconnect_delay: int = 60):
+    """
+    Owns the connection to one camera through an explicit state machine.
+
+    CONNECTING -> ONLINE on the first successful grab, ONLINE/CONNECTING -> BACKOFF when the stream
+    cannot be opened or a grab fails, BACKOFF -> CONNECTING after a jittered exponential delay capped
+    at `reconnect_delay`. The backoff only resets after the camera stayed online for `stable_after`
+    seconds, so a flapping camera does not hammer the network. The capture is created, used and
+    released by a single capture thread, so no other thread ever swaps it. FFmpeg open/read timeouts
+    bound every blocking call, and a watchdog abandons a capture thread that still hangs past them
+    and starts a fresh one. `lock` guards the state, the generation and the failure counters, which
+    both threads change; a capture thread whose generation is no longer current changes nothing.
+    """
+
+    def __init__(self, video_url: str, frame_rate: int, reconnect_delay: int = 60, open_timeout: float = 10,
+                 read_timeout: float = 5, backoff_base: float = 1, stable_after: float = 30):
         self.video_url = video_url
         self.frame_rate = frame_rate
         self.reconnect_delay = reconnect_delay
-        self.cap = cv2.VideoCapture(video_url)
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+        self.backoff_base = backoff_base
+        self.stable_after = stable_after
         self.camera_ip = self._extract_camera_ip()
-        self.last_error_time = None
-        self.last_state_update_time = datetime.now()
+        self.state = ConnectionState.CONNECTING
+        self.last_state_update_time = 0.0
+        self.last_saved_state = None
+        self.failures = 0
+        self.online_since = None
+        self.reconnects = 0
+        self.generation = 0
+        self.last_progress_time = time.monotonic()
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
         self.stop_event = threading.Event()
+        self.frame_requested = threading.Event()
+        self.frame_ready = threading.Event()
+        self.latest_frame = None
+        self.latest_seq = None
+        # Grab count of the frame `read_frame` returned last: its `seq` in trace spans.
+        self.frame_seq = None
+        self.frames_grabbed = 0
+        self.frames_retrieved = 0
 
-        if self.cap.isOpened():
-            self.cap.set(cv2.CAP_PROP_FPS, self.frame_rate)
-            self.update_camera_state('Online')
-        else:
-            self.update_camera_state('Offline')
-
-        threading.Thread(target=self._reconnect_camera, daemon=True).start()
+        self._start_capture_thread(self.generation)
+        threading.Thread(target=self._watchdog, daemon=True).start()
 
     def _extract_camera_ip(self) -> str:
         return self.video_url.split('@')[1].split(':')[0]
 
     def update_camera_state(self, state: str):
-        current_time = datetime.now()
-        if current_time - self.last_state_update_time >= timedelta(seconds=60):
+        with self.save_lock:
+            current_time = time.monotonic()
+            if state == self.last_saved_state and current_time - self.last_state_update_time < 60:
+                return
             try:
                 CameraState.objects.update_or_create(
                     camera_ip=self.camera_ip,
                     defaults={'state': state}
                 )
                 self.last_state_update_time = current_time
+                self.last_saved_state = state
                 logging.info(f'Camera state updated to {state} for IP: {self.camera_ip}')
             except Exception as e:
                 logging.error(f"Error updating camera state: {e}")
 
-    def read_frame(self):
-        ret, frame = self.cap.read()
-        if not ret:
+    def _set_state(self, state: str, generation: int):
+        with self.lock:
+            if generation != self.generation or self.state == ConnectionState.STOPPED:
+                return
+            previous = self.state
+            if state != previous:
+                self.state = state
+                self.online_since = time.monotonic() if state == ConnectionState.ONLINE else None
+        if state != previous:
+            logging.info(f"Camera {self.camera_ip}: {previous} -> {state}")
+            registry.set('camera_online', int(state == ConnectionState.ONLINE), camera=self.camera_ip)
+        if state == ConnectionState.ONLINE:
+            self.update_camera_state('Online')
+        elif state == ConnectionState.BACKOFF:
             self.update_camera_state('Offline')
-            logging.warning(f"Failed to read frame from camera: {self.camera_ip}")
-            self.last_error_time = datetime.now()
-            self._shutdown_and_reconnect()
+
+    def _start_capture_thread(self, generation: int):
+        self.last_progress_time = time.monotonic()
+        threading.Thread(target=self._capture_loop, args=(generation,), daemon=True).start()
+
+    def _open_capture(self):
+        cap = cv2.VideoCapture(self.video_url, cv2.CAP_FFMPEG, [
+            cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(self.open_timeout * 1000),
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(self.read_timeout * 1000),
+        ])
+        if not cap.isOpened():
+            cap.release()
             return None
-        self.update_camera_state('Online')
-        return frame
+        cap.set(cv2.CAP_PROP_FPS, self.frame_rate)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
 
-    def _shutdown_and_reconnect(self):
-        self.cap.release()
-        logging.info(f"Shutting down camera: {self.camera_ip} for {self.reconnect_delay} seconds.")
-        time.sleep(self.reconnect_delay)
-        self.cap = cv2.VideoCapture(self.video_url)
-        if self.cap.isOpened():
-            self.cap.set(cv2.CAP_PROP_FPS, self.frame_rate)
-            self.update_camera_state('Online')
-        else:
-            self.update_camera_state('Offline')
-            logging.warning(f"Failed to reconnect to camera: {self.camera_ip}")
-
-    def _reconnect_camera(self):
-        while not self.stop_event.is_set():
-            time.sleep(60)
-            current_time = datetime.now()
-            if self.last_error_time and current_time - self.last_error_time > timedelta(seconds=self.reconnect_delay):
-                logging.info(f"Attempting to reconnect to camera: {self.camera_ip}")
-                self.cap.release()
-                self.cap = cv2.VideoCapture(self.video_url)
-                if self.cap.isOpened():
-                    self.cap.set(cv2.CAP_PROP_FPS, self.frame_rate)
-                    self.update_camera_state('Online')
-                    self.last_error_time = None
-                else:
-                    self.update_camera_state('Offline')
-                    logging.warning(f"Failed to reconnect to camera: {self.camera_ip}")
+    def _is_current(self, generation: int) -> bool:
+        return generation == self.generation and not self.stop_event.is_set()
+
+    def _capture_loop(self, generation: int):
+        """
+        Drain the stream continuously with `grab()` so the OpenCV buffer never falls behind.
+
+        Only a grab that follows a `read_frame` request is converted with `retrieve()`, so the BGR
+        conversion and copy are paid for the analysed frames alone, and the frame handed out is
+        always the newest one the camera has sent. With FFmpeg, `grab()` still decodes every frame;
+        decoding only gets cheaper at the source, e.g. with the sub-stream of dual-stream cameras.
+        `manage.py benchmark_capture` measures both.
+        """
+        cap = None
+        window_start, window_frames = time.monotonic(), 0
+        try:
+            while self._is_current(generation):
+                if cap is None:
+                    self._set_state(ConnectionState.CONNECTING, generation)
+                    self.last_progress_time = time.monotonic()
+                    cap = self._open_capture()
+                    if cap is None:
+                        logging.warning(f"Failed to connect to camera: {self.camera_ip}")
+                        self._backoff(generation)
+                        continue
+
+                self.last_progress_time = time.monotonic()
+                with tracer.span('capture.grab', camera=self.camera_ip, seq=self.frames_grabbed + 1):
+                    grabbed = cap.grab()
+                registry.observe('capture_grab_seconds', time.monotonic() - self.last_progress_time,
+                                 camera=self.camera_ip)
+                if not self._is_current(generation):
+                    break
+                if not grabbed:
+                    logging.warning(f"Failed to read frame from camera: {self.camera_ip}")
+                    cap.release()
+                    cap = None
+                    self._backoff(generation)
+                    continue
+
+                self.frames_grabbed += 1
+                registry.inc('capture_frames_grabbed_total', camera=self.camera_ip)
+                window_frames += 1
+                if time.monotonic() - window_start >= 1:
+                    registry.set('capture_fps', window_frames / (time.monotonic() - window_start),
+                                 camera=self.camera_ip)
+                    window_start, window_frames = time.monotonic(), 0
+                self._set_state(ConnectionState.ONLINE, generation)
+                with self.lock:
+                    if (self.failures and self.online_since is not None
+                            and time.monotonic() - self.online_since >= self.stable_after):
+                        self.failures = 0
+
+                if self.frame_requested.is_set():
+                    self.frame_requested.clear()
+                    retrieve_start = time.monotonic()
+                    with tracer.span('capture.retrieve', camera=self.camera_ip, seq=self.frames_grabbed):
+                        ret, frame = cap.retrieve()
+                    registry.observe('capture_retrieve_seconds', time.monotonic() - retrieve_start,
+                                     camera=self.camera_ip)
+                    self.latest_frame = frame if ret else None
+                    self.latest_seq = self.frames_grabbed
+                    self.frames_retrieved += 1
+                    registry.inc('capture_frames_retrieved_total', camera=self.camera_ip)
+                    self.frame_ready.set()
+        finally:
+            if cap is not None:
+                cap.release()
+
+    def _backoff(self, generation: int):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.failures += 1
+            self.reconnects += 1
+            delay = min(self.backoff_base * 2 ** (self.failures - 1), self.reconnect_delay)
+        registry.inc('capture_reconnects_total', camera=self.camera_ip)
+        delay = random.uniform(delay / 2, delay)
+        if self._is_current(generation):
+            self._set_state(ConnectionState.BACKOFF, generation)
+            logging.info(f"Reconnecting to camera {self.camera_ip} in {delay:.1f} seconds.")
+        self.stop_event.wait(delay)
+
+    def _watchdog(self):
+        hang_timeout = 2 * max(self.open_timeout, self.read_timeout)
+        while not self.stop_event.wait(self.read_timeout):
+            with self.lock:
+                if (self.state == ConnectionState.BACKOFF
+                        or time.monotonic() - self.last_progress_time <= hang_timeout):
+                    continue
+                # The stuck thread notices the generation change once its call returns and releases its capture.
+                self.generation += 1
+                self.reconnects += 1
+                generation = self.generation
+            logging.warning(f"Capture for camera {self.camera_ip} is stuck, starting a new connection.")
+            registry.inc('capture_reconnects_total', camera=self.camera_ip)
+            self._set_state(ConnectionState.BACKOFF, generation)
+            self._start_capture_thread(generation)
+
+    def read_frame(self):
+        if self.state != ConnectionState.ONLINE:
+            return None
+
+        self.frame_ready.clear()
+        self.frame_requested.set()
+        if not self.frame_ready.wait(self.read_timeout):
+            return None
+
+        frame, self.latest_frame = self.latest_frame, None
+        self.frame_seq = self.latest_seq
+        return frame
 
     def release(self):
         self.stop_event.set()
-        self.cap.release()
+        with self.lock:
+            self.state = ConnectionState.STOPPED
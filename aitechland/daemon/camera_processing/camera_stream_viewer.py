@@ -1,3 +1,4 @@
+import logging
 import threading
 import time
 
@@ -5,15 +6,51 @@ from django.conf import settings
 
 from daemon.camera_processing.camera_manager import CameraManager
 from daemon.camera_processing.detection_saver import DetectionSaver
+from daemon.camera_processing.event_aggregator import EventAggregator
 from daemon.camera_processing.frame_processor import FrameProcessor
-from daemon.constants import CLASS_NAMES
+from daemon.camera_processing.motion_detector import MotionDetector
+from daemon.camera_processing.roi_filter import ROIFilter
+from daemon.metrics import registry
+from daemon.tracing import tracer
+from safety_detection.metadata_registry import metadata_registry
 
 
 class CameraStreamViewer:
-    def __init__(self, video_url: str, weights_path: str, frame_rate: int = 1, save_path: str = None):
-        self.camera_manager = CameraManager(video_url, frame_rate)
-        self.frame_processor = FrameProcessor(weights_path, frame_rate)
-        self.detection_saver = DetectionSaver(save_path or settings.MEDIA_ROOT)
+    """
+    Analyses one camera stream and persists its incidents.
+
+    The alarm image of an incident is its best frame with that frame's own boxes drawn on it, so the
+    boxes always sit on the objects they were found on; for dual-stream cameras `video_url` is the
+    low-resolution sub-stream. A ready `camera_manager` with the same interface can replace the RTSP
+    connection (used by benchmarks).
+    """
+
+    def __init__(self, video_url: str, inference_client, frame_rate: int = 1, save_path: str = None,
+                 record_queue=None, motion_threshold: float = 0.005, camera_manager=None):
+        self.camera_manager = camera_manager or CameraManager(
+            video_url, frame_rate,
+            reconnect_delay=getattr(settings, 'CAMERA_RECONNECT_DELAY_MAX', 60),
+            open_timeout=getattr(settings, 'CAMERA_OPEN_TIMEOUT', 10),
+            read_timeout=getattr(settings, 'CAMERA_READ_TIMEOUT', 5),
+        )
+        self.inference_client = inference_client
+        inference_client.connect()
+        self.motion_detector = MotionDetector(
+            motion_threshold,
+            keyframe_interval=getattr(settings, 'MOTION_KEYFRAME_INTERVAL', 5),
+        )
+        self.roi_filter = ROIFilter()
+        self.frame_processor = FrameProcessor(inference_client, frame_rate, self.motion_detector, self.roi_filter)
+        self.detection_saver = DetectionSaver(
+            save_path or settings.MEDIA_ROOT, record_queue,
+            queue_size=getattr(settings, 'DETECTION_QUEUE_SIZE', 64),
+            encode_workers=getattr(settings, 'DETECTION_ENCODE_WORKERS', 2),
+        )
+        self.event_aggregator = EventAggregator(
+            self.camera_manager.camera_ip,
+            cooldown=getattr(settings, 'EVENT_COOLDOWN', 10),
+            max_duration=getattr(settings, 'EVENT_MAX_DURATION', 600),
+        )
 
         threading.Thread(target=self._read_and_process_frames, daemon=True).start()
 
@@ -23,14 +60,51 @@ class CameraStreamViewer:
 
     def _read_and_process_frames(self):
         while not self.camera_manager.stop_event.is_set():
-            frame = self.camera_manager.read_frame()
-            if frame is not None:
-                result = self.frame_processor.process_frame(frame, self.camera_manager.camera_ip)
-                if result is not None:
-                    results, class_counts = result
-                    plotted_frame = results.plot(conf=False)
-                    class_name = next(class_name for class_name in CLASS_NAMES if class_name in class_counts)
-                    self.detection_saver.save_detection(plotted_frame, class_name, self.camera_manager.camera_ip)
+            # Only ask the camera for a decoded frame once the processor will actually use it.
+            if self.camera_manager.stop_event.wait(self.frame_processor.seconds_until_due()):
+                break
+            with tracer.span('read_frame', camera=self.camera_manager.camera_ip) as span_args:
+                frame = self.camera_manager.read_frame()
+                span_args['seq'] = self.camera_manager.frame_seq
+            if frame is None:
+                # The camera is reconnecting; poll again shortly instead of spinning.
+                self.camera_manager.stop_event.wait(0.5)
+                self._save_events(self.event_aggregator.close_expired())
+                continue
+
+            # One bad frame must not end this thread: the camera would stay connected but unwatched.
+            try:
+                self._process(frame, self.camera_manager.frame_seq)
+            except Exception as e:
+                registry.inc('frame_errors_total', camera=self.camera_manager.camera_ip)
+                logging.exception(f"Error processing frame of camera {self.camera_manager.camera_ip}: {e}")
+
+    def _process(self, frame, seq: int = None):
+        self._refresh_roi()
+        # Keep running the detector while an incident is open so its track is not lost.
+        with tracer.span('process_frame', camera=self.camera_manager.camera_ip, seq=seq):
+            result = self.frame_processor.process_frame(frame, self.camera_manager.camera_ip,
+                                                        force=bool(self.event_aggregator.events), seq=seq)
+        if result is not None:
+            detections, class_counts = result
+            self._save_events(self.event_aggregator.update(detections))
+        else:
+            self._save_events(self.event_aggregator.close_expired())
+
+    def _refresh_roi(self):
+        # The registry reloads after ROI edits in the admin, so ROI changes apply without a restart.
+        camera = metadata_registry.camera(self.camera_manager.camera_ip)
+        self.roi_filter.update(camera['rois'] if camera else [])
+
+    def _save_events(self, events):
+        for event in events:
+            seq = event.best_detections.seq
+            with tracer.span('plot', camera=event.camera_ip, seq=seq):
+                plotted_frame = event.best_detections.plot(conf=False)
+            self.detection_saver.save_detection(plotted_frame, event.class_name, event.camera_ip, seq=seq)
 
     def release(self):
         self.camera_manager.release()
+        self._save_events(self.event_aggregator.close_all())
+        self.detection_saver.close()
+        self.inference_client.close()
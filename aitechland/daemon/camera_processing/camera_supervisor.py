@@ -0,0 +1,175 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from django import db
+
+from daemon.camera_processing.camera_stream_viewer import CameraStreamViewer
+from daemon.metrics import MetricsPublisher, registry
+from daemon.tracing import tracer
+
+logging.basicConfig(level=logging.INFO)
+
+# Changing any of these restarts the camera's worker; other settings (e.g. ROIs) are applied live.
+RESTART_KEYS = ('rtsp_port', 'channel_id', 'camera_login', 'camera_password', 'motion_threshold', 'dual_stream')
+
+MAIN_STREAM = 0
+SUB_STREAM = 1
+
+
+def build_video_url(camera_data: dict, subtype: int = MAIN_STREAM) -> str:
+    return (
+        f"rtsp://{camera_data['camera_login']}:{camera_data['camera_password']}"
+        f"@{camera_data['ip_address']}:{camera_data['rtsp_port']}"
+        f"/cam/realmonitor?channel={camera_data['channel_id']}&subtype={subtype}&unicast=true&proto=Onvif"
+    )
+
+
+def run_camera_worker(camera_data: dict, inference_client, record_queue, metrics_queue=None,
+                      metrics_interval: float = 5):
+    logging.info(f"Processing camera: {camera_data['ip_address']}")
+    # The registry was inherited from the main process; this worker reports only its own metrics.
+    registry.reset()
+    tracer.reset(f"camera-{camera_data['ip_address']}")
+    tracer.install()
+    publisher = None
+    if metrics_queue is not None:
+        publisher = MetricsPublisher(metrics_queue, camera_data['ip_address'], metrics_interval)
+        publisher.start()
+    video_url = build_video_url(camera_data, SUB_STREAM if camera_data['dual_stream'] else MAIN_STREAM)
+
+    viewer = CameraStreamViewer(video_url, inference_client, record_queue=record_queue,
+                                motion_threshold=camera_data['motion_threshold'])
+    # Let the supervisor's terminate() stop the viewer cleanly so pending detections are flushed.
+    signal.signal(signal.SIGTERM, lambda signum, frame: viewer.camera_manager.stop_event.set())
+    try:
+        viewer.start()
+    finally:
+        viewer.release()
+        if publisher is not None:
+            publisher.stop()
+
+
+class CameraWorker:
+    def __init__(self, camera_data: dict):
+        self.camera_data = camera_data
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        self.next_start_time = 0.0
+
+    @property
+    def camera_ip(self) -> str:
+        return self.camera_data['ip_address']
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class CameraSupervisor:
+    """
+    Keeps exactly one worker process per enabled camera.
+
+    `sync` diffs the wanted camera set against the running workers, starting new cameras and stopping
+    removed or reconfigured ones independently. `check_workers` restarts crashed workers with an
+    exponential backoff that resets once a worker has stayed up for `stable_after` seconds.
+    """
+
+    def __init__(self, inference_service, record_queue, backoff_base: float = 5, backoff_max: float = 300,
+                 stable_after: float = 300, stop_timeout: float = 10, metrics_queue=None,
+                 metrics_interval: float = 5):
+        self.inference_service = inference_service
+        self.record_queue = record_queue
+        self.metrics_queue = metrics_queue
+        self.metrics_interval = metrics_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.stop_timeout = stop_timeout
+        self.workers = {}
+
+    def sync(self, cameras: list):
+        wanted = {camera_data['ip_address']: camera_data for camera_data in cameras}
+
+        for camera_ip in list(self.workers):
+            worker = self.workers[camera_ip]
+            if camera_ip not in wanted:
+                self.remove_camera(camera_ip)
+            elif any(worker.camera_data[key] != wanted[camera_ip][key] for key in RESTART_KEYS):
+                logging.info(f"Camera configuration changed, restarting worker: {camera_ip}")
+                self.remove_camera(camera_ip)
+
+        for camera_ip, camera_data in wanted.items():
+            if camera_ip not in self.workers:
+                self.add_camera(camera_data)
+
+    def add_camera(self, camera_data: dict):
+        logging.info(f"Adding camera: {camera_data['ip_address']}")
+        worker = CameraWorker(camera_data)
+        self.workers[worker.camera_ip] = worker
+        self._start_worker(worker)
+
+    def remove_camera(self, camera_ip: str):
+        worker = self.workers.pop(camera_ip, None)
+        if worker is None:
+            return
+        logging.info(f"Removing camera: {camera_ip}")
+        self._stop_worker(worker)
+        self.inference_service.release(camera_ip)
+
+    def check_workers(self):
+        now = time.monotonic()
+        for worker in self.workers.values():
+            if worker.is_alive():
+                if worker.restarts and now - worker.started_at >= self.stable_after:
+                    worker.restarts = 0
+                continue
+
+            if worker.process is not None:
+                delay = min(self.backoff_base * 2 ** worker.restarts, self.backoff_max)
+                logging.warning(f"Worker for camera {worker.camera_ip} exited with code "
+                                f"{worker.process.exitcode}, restarting in {delay:.0f} seconds.")
+                worker.process = None
+                worker.restarts += 1
+                worker.next_start_time = now + delay
+
+            if now >= worker.next_start_time:
+                self._start_worker(worker)
+
+    def collect_metrics(self, metrics):
+        for worker in self.workers.values():
+            metrics.set('worker_up', int(worker.is_alive()), camera=worker.camera_ip)
+            metrics.set('worker_restarts', worker.restarts, camera=worker.camera_ip)
+
+    def signal_workers(self, signum: int):
+        for worker in self.workers.values():
+            if worker.is_alive():
+                os.kill(worker.process.pid, signum)
+
+    def stop_all(self):
+        for camera_ip in list(self.workers):
+            self.remove_camera(camera_ip)
+
+    def _start_worker(self, worker: CameraWorker):
+        # Forked children must not share the parent's database connections.
+        db.connections.close_all()
+        worker.process = multiprocessing.Process(
+            target=run_camera_worker,
+            args=(worker.camera_data, self.inference_service.client(worker.camera_ip), self.record_queue,
+                  self.metrics_queue, self.metrics_interval),
+            name=f'camera-{worker.camera_ip}',
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+
+    def _stop_worker(self, worker: CameraWorker):
+        if worker.process is None:
+            return
+        worker.process.terminate()
+        worker.process.join(timeout=self.stop_timeout)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
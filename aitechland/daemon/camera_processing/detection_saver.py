@@ -1,52 +1,175 @@
-import os
-import cv2
-from datetime import datetime
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import logging
-from safety_detection.models import Camera, DetectionClasses, Image
+
+from django.db import transaction
+from django.utils import timezone
+
+from daemon.camera_processing.media_store import MediaStore
+from daemon.metrics import registry
+from daemon.tracing import tracer
+from safety_detection.metadata_registry import metadata_registry
+from safety_detection.models import Image
+from safety_detection.rollup import count_images, update_rollup
 
 logging.basicConfig(level=logging.DEBUG)
 
 
 class DetectionSaver:
-    def __init__(self, save_path: str):
+    """
+    Write-behind persistence for positive frames.
+
+    `save_detection` never blocks the frame-processing thread: JPEG encoding runs on a small thread
+    pool and the finished (camera, class, image, thumbnail, time) records are handed to a
+    `DetectionWriter`, which inserts them in batches. The time is when the alarm was saved, unless
+    the caller passes another one, such as the time in recorded footage. Files are laid out by
+    `MediaStore`. At most `queue_size` frames may be waiting for encoding; further frames are dropped
+    and counted instead of slowing down inference. Offline replays, which must not lose alarms, pass
+    `block=True` to wait for room instead.
+    """
+
+    def __init__(self, save_path: str, record_queue=None, queue_size: int = 64, encode_workers: int = 2,
+                 replayed: bool = False, block: bool = False):
         self.save_path = save_path
+        self.media_store = MediaStore(save_path)
+        self.pending = threading.BoundedSemaphore(queue_size)
+        self.encoder = ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix='detection-encoder')
+        self.dropped = 0
+        self.encoding = 0
+        self.lock = threading.Lock()
+        self.block = block
+        self.writer = None
+        if record_queue is None:
+            # Standalone use: run a writer in this process.
+            record_queue = queue.Queue(maxsize=queue_size)
+            self.writer = DetectionWriter(record_queue, replayed=replayed)
+            self.writer.start()
+        self.record_queue = record_queue
 
-    def save_detection(self, frame, class_name: str, camera_ip: str):
-        camera_info = self.get_camera_and_class_ids(camera_ip, class_name)
-        if camera_info:
-            self._save_frame_and_database(frame, class_name, camera_info, camera_ip)
-        else:
-            logging.warning("Camera info not found. Skipping saving and database operations.")
+    def save_detection(self, frame, class_name: str, camera_ip: str, created_at=None, seq: int = None):
+        if not self.pending.acquire(blocking=self.block):
+            self.dropped += 1
+            registry.inc('detections_dropped_total', camera=camera_ip, queue='encode')
+            logging.warning(f"Detection queue is full, dropping frame from camera: {camera_ip}")
+            return
 
-    def _save_frame_and_database(self, frame, class_name: str, camera_info: tuple, camera_ip: str):
-        camera_id, class_name_id = camera_info
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"{camera_ip}_{class_name}_{timestamp}.jpeg"
-        filepath = os.path.join(self.save_path, filename)
+        with self.lock:
+            self.encoding += 1
+        registry.set('encode_queue_depth', self.encoding, camera=camera_ip)
+        created_at = created_at or timezone.now()
+        image_path, thumbnail_path = self.media_store.paths(camera_ip, class_name, timezone.localtime(created_at))
+        submitted_at = time.perf_counter()
+        future = self.encoder.submit(self._write, frame, image_path, thumbnail_path, camera_ip, seq)
+        future.add_done_callback(lambda _: self._release(camera_ip))
+        future.add_done_callback(
+            lambda done: self._enqueue_record(
+                done, (camera_ip, class_name, image_path, thumbnail_path, created_at, seq), submitted_at))
 
+    def _write(self, frame, image_path: str, thumbnail_path: str, camera_ip: str, seq: int):
+        with tracer.span('encode', camera=camera_ip, seq=seq):
+            self.media_store.write(frame, image_path, thumbnail_path)
+
+    def _release(self, camera_ip: str):
+        self.pending.release()
+        with self.lock:
+            self.encoding -= 1
+        registry.set('encode_queue_depth', self.encoding, camera=camera_ip)
+
+    def _enqueue_record(self, future, record: tuple, submitted_at: float):
+        if future.exception() is not None:
+            logging.error(f"Error saving frame: {future.exception()}")
+            return
         try:
-            cv2.imwrite(filepath, frame)
-            self._save_to_database(camera_id, class_name_id, filename)
-        except Exception as e:
-            logging.error(f"Error saving frame: {e}")
+            self.record_queue.put(record, block=self.block)
+            registry.observe('persist_encode_seconds', time.perf_counter() - submitted_at, camera=record[0])
+        except queue.Full:
+            self.dropped += 1
+            registry.inc('detections_dropped_total', camera=record[0], queue='record')
+            logging.warning(f"Detection record queue is full, {record[2]} is not saved to the database.")
+
+    def close(self):
+        self.encoder.shutdown(wait=True)
+        if self.writer is not None:
+            self.writer.stop()
+
+
+class DetectionWriter(threading.Thread):
+    """
+    Drains detection records and writes them as `Image` rows with one `bulk_create` per batch, counted
+    into the hourly `DetectionRollup` in the same transaction.
+
+    A writer for `replay_videos` sets `replayed` so its rows are told apart from live alarms.
+    """
+
+    def __init__(self, record_queue, batch_size: int = 100, flush_interval: float = 1.0, replayed: bool = False):
+        super().__init__(name='detection-writer', daemon=True)
+        self.record_queue = record_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.replayed = replayed
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            records = self._collect_records()
+            if records:
+                try:
+                    self._save_to_database(records)
+                except Exception as e:
+                    logging.error(f"Error saving {len(records)} detection records: {e}")
+            elif self.stop_event.is_set():
+                break
+
+    def _collect_records(self) -> list:
+        records = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(records) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                records.append(self.record_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return records
+
+    def _save_to_database(self, records: list):
+        images = []
+        for camera_ip, class_name, image_path, thumbnail_path, created_at, _ in records:
+            camera_info = self.get_camera_and_class_ids(camera_ip, class_name)
+            if camera_info is None:
+                logging.warning("Camera info not found. Skipping saving and database operations.")
+                continue
+            camera_id, class_name_id = camera_info
+            image = Image(camera_id=camera_id, class_name_id=class_name_id, image_file=image_path,
+                          thumbnail_file=thumbnail_path, replayed=self.replayed, created_at=created_at)
+            image.set_local_time()
+            images.append(image)
+
+        start = time.perf_counter()
+        with tracer.span('db.insert', rows=len(images), camera=[record[0] for record in records],
+                         seq=[record[5] for record in records]), transaction.atomic():
+            Image.objects.bulk_create(images)
+            update_rollup(count_images(images))
+        registry.observe('db_insert_seconds', time.perf_counter() - start)
+        registry.inc('db_rows_written_total', len(images))
+        logging.info(f'{len(images)} records saved in DB')
 
     @staticmethod
     def get_camera_and_class_ids(camera_ip: str, class_name: str) -> tuple:
-        try:
-            camera = Camera.objects.get(ip_address=camera_ip)
-            class_obj = DetectionClasses.objects.get(name=class_name)
-            return camera.id, class_obj.id
-        except Camera.DoesNotExist:
+        camera = metadata_registry.camera(camera_ip)
+        if camera is None:
             logging.warning(f"Camera with IP {camera_ip} does not exist.")
-        except DetectionClasses.DoesNotExist:
+            return None
+        class_id = metadata_registry.class_id(class_name)
+        if class_id is None:
             logging.warning(f"Detection class {class_name} does not exist.")
-        return None
+            return None
+        return camera['id'], class_id
 
-    @staticmethod
-    def _save_to_database(camera_id: int, class_name_id: int, filename: str):
-        Image.objects.create(
-            camera_id=camera_id,
-            class_name_id=class_name_id,
-            image_file=filename
-        )
-        logging.info('Record saved in DB')
+    def stop(self):
+        self.stop_event.set()
+        self.join(timeout=10)
@@ -0,0 +1,85 @@
+import time
+from typing import List
+
+from daemon.constants import CLASS_NAMES
+from daemon.inference.detections import Detections
+
+UNTRACKED = -1
+
+
+class DetectionEvent:
+    """One incident: a tracked object of one class seen by one camera, with its best frame."""
+
+    def __init__(self, camera_ip: str, class_name: str, track_id: int, detections: Detections, score: float,
+                 now: float):
+        self.camera_ip = camera_ip
+        self.class_name = class_name
+        self.track_id = track_id
+        self.opened_at = now
+        self.last_seen = now
+        self.frames = 1
+        self.best_detections = detections
+        self.best_score = score
+
+    def update(self, detections: Detections, score: float, now: float):
+        self.last_seen = now
+        self.frames += 1
+        if score > self.best_score:
+            self.best_detections = detections
+            self.best_score = score
+
+
+class EventAggregator:
+    """
+    Turns per-frame detections into incidents keyed by (class, track id) for one camera.
+
+    A box opens an event the first time its track is seen and updates it afterwards, keeping only the
+    frame with the highest confidence. An event closes once its track has not been seen for
+    `cooldown` seconds, or after `max_duration` seconds so long incidents still raise periodic
+    alarms. Boxes the tracker has not confirmed yet are attached to an open event of the same class,
+    or start a provisional event that is handed over to the first track of that class.
+    """
+
+    def __init__(self, camera_ip: str, cooldown: float = 10, max_duration: float = 600,
+                 class_names: List[str] = None):
+        self.camera_ip = camera_ip
+        self.cooldown = cooldown
+        self.max_duration = max_duration
+        self.class_names = class_names or CLASS_NAMES
+        self.events = {}
+
+    def update(self, detections: Detections, now: float = None) -> List[DetectionEvent]:
+        now = time.monotonic() if now is None else now
+        for class_index, track_id, score in zip(detections.cls, detections.track_ids, detections.conf):
+            class_name = detections.names.get(int(class_index))
+            if class_name in self.class_names:
+                self._observe(class_name, int(track_id), float(score), detections, now)
+        return self.close_expired(now)
+
+    def _observe(self, class_name: str, track_id: int, score: float, detections: Detections, now: float):
+        key = (class_name, track_id)
+        event = self.events.get(key)
+        if event is None and track_id == UNTRACKED:
+            event = next((open_event for (open_class, _), open_event in self.events.items()
+                          if open_class == class_name), None)
+        elif event is None:
+            event = self.events.pop((class_name, UNTRACKED), None)
+            if event is not None:
+                event.track_id = track_id
+                self.events[key] = event
+
+        if event is None:
+            self.events[key] = DetectionEvent(self.camera_ip, class_name, track_id, detections, score, now)
+        else:
+            event.update(detections, score, now)
+
+    def close_expired(self, now: float = None) -> List[DetectionEvent]:
+        now = time.monotonic() if now is None else now
+        closed = [key for key, event in self.events.items()
+                  if now - event.last_seen >= self.cooldown or now - event.opened_at >= self.max_duration]
+        return [self.events.pop(key) for key in closed]
+
+    def close_all(self) -> List[DetectionEvent]:
+        closed = list(self.events.values())
+        self.events.clear()
+        return closed
@@ -1,37 +1,102 @@
 import logging
 import time
 
-import cv2
-import torch
-from ultralytics import YOLO
+import numpy as np
 
 from daemon.calculation.calculation import Calculation
+from daemon.camera_processing.roi_filter import ROIFilter
 from daemon.constants import CLASS_NAMES
+from daemon.inference.detections import Detections
+from daemon.inference.preprocessing import LetterboxPreprocessor
+from daemon.metrics import registry
+from daemon.tracing import tracer
 
 logging.basicConfig(level=logging.DEBUG)
 
 
 class FrameProcessor:
-    def __init__(self, weights_path: str, frame_rate: int):
-        self.weights_path = weights_path
+    def __init__(self, inference_client, frame_rate: int, motion_detector=None, roi_filter: ROIFilter = None):
+        self.inference_client = inference_client
         self.frame_rate = frame_rate
+        self.motion_detector = motion_detector
+        self.roi_filter = roi_filter or ROIFilter()
+        self.preprocessor = LetterboxPreprocessor()
         self.last_frame_time = time.time()
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = YOLO(self.weights_path).to(self.device)
         self.last_detection_time = {}
+        # Class names of the last answer, for results made without asking the server.
+        self.names = {}
 
-    def process_frame(self, frame, camera_ip: str):
+    def interval(self) -> float:
+        """Seconds between frames: what the host-wide scheduler asks for, `frame_rate` until it answers."""
+        return self.inference_client.interval or 1.0 / self.frame_rate
+
+    def seconds_until_due(self) -> float:
+        return max(self.last_frame_time + self.interval() - time.time(), 0.0)
+
+    def process_frame(self, frame, camera_ip: str, force: bool = False, seq: int = None):
         current_time = time.time()
-        if current_time - self.last_frame_time < 1.0 / self.frame_rate:
+        if current_time - self.last_frame_time < self.interval():
             return None
 
         self.last_frame_time = current_time
+        if self.motion_detector is not None:
+            with tracer.span('motion', camera=camera_ip, seq=seq):
+                should_infer = self.motion_detector.should_infer(frame, force)
+        else:
+            should_infer = True
+        if not should_infer:
+            registry.inc('frames_skipped_total', camera=camera_ip, reason='motion')
+            return None
 
-        resized_frame = cv2.resize(frame, (640, 640), interpolation=cv2.INTER_LINEAR)
-        results = self.model.track(resized_frame, conf=0.6, verbose=False)
-        class_counts = Calculation.count_classes(results[0].names, results[0].boxes.cls.int().tolist())
+        detections = self._detect(frame, seq)
+        if detections is None:
+            registry.inc('inference_timeouts_total', camera=camera_ip)
+            return None
+        registry.inc('frames_processed_total', camera=camera_ip)
+        class_counts = Calculation.count_classes(detections.names, detections.cls.tolist())
 
         if any(class_name in class_counts for class_name in CLASS_NAMES):
             self.last_detection_time[camera_ip] = current_time
-            return results[0], class_counts
-        return None
+        return detections, class_counts
+
+    def _detect(self, frame, seq: int = None):
+        """
+        Run the detector on the ROI crops of the frame and return the boxes in frame coordinates.
+
+        `seq` is the frame's grab count, carried into the trace spans and the returned `Detections`.
+        """
+        camera_ip = self.inference_client.camera_ip
+        start = time.perf_counter()
+        regions = [(x0, y0, x1, y1) for x0, y0, x1, y1 in self.roi_filter.regions(frame.shape)
+                   if x1 > x0 and y1 > y0]
+        if not regions:
+            # Every ROI lies outside the frame, e.g. after the camera's resolution changed: nothing to watch.
+            return Detections(np.zeros((0, 7), dtype=np.float32), self.names, frame, seq)
+        # Letterbox straight into the client's shared-memory slots, so the server reads them without a copy.
+        with tracer.span('preprocess', camera=camera_ip, seq=seq, regions=len(regions)):
+            letterboxed = [self.preprocessor.letterbox(frame[y0:y1, x0:x1], slot,
+                                                       self.inference_client.frame_slot(slot))
+                           for slot, (x0, y0, x1, y1) in enumerate(regions)]
+        inference_start = time.perf_counter()
+        registry.observe('preprocess_seconds', inference_start - start, camera=camera_ip)
+        with tracer.span('inference', camera=camera_ip, seq=seq):
+            results = self.inference_client.infer_many([buffer for buffer, _, _, _ in letterboxed], seq)
+        registry.observe('inference_seconds', time.perf_counter() - inference_start, camera=camera_ip)
+        if results[0] is None:
+            return None
+
+        self.names = results[0].names
+        boxes = self.merge_regions(regions, letterboxed, [result.boxes for result in results])
+        boxes = self.roi_filter.filter_boxes(boxes, frame.shape)
+        return Detections(boxes, results[0].names, frame, seq)
+
+    @staticmethod
+    def merge_regions(regions: list, letterboxed: list, region_boxes: list) -> np.ndarray:
+        """Map the boxes found in each letterboxed ROI crop back to frame coordinates, in place, and join them."""
+        boxes = []
+        for (x0, y0, _, _), (_, scale, pad_x, pad_y), crop_boxes in zip(regions, letterboxed, region_boxes):
+            crop_boxes = LetterboxPreprocessor.unletterbox(crop_boxes, scale, pad_x, pad_y)
+            crop_boxes[:, [0, 2]] += x0
+            crop_boxes[:, [1, 3]] += y0
+            boxes.append(crop_boxes)
+        return np.concatenate(boxes) if boxes else np.zeros((0, 7), dtype=np.float32)
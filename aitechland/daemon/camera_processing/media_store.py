@@ -0,0 +1,88 @@
+import os
+import shutil
+import uuid
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+THUMBNAIL_DIR = 'thumbs'
+
+
+class MediaStore:
+    """
+    Collision-free, sharded layout for alarm images under `root`.
+
+    Images go to `YYYY/MM/DD/<camera ip>/<HHMMSS>_<class>_<random>.jpeg`, so no directory grows with
+    the archive and two events in the same second never overwrite each other. A small WebP thumbnail
+    for the list views is written next to it in a `thumbs` directory. Paths are relative to `root`,
+    ready to be stored on `Image` and prefixed with `MEDIA_URL`. Deleting or archiving a file also
+    removes the shard directories it leaves empty.
+    """
+
+    def __init__(self, root: str, jpeg_quality: int = 90, thumbnail_width: int = 320, thumbnail_quality: int = 75):
+        self.root = root
+        self.jpeg_quality = jpeg_quality
+        self.thumbnail_width = thumbnail_width
+        self.thumbnail_quality = thumbnail_quality
+
+    @staticmethod
+    def paths(camera_ip: str, class_name: str, now: datetime = None) -> tuple:
+        """Return new (image, thumbnail) paths relative to the store root."""
+        now = now or datetime.now()
+        directory = os.path.join(now.strftime('%Y'), now.strftime('%m'), now.strftime('%d'), camera_ip)
+        stem = f"{now.strftime('%H%M%S')}_{class_name}_{uuid.uuid4().hex[:12]}"
+        return os.path.join(directory, f'{stem}.jpeg'), os.path.join(directory, THUMBNAIL_DIR, f'{stem}.webp')
+
+    def write(self, frame: np.ndarray, image_path: str, thumbnail_path: str):
+        thumbnail_file = os.path.join(self.root, thumbnail_path)
+        os.makedirs(os.path.dirname(thumbnail_file), exist_ok=True)
+        if not cv2.imwrite(os.path.join(self.root, image_path), frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]):
+            raise IOError(f"cv2.imwrite failed for {image_path}")
+
+        height, width = frame.shape[:2]
+        scale = min(self.thumbnail_width / width, 1.0)
+        thumbnail = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        if not cv2.imwrite(thumbnail_file, thumbnail, [cv2.IMWRITE_WEBP_QUALITY, self.thumbnail_quality]):
+            raise IOError(f"cv2.imwrite failed for {thumbnail_path}")
+
+    def size(self, path: str) -> int:
+        """Size of a file of the store in bytes, 0 if it is gone."""
+        try:
+            return os.path.getsize(os.path.join(self.root, path))
+        except FileNotFoundError:
+            return 0
+
+    def delete(self, path: str) -> int:
+        """Remove a file of the store and its emptied shard directories; return the bytes freed."""
+        full_path = os.path.join(self.root, path)
+        try:
+            size = os.path.getsize(full_path)
+            os.remove(full_path)
+        except FileNotFoundError:
+            return 0
+        self._prune_directories(os.path.dirname(full_path))
+        return size
+
+    def archive(self, path: str, archive_root: str) -> int:
+        """Move a file of the store to the same relative path under `archive_root`; return its size."""
+        full_path = os.path.join(self.root, path)
+        target = os.path.join(archive_root, path)
+        try:
+            size = os.path.getsize(full_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(full_path, target)
+        except FileNotFoundError:
+            return 0
+        self._prune_directories(os.path.dirname(full_path))
+        return size
+
+    def _prune_directories(self, directory: str):
+        root = os.path.abspath(self.root)
+        directory = os.path.abspath(directory)
+        while directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
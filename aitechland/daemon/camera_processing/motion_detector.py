@@ -0,0 +1,58 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionDetector:
+    """
+    Cheap change detector that decides whether a frame is worth a detector pass.
+
+    Frames are downscaled to `size`, converted to grey and compared against a running-average
+    background. A frame counts as motion when the share of pixels differing by more than
+    `pixel_threshold` reaches `threshold`. A keyframe is forced every `keyframe_interval` seconds
+    so slow or static hazards are still picked up, and callers can force inference while an
+    incident is open.
+    """
+
+    def __init__(self, threshold: float = 0.005, keyframe_interval: float = 5, size: tuple = (160, 90),
+                 pixel_threshold: int = 25, learning_rate: float = 0.05):
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.learning_rate = learning_rate
+        self.small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self.gray = np.empty((size[1], size[0]), dtype=np.uint8)
+        self.diff = np.empty_like(self.gray)
+        self.background = None
+        self.last_inference_time = 0.0
+        self.frames_checked = 0
+        self.frames_skipped = 0
+        self.keyframes = 0
+
+    def motion_ratio(self, frame: np.ndarray) -> float:
+        cv2.resize(frame, self.size, dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        cv2.GaussianBlur(self.gray, (5, 5), 0, dst=self.gray)
+        if self.background is None:
+            self.background = self.gray.astype(np.float32)
+            return 1.0
+
+        cv2.absdiff(self.gray, cv2.convertScaleAbs(self.background), dst=self.diff)
+        cv2.accumulateWeighted(self.gray, self.background, self.learning_rate)
+        cv2.threshold(self.diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self.diff)
+        return cv2.countNonZero(self.diff) / self.diff.size
+
+    def should_infer(self, frame: np.ndarray, force: bool = False, now: float = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self.frames_checked += 1
+        motion = self.motion_ratio(frame) >= self.threshold
+        keyframe = now - self.last_inference_time >= self.keyframe_interval
+        if motion or force or keyframe or self.threshold <= 0:
+            if keyframe and not (motion or force):
+                self.keyframes += 1
+            self.last_inference_time = now
+            return True
+        self.frames_skipped += 1
+        return False
@@ -0,0 +1,121 @@
+import ast
+import json
+import logging
+from typing import List
+
+import cv2
+import numpy as np
+
+# roi_draw.js draws the ROIs on a canvas of this size, whatever the camera resolution is.
+ROI_CANVAS_SIZE = (640, 480)
+
+
+def parse_roi_data(roi_data: str) -> List[np.ndarray]:
+    """
+    Parse one `ROICoordinates.roi_data` value into polygons in canvas coordinates.
+
+    Rectangles from the admin canvas ({x, y, width, height}) become four-point polygons; polygons
+    given as {points: [[x, y], ...]} or as a bare list of points are used as they are. `save_rois`
+    stores the Python repr of the list instead of JSON, so both are accepted.
+    """
+    try:
+        rois = json.loads(roi_data)
+    except (TypeError, ValueError):
+        try:
+            rois = ast.literal_eval(roi_data)
+        except (SyntaxError, ValueError):
+            logging.warning(f"Ignoring unreadable ROI data: {roi_data!r}")
+            return []
+
+    if isinstance(rois, dict):
+        rois = [rois]
+    polygons = []
+    for roi in rois or []:
+        if isinstance(roi, dict) and 'points' in roi:
+            points = roi['points']
+        elif isinstance(roi, dict):
+            x, y, width, height = (float(roi.get(key, 0)) for key in ('x', 'y', 'width', 'height'))
+            x0, x1 = sorted((x, x + width))
+            y0, y1 = sorted((y, y + height))
+            points = [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+        else:
+            points = roi
+        polygon = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        if len(polygon) >= 3 and cv2.contourArea(polygon) > 0:
+            polygons.append(polygon)
+    return polygons
+
+
+class ROIFilter:
+    """
+    Compiled areas of interest for one camera.
+
+    The polygons are rasterised once per frame size into a mask and a list of bounding crops.
+    `regions` tells the frame processor which crops to run the detector on, and `filter_boxes`
+    drops every box whose centre lies outside the polygons. A camera without ROIs uses the whole
+    frame. `update` recompiles only when the stored ROI data actually changed.
+    """
+
+    def __init__(self, roi_data: List[str] = None):
+        self.roi_data = None
+        self.polygons = []
+        self.frame_shape = None
+        self.mask = None
+        self.crops = []
+        self.update(roi_data or [])
+
+    def update(self, roi_data: List[str]):
+        if roi_data == self.roi_data:
+            return
+        self.roi_data = list(roi_data)
+        self.polygons = [polygon for data in self.roi_data for polygon in parse_roi_data(data)]
+        self.frame_shape = None
+        logging.info(f"Loaded {len(self.polygons)} ROI polygons")
+
+    def _compile(self, frame_shape: tuple):
+        height, width = frame_shape[:2]
+        scale = np.array([width / ROI_CANVAS_SIZE[0], height / ROI_CANVAS_SIZE[1]], dtype=np.float32)
+        polygons = [np.round(polygon * scale).astype(np.int32) for polygon in self.polygons]
+
+        self.mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(self.mask, polygons, 255)
+
+        # Merge overlapping bounding boxes so no pixel is inferred twice.
+        boxes = []
+        for polygon in polygons:
+            x, y, w, h = cv2.boundingRect(polygon)
+            boxes.append([max(x, 0), max(y, 0), min(x + w, width), min(y + h, height)])
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(boxes)):
+                for j in range(i + 1, len(boxes)):
+                    a, b = boxes[i], boxes[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del boxes[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        self.crops = [tuple(box) for box in boxes if box[2] > box[0] and box[3] > box[1]]
+        self.frame_shape = frame_shape
+
+    def regions(self, frame_shape: tuple) -> List[tuple]:
+        """Return the (x0, y0, x1, y1) crops to run the detector on."""
+        if not self.polygons:
+            return [(0, 0, frame_shape[1], frame_shape[0])]
+        if frame_shape != self.frame_shape:
+            self._compile(frame_shape)
+        return self.crops
+
+    def filter_boxes(self, boxes: np.ndarray, frame_shape: tuple) -> np.ndarray:
+        """Keep the rows of an (N, 7) box array whose centre falls inside an ROI polygon."""
+        if not self.polygons or len(boxes) == 0:
+            return boxes
+        if frame_shape != self.frame_shape:
+            self._compile(frame_shape)
+        height, width = frame_shape[:2]
+        centre_x = np.clip(((boxes[:, 0] + boxes[:, 2]) / 2).astype(np.intp), 0, width - 1)
+        centre_y = np.clip(((boxes[:, 1] + boxes[:, 3]) / 2).astype(np.intp), 0, height - 1)
+        return boxes[self.mask[centre_y, centre_x] > 0]
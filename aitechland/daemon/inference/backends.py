@@ -0,0 +1,182 @@
+import ast
+import logging
+import os
+import time
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+class InferenceBackend:
+    """
+    A detector runtime behind the inference server.
+
+    `predict` takes a float32 RGB NCHW batch scaled to 0..1 (see `BatchBuffer`) and returns one
+    (N, 6) array of x1, y1, x2, y2, confidence, class index per image, in input pixel coordinates.
+    """
+
+    names: Dict[int, str] = {}
+
+    def __init__(self, model_path: str, conf: float = 0.6, iou: float = 0.7):
+        self.model_path = model_path
+        self.conf = conf
+        self.iou = iou
+
+    def predict(self, batch: np.ndarray) -> List[np.ndarray]:
+        raise NotImplementedError
+
+
+class TorchBackend(InferenceBackend):
+    """PyTorch eager mode through Ultralytics, using the `.pt` weights."""
+
+    def __init__(self, model_path: str, conf: float = 0.6, iou: float = 0.7):
+        super().__init__(model_path, conf, iou)
+        import torch
+        from ultralytics import YOLO
+
+        self.torch = torch
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = YOLO(model_path).to(self.device)
+        self.names = self.model.names
+
+    def predict(self, batch: np.ndarray) -> List[np.ndarray]:
+        results = self.model.predict(self.torch.from_numpy(batch), conf=self.conf, iou=self.iou, verbose=False)
+        return [result.boxes.data[:, :6].cpu().numpy() for result in results]
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """ONNX Runtime on the CPU, using a model exported by `manage.py export_model --format onnx`."""
+
+    def __init__(self, model_path: str, conf: float = 0.6, iou: float = 0.7):
+        super().__init__(model_path, conf, iou)
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.names = ast.literal_eval(self.session.get_modelmeta().custom_metadata_map['names'])
+
+    def predict(self, batch: np.ndarray) -> List[np.ndarray]:
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return non_max_suppression(output, self.conf, self.iou)
+
+
+class OpenVINOBackend(InferenceBackend):
+    """OpenVINO on the CPU, using the model directory written by `manage.py export_model --format openvino`."""
+
+    def __init__(self, model_path: str, conf: float = 0.6, iou: float = 0.7):
+        super().__init__(model_path, conf, iou)
+        import openvino
+        import yaml
+
+        xml_path = next(os.path.join(model_path, name) for name in os.listdir(model_path) if name.endswith('.xml'))
+        core = openvino.Core()
+        self.model = core.compile_model(core.read_model(xml_path), 'CPU', {'PERFORMANCE_HINT': 'THROUGHPUT'})
+        self.output = self.model.output(0)
+        with open(os.path.join(model_path, 'metadata.yaml')) as metadata:
+            self.names = yaml.safe_load(metadata)['names']
+
+    def predict(self, batch: np.ndarray) -> List[np.ndarray]:
+        output = self.model(batch)[self.output]
+        return non_max_suppression(output, self.conf, self.iou)
+
+
+class StubBackend(InferenceBackend):
+    """
+    Deterministic stand-in detector for benchmarks, no model needed.
+
+    `model_path` is the simulated inference time per frame in milliseconds. Roughly one frame in five
+    gets a 'fire' box, chosen from a checksum of the frame so repeated runs detect the same frames.
+    """
+
+    names = {0: 'smoke', 1: 'head', 2: 'fire', 3: 'helmet'}
+
+    def __init__(self, model_path: str, conf: float = 0.6, iou: float = 0.7):
+        super().__init__(model_path, conf, iou)
+        self.frame_cost = float(model_path or 0) / 1000
+
+    def predict(self, batch: np.ndarray) -> List[np.ndarray]:
+        time.sleep(self.frame_cost * len(batch))
+        detections = []
+        for image in batch:
+            size = image.shape[-1]
+            if int(image[:, ::8, ::8].sum() * 1000) % 5 == 0:
+                box = [size * 0.4, size * 0.4, size * 0.6, size * 0.6, 0.9, 2]
+                detections.append(np.array([box], dtype=np.float32))
+            else:
+                detections.append(np.zeros((0, 6), dtype=np.float32))
+        return detections
+
+
+BACKENDS = {
+    'torch': TorchBackend,
+    'onnxruntime': OnnxRuntimeBackend,
+    'openvino': OpenVINOBackend,
+    'stub': StubBackend,
+}
+
+
+def default_model_path(backend: str, weights_path: str, quantized: bool = False) -> str:
+    """
+    Where `export_model` writes the model of `backend` for the given `.pt` weights, or where
+    `quantize_model` writes the INT8 model when `quantized` is set (ONNX Runtime only).
+    """
+    stem = os.path.splitext(weights_path)[0]
+    if backend == 'onnxruntime':
+        return f'{stem}.int8.onnx' if quantized else f'{stem}.onnx'
+    if backend == 'openvino':
+        return f'{stem}_openvino_model'
+    return weights_path
+
+
+def configured_backend() -> tuple:
+    """Return the (backend, model path) pair selected in settings."""
+    from django.conf import settings
+
+    backend = getattr(settings, 'INFERENCE_BACKEND', 'torch')
+    model_path = getattr(settings, 'INFERENCE_MODEL_PATH', None)
+    quantized = getattr(settings, 'INFERENCE_QUANTIZED', False)
+    if quantized and backend != 'onnxruntime':
+        logging.warning(f"INFERENCE_QUANTIZED only applies to the onnxruntime backend, not {backend}")
+    return backend, model_path or default_model_path(backend, settings.NEURAL_PATH, quantized)
+
+
+def load_backend(backend: str, model_path: str, conf: float = 0.6) -> InferenceBackend:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    logging.info(f"Loading {backend} inference backend from {model_path}")
+    return BACKENDS[backend](model_path, conf)
+
+
+def non_max_suppression(output: np.ndarray, conf: float, iou: float, max_det: int = 300) -> List[np.ndarray]:
+    """
+    Decode raw YOLOv8 output of shape (B, 4 + classes, anchors) into per-image (N, 6) detections.
+
+    Class-aware NMS runs through `cv2.dnn.NMSBoxesBatched`, matching what Ultralytics does for the
+    `.pt` model.
+    """
+    detections = []
+    for prediction in output:
+        prediction = prediction.T
+        scores = prediction[:, 4:]
+        class_ids = scores.argmax(1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= conf
+        xywh, class_ids, confidences = prediction[keep, :4], class_ids[keep], confidences[keep]
+
+        xyxy = np.empty_like(xywh)
+        xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        xyxy[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+        top_left_wh = np.concatenate([xyxy[:, :2], xywh[:, 2:]], axis=1)
+        indices = cv2.dnn.NMSBoxesBatched(top_left_wh.tolist(), confidences.tolist(), class_ids.tolist(), conf, iou)
+        indices = np.asarray(indices, dtype=int).reshape(-1)
+        indices = indices[np.argsort(-confidences[indices])][:max_det]
+
+        detections.append(np.concatenate(
+            [xyxy[indices], confidences[indices, None], class_ids[indices, None].astype(np.float32)], axis=1
+        ).astype(np.float32))
+    return detections
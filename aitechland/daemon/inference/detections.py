@@ -0,0 +1,73 @@
+from typing import Dict
+
+import cv2
+import numpy as np
+
+BOX_COLORS = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207), (10, 249, 72)]
+
+
+class Detections:
+    """
+    Compact, picklable detection result returned by the inference server.
+
+    Each row of `boxes` is (x1, y1, x2, y2, confidence, class index, track id); the track id is -1
+    for boxes the tracker has not confirmed yet. `seq` is the camera's grab count of `orig_img`, for
+    trace spans.
+    """
+
+    def __init__(self, boxes: np.ndarray, names: Dict[int, str], orig_img: np.ndarray = None, seq: int = None):
+        self.boxes = boxes.reshape(-1, 7)
+        self.names = names
+        self.orig_img = orig_img
+        self.seq = seq
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @property
+    def xyxy(self) -> np.ndarray:
+        return self.boxes[:, :4]
+
+    @property
+    def conf(self) -> np.ndarray:
+        return self.boxes[:, 4]
+
+    @property
+    def cls(self) -> np.ndarray:
+        return self.boxes[:, 5].astype(int)
+
+    @property
+    def track_ids(self) -> np.ndarray:
+        return self.boxes[:, 6].astype(int)
+
+    @classmethod
+    def empty(cls, names: Dict[int, str]) -> 'Detections':
+        return cls(np.zeros((0, 7), dtype=np.float32), names)
+
+    def plot(self, conf: bool = True) -> np.ndarray:
+        """
+        Draw the boxes on a copy of the original image.
+
+        Args:
+            conf (bool): Whether to append the confidence to each label.
+
+        Returns:
+            np.ndarray: Annotated BGR image.
+        """
+        annotated = self.orig_img.copy()
+        line_width = max(round(sum(annotated.shape[:2]) / 2 * 0.003), 2)
+        for x1, y1, x2, y2, score, class_index, _ in self.boxes:
+            class_index = int(class_index)
+            color = BOX_COLORS[class_index % len(BOX_COLORS)]
+            label = self.names.get(class_index, str(class_index))
+            if conf:
+                label = f'{label} {score:.2f}'
+            top_left = (int(x1), int(y1))
+            cv2.rectangle(annotated, top_left, (int(x2), int(y2)), color, line_width, cv2.LINE_AA)
+            (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, line_width / 3, 1)
+            label_top = max(top_left[1] - text_height - 3, 0)
+            cv2.rectangle(annotated, (top_left[0], label_top), (top_left[0] + text_width, label_top + text_height + 3),
+                          color, -1, cv2.LINE_AA)
+            cv2.putText(annotated, label, (top_left[0], label_top + text_height + 1), cv2.FONT_HERSHEY_SIMPLEX,
+                        line_width / 3, (255, 255, 255), 1, cv2.LINE_AA)
+        return annotated
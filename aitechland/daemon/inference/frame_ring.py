@@ -0,0 +1,81 @@
+import itertools
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from daemon.inference.preprocessing import INPUT_SIZE
+
+# Sequence number of a slot that is being written and must not be read.
+WRITING = -1
+
+
+class FrameRing:
+    """
+    Fixed-slot ring of model-input frames in shared memory, one per camera.
+
+    The daemon creates the ring and keeps it across restarts of the camera's worker, which attaches
+    to it and letterboxes straight into a slot's view; only the slot index and a sequence number
+    travel through the request queue. The inference server attaches to the ring by name as well and
+    reads the same memory, so frames are never pickled or copied between processes. Each slot has a
+    sequence number in a small header: the writer marks the slot as `WRITING` before touching it and
+    publishes a new number once the frame is complete, so a reader can tell that a slot was
+    overwritten under it (e.g. after a request timed out).
+    """
+
+    def __init__(self, slots: int, name: str = None, shape: tuple = (INPUT_SIZE, INPUT_SIZE, 3)):
+        self.slots = slots
+        self.shape = shape
+        header_size = slots * np.dtype(np.int64).itemsize
+        frame_size = int(np.prod(shape))
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_size + slots * frame_size)
+        else:
+            # Attaching registers the segment with this process's resource tracker as well, which only
+            # unlinks it when this process exits; the creating process unlinks it on `close`.
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.sequence = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_size)
+        self.views = list(self.frames)
+        self._sequence_numbers = itertools.count(1)
+        if self.owner:
+            self.sequence.fill(WRITING)
+
+    def reset(self):
+        """Writer side: take the ring over from a previous writer, whose frames may still be referenced."""
+        self.sequence.fill(WRITING)
+        self._sequence_numbers = itertools.count(time.monotonic_ns())
+
+    def slot(self, index: int) -> np.ndarray:
+        """Writer side: mark slot `index` as being written and return its view."""
+        self.sequence[index] = WRITING
+        return self.views[index]
+
+    def index_of(self, frame: np.ndarray):
+        """The slot whose view `frame` is, or `None` for an array outside the ring."""
+        return next((index for index, view in enumerate(self.views) if view is frame), None)
+
+    def publish(self, index: int) -> int:
+        """Writer side: the frame in slot `index` is complete; return its sequence number."""
+        sequence = next(self._sequence_numbers)
+        self.sequence[index] = sequence
+        return sequence
+
+    def read(self, index: int, sequence: int):
+        """Reader side: the view of slot `index`, or `None` if it no longer holds frame `sequence`."""
+        return self.views[index] if self.sequence[index] == sequence else None
+
+    def is_current(self, index: int, sequence: int) -> bool:
+        return self.sequence[index] == sequence
+
+    def close(self):
+        del self.sequence, self.frames, self.views
+        try:
+            self.shm.close()
+        except BufferError:
+            # Slot views handed out earlier are still alive; the mapping goes away with the process.
+            pass
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,376 @@
+import itertools
+import logging
+import multiprocessing
+import queue
+import time
+
+import numpy as np
+
+from daemon.inference.backends import load_backend
+from daemon.inference.detections import Detections
+from daemon.inference.frame_ring import FrameRing
+from daemon.inference.preprocessing import BatchBuffer
+from daemon.inference.scheduler import InferenceScheduler
+from daemon.tracing import tracer
+
+logging.basicConfig(level=logging.DEBUG)
+
+REGISTER = 'register'
+UNREGISTER = 'unregister'
+INFER = 'infer'
+
+
+def tracker_config():
+    from ultralytics.utils import IterableSimpleNamespace, yaml_load
+    from ultralytics.utils.checks import check_yaml
+
+    return IterableSimpleNamespace(**yaml_load(check_yaml('bytetrack.yaml')))
+
+
+def track(tracker, result: np.ndarray, frame) -> np.ndarray:
+    """
+    Run one image's (N, 6) detections through its BYTETracker.
+
+    Returns (N, 7) boxes: xyxy, confidence, class index and track id, -1 while unconfirmed. `tracker`
+    is None for a stream that has not had a detection yet.
+    """
+    from ultralytics.engine.results import Boxes
+
+    det = Boxes(result, frame.shape[:2])
+    boxes = np.zeros((len(det), 7), dtype=np.float32)
+    if tracker is None:
+        return boxes
+    # Frames without detections go through the tracker too: BYTETrack only ages lost tracks in
+    # update(), and skipping them would match someone returning after a gap to their stale track.
+    tracks = tracker.update(det, frame)
+    if len(det) == 0:
+        return boxes
+    boxes[:, :4] = det.xyxy
+    boxes[:, 4] = det.conf
+    boxes[:, 5] = det.cls
+    boxes[:, 6] = -1
+    if len(tracks):
+        boxes[tracks[:, -1].astype(int), 6] = tracks[:, 4]
+    return boxes
+
+
+class InferenceServer(multiprocessing.Process):
+    """
+    Single per-host process that owns the detector and serves every camera worker.
+
+    Requests from all cameras are pulled off one queue and grouped into dynamic batches, bounded by
+    `max_batch_size` frames and `max_wait` seconds after the first frame of the batch arrived.
+    Each camera stream (a camera, or one ROI crop of a camera) keeps its own tracker so track ids
+    stay stable regardless of how frames are batched. Clients send frames already letterboxed to
+    640x640; they are copied into a preallocated float batch and handed to the configured backend
+    (see `daemon.inference.backends`).
+
+    The `scheduler` decides how often each camera should send frames; its interval is returned with
+    every response and its state is published to the shared `status` dict.
+
+    Cameras that registered a `FrameRing` send only a slot index and sequence number; the server
+    reads the frame straight from shared memory and drops it if the camera overwrote the slot first.
+    """
+
+    def __init__(self, backend: str, model_path: str, request_queue, max_batch_size: int = 16,
+                 max_wait: float = 0.05, conf: float = 0.6, scheduler: InferenceScheduler = None, status=None):
+        super().__init__(name='inference-server', daemon=True)
+        self.backend_name = backend
+        self.model_path = model_path
+        self.request_queue = request_queue
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.conf = conf
+        self.scheduler = scheduler or InferenceScheduler()
+        self.status = status
+        self.stop_event = multiprocessing.Event()
+
+    def run(self):
+        tracer.reset('inference-server')
+        tracer.install()
+        self.backend = load_backend(self.backend_name, self.model_path, self.conf)
+        self.tracker_cfg = tracker_config()
+        self.response_queues = {}
+        self.rings = {}
+        self.trackers = {}
+        self.batch_buffer = BatchBuffer(self.max_batch_size)
+        self.published_at = None
+        logging.info(f"Inference server loaded {self.model_path} with the {self.backend_name} backend")
+
+        while not self.stop_event.is_set():
+            batch = self._collect_batch()
+            if batch:
+                try:
+                    self._process_batch(batch)
+                except Exception as e:
+                    logging.error(f"Error running inference batch of {len(batch)} frames: {e}")
+            self._rebalance()
+        for ring in self.rings.values():
+            ring.close()
+
+    def _collect_batch(self) -> list:
+        batch = []
+        deadline = None
+        while len(batch) < self.max_batch_size:
+            timeout = 1.0 if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                message = self.request_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if message[0] == REGISTER:
+                self._register(*message[1:])
+                continue
+            if message[0] == UNREGISTER:
+                self._unregister(*message[1:])
+                continue
+            _, camera_ip, request_id, frame, stream, sent_at, ring_slot, seq = message
+            if ring_slot is not None:
+                frame = self._read_ring(camera_ip, *ring_slot)
+                if frame is None:
+                    continue
+            batch.append((camera_ip, request_id, frame, stream, sent_at, ring_slot, seq))
+            if deadline is None:
+                deadline = time.monotonic() + self.max_wait
+        return batch
+
+    def _register(self, camera_ip: str, response_queue, ring_name: str = None, ring_slots: int = 0):
+        self.response_queues[camera_ip] = response_queue
+        if camera_ip in self.rings:
+            self.rings.pop(camera_ip).close()
+        if ring_name:
+            try:
+                self.rings[camera_ip] = FrameRing(ring_slots, name=ring_name)
+            except FileNotFoundError:
+                logging.error(f"Frame ring {ring_name} of camera {camera_ip} does not exist")
+        self.scheduler.register(camera_ip)
+        for stream in [stream for stream in self.trackers if stream[0] == camera_ip]:
+            del self.trackers[stream]
+        logging.info(f"Inference server registered camera: {camera_ip}")
+
+    def _unregister(self, camera_ip: str):
+        self.response_queues.pop(camera_ip, None)
+        if camera_ip in self.rings:
+            self.rings.pop(camera_ip).close()
+        for stream in [stream for stream in self.trackers if stream[0] == camera_ip]:
+            del self.trackers[stream]
+        logging.info(f"Inference server unregistered camera: {camera_ip}")
+
+    def _read_ring(self, camera_ip: str, index: int, sequence: int):
+        ring = self.rings.get(camera_ip)
+        frame = ring.read(index, sequence) if ring is not None else None
+        if frame is None:
+            logging.debug(f"Dropping frame {sequence} of camera {camera_ip}, its ring slot was overwritten")
+        return frame
+
+    def _process_batch(self, batch: list):
+        frames = [frame for _, _, frame, _, _, _, _ in batch]
+        # Batch spans list the camera and frame sequence number of every frame they hold.
+        members = {'camera': [item[0] for item in batch], 'seq': [item[6] for item in batch]}
+        start = time.perf_counter()
+        with tracer.span('server.fill', frames=len(frames), **members):
+            inputs = self.batch_buffer.fill(frames)
+        # A slot rewritten while it was copied holds a torn frame; its result is dropped below.
+        torn = [ring_slot is not None and not (camera_ip in self.rings and self.rings[camera_ip].is_current(*ring_slot))
+                for camera_ip, _, _, _, _, ring_slot, _ in batch]
+        with tracer.span('server.predict', frames=len(frames), **members):
+            results = self.backend.predict(inputs)
+        self.scheduler.observe_batch(time.perf_counter() - start, len(frames))
+
+        names = self.backend.names
+        for (camera_ip, request_id, frame, stream, sent_at, _, seq), result, is_torn in zip(batch, results, torn):
+            response_queue = self.response_queues.get(camera_ip)
+            if response_queue is None:
+                logging.warning(f"Dropping inference result for unregistered camera: {camera_ip}")
+                continue
+            if is_torn:
+                continue
+            with tracer.span('server.track', camera=camera_ip, seq=seq):
+                boxes = self._track((camera_ip, stream), result, frame)
+            self.scheduler.observe(camera_ip, stream, [names[int(c)] for c in boxes[:, 5]], time.time() - sent_at)
+            response_queue.put((request_id, boxes, names, self.scheduler.interval(camera_ip)))
+
+    def _rebalance(self):
+        self.scheduler.rebalance()
+        if self.status is not None and self.scheduler.last_rebalance != self.published_at:
+            self.published_at = self.scheduler.last_rebalance
+            try:
+                self.status.update(self.scheduler.status(), updated_at=self.published_at)
+            except Exception as e:
+                logging.error(f"Error publishing inference scheduler status: {e}")
+
+    def _track(self, stream: tuple, result: np.ndarray, frame) -> np.ndarray:
+        from ultralytics.trackers.byte_tracker import BYTETracker
+
+        # BYTETrack keeps lost tracks for a number of frames scaled by its frame rate. Give it the rate
+        # the scheduler has the camera analysed at, as replay does, and start over when that changes.
+        frame_rate = max(round(1 / self.scheduler.interval(stream[0])), 1)
+        if stream in self.trackers and self.trackers[stream][0] != frame_rate:
+            del self.trackers[stream]
+        if len(result) and stream not in self.trackers:
+            self.trackers[stream] = (frame_rate, BYTETracker(args=self.tracker_cfg, frame_rate=frame_rate))
+        return track(self.trackers[stream][1] if stream in self.trackers else None, result, frame)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class InferenceClient:
+    """
+    Camera-side handle for the inference server.
+
+    The client is picklable, so it can be handed to camera worker processes. `connect` must be called
+    in the worker before the first `infer`. `interval` holds the seconds between frames the server's
+    scheduler last asked this camera for, or `None` before the first answer.
+
+    With `ring_name`, `connect` attaches to that shared-memory `FrameRing`. Frames written into the
+    views returned by `frame_slot` are sent by reference; any other array is pickled through the queue.
+
+    A restarted worker connects the same client again: request ids and ring sequence numbers start
+    past those of the previous worker, whose requests may still be queued at the server.
+    """
+
+    def __init__(self, camera_ip: str, request_queue, response_queue, timeout: float = 10, ring_name: str = None,
+                 ring_slots: int = 0):
+        self.camera_ip = camera_ip
+        self.request_queue = request_queue
+        self.response_queue = response_queue
+        self.timeout = timeout
+        self.ring_name = ring_name
+        self.ring_slots = ring_slots
+        self.ring = None
+        self.interval = None
+        self._request_ids = itertools.count()
+
+    def connect(self):
+        if self.ring_name and self.ring is None:
+            self.ring = FrameRing(self.ring_slots, name=self.ring_name)
+            self.ring.reset()
+        self._request_ids = itertools.count(time.monotonic_ns())
+        ring_name, ring_slots = (self.ring.name, self.ring.slots) if self.ring else (None, 0)
+        self.request_queue.put((REGISTER, self.camera_ip, self.response_queue, ring_name, ring_slots))
+
+    def frame_slot(self, index: int):
+        """Shared-memory buffer to write frame `index` of the next request into, or `None` if there is none."""
+        if self.ring is None or index >= self.ring.slots:
+            return None
+        return self.ring.slot(index)
+
+    def infer(self, frame: np.ndarray):
+        return self.infer_many([frame])[0]
+
+    def infer_many(self, frames: list, seq: int = None) -> list:
+        """
+        Send several frames of this camera at once, e.g. one per ROI crop, so the server can batch them.
+
+        Frame `i` is tracked as stream `i` of the camera. `seq`, the grab count of the camera frame
+        they were cut from, labels the server's trace spans. Returns one `Detections` per frame, or
+        `None` for every frame when the server did not answer within the timeout.
+        """
+        request_ids = {}
+        for stream, frame in enumerate(frames):
+            request_id = next(self._request_ids)
+            request_ids[request_id] = stream
+            index = self.ring.index_of(frame) if self.ring else None
+            if index is None:
+                self.request_queue.put((INFER, self.camera_ip, request_id, frame, stream, time.time(), None, seq))
+            else:
+                ring_slot = (index, self.ring.publish(index))
+                self.request_queue.put((INFER, self.camera_ip, request_id, None, stream, time.time(), ring_slot,
+                                        seq))
+
+        detections = [None] * len(frames)
+        pending = len(frames)
+        deadline = time.monotonic() + self.timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logging.warning(f"Inference request timed out for camera: {self.camera_ip}")
+                return [None] * len(frames)
+            try:
+                response_id, boxes, names, interval = self.response_queue.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            stream = request_ids.get(response_id)
+            if stream is None:
+                # A late answer to a request that already timed out.
+                logging.debug(f"Discarding stale inference result {response_id} for camera: {self.camera_ip}")
+                continue
+            self.interval = interval
+            detections[stream] = Detections(boxes, names, frames[stream])
+            pending -= 1
+        return detections
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+class InferenceService:
+    """
+    Starts the inference server and hands out clients that talk to it.
+
+    Each camera has one client, with its response queue and frame ring, for as long as it is not
+    `release`d; workers restarted after a crash reuse them instead of leaking a new pair per start.
+    """
+
+    def __init__(self, backend: str, model_path: str, max_batch_size: int = 16, max_wait: float = 0.05,
+                 timeout: float = 10, scheduler: InferenceScheduler = None, ring_slots: int = 8):
+        # Response queues are manager proxies so that they can be sent to the running server on registration.
+        self.manager = multiprocessing.Manager()
+        self.request_queue = multiprocessing.Queue()
+        self.timeout = timeout
+        self.ring_slots = ring_slots
+        self.status = self.manager.dict()
+        self.clients = {}
+        self.rings = {}
+        self.server = InferenceServer(backend, model_path, self.request_queue, max_batch_size, max_wait,
+                                      scheduler=scheduler, status=self.status)
+
+    def start(self):
+        self.server.start()
+
+    def client(self, camera_ip: str) -> InferenceClient:
+        if camera_ip not in self.clients:
+            ring = self.rings[camera_ip] = FrameRing(self.ring_slots) if self.ring_slots else None
+            self.clients[camera_ip] = InferenceClient(camera_ip, self.request_queue, self.manager.Queue(),
+                                                      self.timeout, ring.name if ring else None, self.ring_slots)
+        return self.clients[camera_ip]
+
+    def release(self, camera_ip: str):
+        """Free the client of a removed camera once its worker has stopped."""
+        if self.clients.pop(camera_ip, None) is None:
+            return
+        self.request_queue.put((UNREGISTER, camera_ip))
+        ring = self.rings.pop(camera_ip)
+        if ring is not None:
+            ring.close()
+
+    def scheduler_status(self) -> dict:
+        """The scheduler's last published state: capacity, demand, per-camera intervals and lag, decisions."""
+        return dict(self.status)
+
+    def collect_metrics(self, metrics):
+        try:
+            metrics.set('inference_queue_depth', self.request_queue.qsize())
+        except NotImplementedError:
+            pass
+        status = self.scheduler_status()
+        if not status.get('frame_cost'):
+            return
+        metrics.set('inference_frame_cost_seconds', status['frame_cost'])
+        metrics.set('inference_capacity_fps', status['capacity'])
+        metrics.set('inference_demand_fps', status['demand'])
+        for camera_ip, camera in status['cameras'].items():
+            metrics.set('camera_interval_seconds', camera['interval'], camera=camera_ip)
+            metrics.set('camera_priority', camera['priority'], camera=camera_ip)
+            metrics.set('camera_lag_seconds', camera['lag'], camera=camera_ip)
+
+    def stop(self):
+        self.server.stop()
+        self.server.join(timeout=5)
+        for camera_ip in list(self.clients):
+            self.release(camera_ip)
+        self.manager.shutdown()
@@ -0,0 +1,87 @@
+import glob
+import os
+import random
+from typing import List
+
+import cv2
+import numpy as np
+
+from daemon.inference.preprocessing import BatchBuffer, LetterboxPreprocessor
+
+IMAGE_PATTERNS = ('*.jpeg', '*.jpg', '*.png')
+
+
+def load_sample_images(directory: str, limit: int, seed: int = 0) -> List[np.ndarray]:
+    """Pick up to `limit` images under `directory` at random and letterbox each into its own buffer."""
+    paths = sorted(path for pattern in IMAGE_PATTERNS
+                   for path in glob.glob(os.path.join(directory, '**', pattern), recursive=True))
+    random.Random(seed).shuffle(paths)
+
+    images = []
+    for path in paths:
+        if len(images) >= limit:
+            break
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        buffer, _, _, _ = LetterboxPreprocessor().letterbox(image)
+        images.append(buffer)
+    return images
+
+
+def run_backend(backend, images: List[np.ndarray], batch_size: int) -> List[np.ndarray]:
+    """Run `backend` over letterboxed `images` and return one (N, 6) array per image."""
+    batch_buffer = BatchBuffer(batch_size)
+    detections = []
+    for start in range(0, len(images), batch_size):
+        detections.extend(backend.predict(batch_buffer.fill(images[start:start + batch_size])))
+    return detections
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of two xyxy box arrays."""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def compare_detections(reference: List[np.ndarray], candidate: List[np.ndarray], iou_threshold: float = 0.5) -> dict:
+    """
+    Match the candidate model's detections against the reference model's, image by image.
+
+    A candidate box matches an unmatched reference box of the same class with IoU of at least
+    `iou_threshold`, greedily in order of confidence. Recall and precision are relative to the
+    reference, so they measure agreement between the two models rather than accuracy.
+    """
+    matched = reference_total = candidate_total = 0
+    ious, conf_deltas = [], []
+    for ref, cand in zip(reference, candidate):
+        reference_total += len(ref)
+        candidate_total += len(cand)
+        if len(ref) == 0 or len(cand) == 0:
+            continue
+        iou = box_iou(cand, ref)
+        iou[cand[:, 5, None] != ref[None, :, 5]] = 0
+        used = np.zeros(len(ref), dtype=bool)
+        for i in np.argsort(-cand[:, 4]):
+            scores = np.where(used, 0, iou[i])
+            j = int(scores.argmax())
+            if scores[j] >= iou_threshold:
+                used[j] = True
+                matched += 1
+                ious.append(scores[j])
+                conf_deltas.append(abs(float(cand[i, 4] - ref[j, 4])))
+
+    return {
+        'images': len(reference),
+        'reference_boxes': reference_total,
+        'candidate_boxes': candidate_total,
+        'matched': matched,
+        'recall': matched / reference_total if reference_total else 1.0,
+        'precision': matched / candidate_total if candidate_total else 1.0,
+        'mean_iou': float(np.mean(ious)) if ious else 0.0,
+        'max_conf_delta': max(conf_deltas, default=0.0),
+    }
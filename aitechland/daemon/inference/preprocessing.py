@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+
+INPUT_SIZE = 640
+PAD_VALUE = 114
+
+
+class LetterboxPreprocessor:
+    """
+    Letterboxes images into preallocated model-input buffers, one per slot.
+
+    The image is resized with its aspect ratio preserved straight into the centre of the slot's
+    buffer with `cv2.resize(dst=...)`, so no array is allocated per frame. The grey padding is only
+    redrawn when the geometry of a slot changes.
+    """
+
+    def __init__(self, size: int = INPUT_SIZE, pad_value: int = PAD_VALUE):
+        self.size = size
+        self.pad_value = pad_value
+        self.buffers = {}
+        self.geometry = {}
+
+    def letterbox(self, image: np.ndarray, slot: int = 0, out: np.ndarray = None) -> tuple:
+        """
+        Letterbox `image` into the buffer of `slot`, or into `out` (e.g. a shared-memory frame) when given.
+
+        Returns:
+            tuple: (buffer, scale, pad_x, pad_y); a point (x, y) in the buffer maps back to
+            ((x - pad_x) / scale, (y - pad_y) / scale) in the image.
+        """
+        if out is not None and self.buffers.get(slot) is not out:
+            self.buffers[slot] = out
+            self.geometry.pop(slot, None)
+        height, width = image.shape[:2]
+        geometry = self.geometry.get(slot)
+        if geometry is None or geometry[0] != (height, width):
+            geometry = self._layout(slot, height, width)
+        _, scale, pad_x, pad_y, new_width, new_height = geometry
+
+        buffer = self.buffers[slot]
+        cv2.resize(image, (new_width, new_height), dst=buffer[pad_y:pad_y + new_height, pad_x:pad_x + new_width],
+                   interpolation=cv2.INTER_LINEAR)
+        return buffer, scale, pad_x, pad_y
+
+    def _layout(self, slot: int, height: int, width: int) -> tuple:
+        scale = min(self.size / height, self.size / width)
+        new_width, new_height = round(width * scale), round(height * scale)
+        pad_x, pad_y = (self.size - new_width) // 2, (self.size - new_height) // 2
+
+        buffer = self.buffers.get(slot)
+        if buffer is None:
+            buffer = self.buffers[slot] = np.empty((self.size, self.size, 3), dtype=np.uint8)
+        buffer.fill(self.pad_value)
+
+        geometry = ((height, width), scale, pad_x, pad_y, new_width, new_height)
+        self.geometry[slot] = geometry
+        return geometry
+
+    @staticmethod
+    def unletterbox(boxes: np.ndarray, scale: float, pad_x: int, pad_y: int) -> np.ndarray:
+        """Map the xyxy columns of `boxes` from buffer coordinates back to image coordinates, in place."""
+        boxes[:, [0, 2]] -= pad_x
+        boxes[:, [1, 3]] -= pad_y
+        boxes[:, :4] /= scale
+        return boxes
+
+
+class BatchBuffer:
+    """
+    Preallocated float32 NCHW batch that the model consumes directly.
+
+    `fill` converts letterboxed BGR uint8 images to normalised RGB in place, so the model receives a
+    ready tensor and skips its own resize, copy and conversion steps.
+    """
+
+    def __init__(self, max_batch_size: int, size: int = INPUT_SIZE):
+        self.array = np.empty((max_batch_size, 3, size, size), dtype=np.float32)
+
+    def fill(self, images: list) -> np.ndarray:
+        batch = self.array[:len(images)]
+        for target, image in zip(batch, images):
+            np.copyto(target, image[..., ::-1].transpose(2, 0, 1))
+        np.multiply(batch, 1 / 255, out=batch)
+        return batch
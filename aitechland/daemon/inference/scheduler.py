@@ -0,0 +1,171 @@
+import collections
+import logging
+import time
+
+logging.basicConfig(level=logging.DEBUG)
+
+# Cameras with nothing to report are shed first under overload.
+IDLE_PRIORITY = 0
+
+
+class CameraSchedule:
+    def __init__(self, camera_ip: str, interval: float, now: float):
+        self.camera_ip = camera_ip
+        self.interval = interval
+        self.priority = IDLE_PRIORITY
+        self.streams = 1
+        self.last_active = None
+        self.last_seen = now
+        self.registered_at = now
+        self.lag = 0.0
+        self.frames = 0
+        self.shed = False
+
+
+class InferenceScheduler:
+    """
+    Host-wide inference budget shared by all cameras, owned by the inference server.
+
+    Each camera gets an interval between frames: `active_interval` while it reports prioritised
+    classes (and for `active_hold` seconds after), `base_interval` normally, and `idle_interval` once
+    it has seen nothing for `idle_after` seconds. The server measures the cost of a frame, and when
+    the cameras together would need more than `budget` of the server's time, the intervals of the
+    lowest-priority cameras are stretched first, up to `max_interval`, before higher priorities are
+    touched. `class_priority` maps class names to priorities; fire and smoke outrank head.
+
+    Intervals travel back to the cameras with every response. Per-camera lag and a log of the last
+    decisions are kept for `status`.
+    """
+
+    def __init__(self, budget: float = 0.9, active_interval: float = 0.25, base_interval: float = 1.0,
+                 idle_interval: float = 5.0, max_interval: float = 30.0, idle_after: float = 120,
+                 active_hold: float = 30, class_priority: dict = None, rebalance_interval: float = 1.0):
+        self.budget = budget
+        self.active_interval = active_interval
+        self.base_interval = base_interval
+        self.idle_interval = idle_interval
+        self.max_interval = max_interval
+        self.idle_after = idle_after
+        self.active_hold = active_hold
+        self.class_priority = class_priority or {'fire': 2, 'smoke': 2, 'head': 1}
+        self.rebalance_interval = rebalance_interval
+        self.cameras = {}
+        self.frame_cost = None
+        self.demand = 0.0
+        self.capacity = None
+        self.last_rebalance = 0.0
+        self.saturated = False
+        self.decisions = collections.deque(maxlen=50)
+
+    def register(self, camera_ip: str, now: float = None):
+        now = time.time() if now is None else now
+        self.cameras[camera_ip] = CameraSchedule(camera_ip, self.base_interval, now)
+
+    def interval(self, camera_ip: str) -> float:
+        schedule = self.cameras.get(camera_ip)
+        return schedule.interval if schedule else self.base_interval
+
+    def observe_batch(self, elapsed: float, frames: int):
+        """Track the server's cost per frame as an exponential moving average."""
+        cost = elapsed / frames
+        self.frame_cost = cost if self.frame_cost is None else 0.8 * self.frame_cost + 0.2 * cost
+
+    def observe(self, camera_ip: str, stream: int, class_names: list, lag: float, now: float = None):
+        """Record one answered frame of a camera: its stream index, detected class names and lag."""
+        now = time.time() if now is None else now
+        schedule = self.cameras.get(camera_ip)
+        if schedule is None:
+            # A camera dropped by `rebalance` while it was offline; its worker does not register again.
+            self.register(camera_ip, now)
+            schedule = self.cameras[camera_ip]
+            self._decide(now, f"{camera_ip}: frames again, back on the schedule")
+        schedule.streams = max(schedule.streams, stream + 1)
+        schedule.lag = 0.8 * schedule.lag + 0.2 * lag
+        schedule.frames += 1
+        schedule.last_seen = now
+        priority = max((self.class_priority.get(name, IDLE_PRIORITY) for name in class_names),
+                       default=IDLE_PRIORITY)
+        if priority > IDLE_PRIORITY:
+            schedule.last_active = now
+            schedule.priority = max(priority, schedule.priority)
+
+    def rebalance(self, now: float = None):
+        now = time.time() if now is None else now
+        if now - self.last_rebalance < self.rebalance_interval:
+            return
+        self.last_rebalance = now
+
+        # Cameras whose worker went away stop sending frames; drop them so they no longer count as demand.
+        for camera_ip in [ip for ip, schedule in self.cameras.items()
+                          if now - schedule.last_seen > 3 * max(self.max_interval, schedule.interval)]:
+            del self.cameras[camera_ip]
+            self._decide(now, f"{camera_ip}: no frames for a while, dropped from the schedule")
+
+        desired = {}
+        for schedule in self.cameras.values():
+            if schedule.last_active is not None and now - schedule.last_active < self.active_hold:
+                desired[schedule.camera_ip] = self.active_interval
+                continue
+            schedule.priority = IDLE_PRIORITY
+            quiet_since = schedule.last_active or schedule.registered_at
+            desired[schedule.camera_ip] = self.idle_interval if now - quiet_since >= self.idle_after \
+                else self.base_interval
+
+        intervals = self._shed(desired)
+        for camera_ip, interval in intervals.items():
+            schedule = self.cameras[camera_ip]
+            shed = interval > desired[camera_ip]
+            if shed != schedule.shed or not 0.8 < interval / schedule.interval < 1.25:
+                reason = 'shed under overload' if shed else ('active' if schedule.priority else 'idle')
+                self._decide(now, f"{camera_ip}: interval {schedule.interval:.2f}s -> {interval:.2f}s ({reason})")
+            schedule.interval = interval
+            schedule.shed = shed
+
+    def _shed(self, desired: dict) -> dict:
+        """Stretch intervals of the lowest priorities first until the demand fits the budget."""
+        intervals = dict(desired)
+        self.demand = sum(self.cameras[ip].streams / interval for ip, interval in intervals.items())
+        if not self.frame_cost:
+            return intervals
+        self.capacity = self.budget / self.frame_cost
+        excess = self.demand - self.capacity
+        for priority in sorted({schedule.priority for schedule in self.cameras.values()}):
+            if excess <= 0:
+                break
+            tier = [ip for ip in intervals if self.cameras[ip].priority == priority]
+            tier_demand = sum(self.cameras[ip].streams / intervals[ip] for ip in tier)
+            factor = tier_demand / max(tier_demand - excess, 1e-9)
+            shed_demand = 0.0
+            for ip in tier:
+                intervals[ip] = min(intervals[ip] * factor, max(self.max_interval, intervals[ip]))
+                shed_demand += self.cameras[ip].streams / intervals[ip]
+            excess -= tier_demand - shed_demand
+        saturated = excess > 0
+        if saturated and not self.saturated:
+            self._decide(time.time(), f"Over budget by {excess:.1f} frames/s with every camera shed")
+        self.saturated = saturated
+        return intervals
+
+    def _decide(self, now: float, message: str):
+        self.decisions.append((now, message))
+        logging.info(f"Inference scheduler: {message}")
+
+    def status(self) -> dict:
+        return {
+            'frame_cost': self.frame_cost,
+            'capacity': self.capacity,
+            'demand': self.demand,
+            'saturated': self.saturated,
+            'cameras': {
+                ip: {
+                    'interval': schedule.interval,
+                    'priority': schedule.priority,
+                    'streams': schedule.streams,
+                    'lag': schedule.lag,
+                    'frames': schedule.frames,
+                    'shed': schedule.shed,
+                }
+                for ip, schedule in self.cameras.items()
+            },
+            'decisions': list(self.decisions),
+        }
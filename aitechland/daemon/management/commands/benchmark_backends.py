@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from daemon.inference.backends import BACKENDS, default_model_path, load_backend
+from daemon.inference.model_validation import load_sample_images
+from daemon.inference.preprocessing import BatchBuffer, INPUT_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Compare latency and throughput of the inference backends per batch size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+        parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4, 8, 16])
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--images', default=settings.MEDIA_ROOT,
+                            help='Directory with sample frames; random frames are used when empty')
+
+    def handle(self, *args, **options):
+        batch_sizes = options['batch_sizes']
+        images = load_sample_images(options['images'], max(batch_sizes))
+        if not images:
+            self.stdout.write("No sample images found, using random frames")
+        while len(images) < max(batch_sizes):
+            images.append(np.random.randint(0, 255, (INPUT_SIZE, INPUT_SIZE, 3), dtype=np.uint8))
+
+        self.stdout.write(f"{'backend':>12} {'batch':>5} {'p50 ms':>9} {'p99 ms':>9} {'frames/s':>9}")
+        for name in options['backends']:
+            try:
+                backend = load_backend(name, default_model_path(name, settings.NEURAL_PATH))
+            except Exception as e:
+                self.stderr.write(f"Skipping {name}: {e}")
+                continue
+            for batch_size in batch_sizes:
+                batch = BatchBuffer(batch_size).fill(images[:batch_size])
+                latencies = self.measure(backend, batch, options['warmup'], options['iterations'])
+                p50, p99 = np.percentile(latencies, [50, 99])
+                self.stdout.write(f"{name:>12} {batch_size:>5} {p50 * 1e3:9.2f} {p99 * 1e3:9.2f} "
+                                  f"{batch_size / np.mean(latencies):9.1f}")
+
+    @staticmethod
+    def measure(backend, batch: np.ndarray, warmup: int, iterations: int) -> np.ndarray:
+        for _ in range(warmup):
+            backend.predict(batch)
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            backend.predict(batch)
+            latencies.append(time.perf_counter() - start)
+        return np.array(latencies)
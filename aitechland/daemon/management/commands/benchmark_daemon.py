@@ -0,0 +1,202 @@
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import psutil
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from daemon.benchmarking import SyntheticSource, VideoSource, run_benchmark_worker
+from daemon.inference.backends import configured_backend
+from daemon.inference.inference_server import InferenceService
+from daemon.inference.scheduler import InferenceScheduler
+
+# Metrics compared against the baseline, and whether higher values are better.
+COMPARED = {'fps': True, 'p50_ms': False, 'p99_ms': False, 'cpu_percent': False, 'rss_mib': False}
+
+
+class Command(BaseCommand):
+    help = 'Measure end-to-end daemon throughput, latency and resources for a growing number of cameras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cameras', nargs='+', type=int, default=[1, 4, 8])
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run each camera count')
+        parser.add_argument('--videos', nargs='+', default=[],
+                            help='Local video files played back as cameras; generated frames when omitted')
+        parser.add_argument('--width', type=int, default=1920)
+        parser.add_argument('--height', type=int, default=1080)
+        parser.add_argument('--source-fps', type=float, default=25, help='Frame rate of the simulated streams')
+        parser.add_argument('--fps', type=float, default=4, help='Frames per second each camera asks to analyse')
+        parser.add_argument('--stub', type=float, default=None, metavar='MS',
+                            help='Use the deterministic stub detector costing MS per frame instead of the weights')
+        parser.add_argument('--adaptive', action='store_true',
+                            help='Let the configured scheduler set the intervals instead of a fixed --fps')
+        parser.add_argument('--motion-threshold', type=float, default=0,
+                            help='Motion gate of the cameras; 0 sends every analysed frame to the detector')
+        parser.add_argument('--baseline', help='JSON file with a previous run to compare against')
+        parser.add_argument('--save-baseline', help='Write the results of this run to a JSON file')
+        parser.add_argument('--tolerance', type=float, default=0.1,
+                            help='Relative change against the baseline reported as a regression')
+
+    def handle(self, *args, **options):
+        if options['stub'] is not None:
+            backend, model_path = 'stub', str(options['stub'])
+        else:
+            backend, model_path = configured_backend()
+        for video in options['videos']:
+            if not os.path.exists(video):
+                raise CommandError(f"Video not found: {video}")
+
+        self.stdout.write(f"{backend} backend, {options['fps']:g} frames/s per camera, {options['duration']:g}s runs")
+        self.stdout.write(f"{'cameras':>7} {'frames/s':>9} {'per cam':>8} {'p50 ms':>8} {'p99 ms':>8} "
+                          f"{'cpu %/cam':>9} {'MiB/cam':>8} {'srv cpu %':>9} {'srv MiB':>8} {'timeouts':>8}")
+        results = {}
+        for cameras in options['cameras']:
+            result = self.run(cameras, backend, model_path, options)
+            results[str(cameras)] = result
+            self.stdout.write(f"{cameras:>7} {result['fps']:9.1f} {result['fps'] / cameras:8.2f} "
+                              f"{result['p50_ms']:8.1f} {result['p99_ms']:8.1f} {result['cpu_percent']:9.1f} "
+                              f"{result['rss_mib']:8.1f} {result['server_cpu_percent']:9.1f} "
+                              f"{result['server_rss_mib']:8.1f} {result['timeouts']:>8}")
+
+        report = {'backend': backend, 'fps': options['fps'], 'videos': options['videos'], 'runs': results}
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Saved baseline to {options['save_baseline']}")
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['tolerance'])
+
+    def run(self, cameras: int, backend: str, model_path: str, options: dict) -> dict:
+        if options['adaptive']:
+            scheduler = None
+        else:
+            # Every camera keeps the requested rate; overload shows up as lag and lower throughput.
+            interval = 1 / options['fps']
+            scheduler = InferenceScheduler(budget=float('inf'), active_interval=interval, base_interval=interval,
+                                           idle_interval=interval)
+        service = InferenceService(
+            backend, model_path,
+            max_batch_size=getattr(settings, 'INFERENCE_MAX_BATCH_SIZE', 16),
+            max_wait=getattr(settings, 'INFERENCE_MAX_WAIT', 0.05),
+            timeout=getattr(settings, 'INFERENCE_TIMEOUT', 10),
+            ring_slots=getattr(settings, 'INFERENCE_RING_SLOTS', 8),
+            scheduler=scheduler,
+        )
+        service.start()
+        save_path = tempfile.mkdtemp(prefix='benchmark_daemon_')
+        record_queue = multiprocessing.Queue()
+        result_queue = multiprocessing.Queue()
+        records = []
+        stop_event = threading.Event()
+        drain = threading.Thread(target=self.drain, args=(record_queue, records, stop_event), daemon=True)
+        drain.start()
+
+        workers = []
+        for index in range(cameras):
+            camera_ip = f'10.254.{index // 250}.{index % 250 + 1}'
+            if options['videos']:
+                source = VideoSource(options['videos'][index % len(options['videos'])])
+            else:
+                source = SyntheticSource(options['width'], options['height'], seed=index)
+            process = multiprocessing.Process(
+                target=run_benchmark_worker,
+                args=(camera_ip, source, service.client(camera_ip), record_queue, result_queue, options['duration'],
+                      options['fps'], options['source_fps'], save_path, options['motion_threshold']),
+                name=f'benchmark-{camera_ip}',
+            )
+            process.start()
+            workers.append(process)
+
+        try:
+            usage = self.sample_usage([worker.pid for worker in workers], service.server.pid, options['duration'])
+            camera_results = [result_queue.get(timeout=options['duration'] + 60) for _ in workers]
+        except queue.Empty:
+            raise CommandError("A benchmark worker did not report back")
+        finally:
+            for worker in workers:
+                worker.join(timeout=10)
+                if worker.is_alive():
+                    worker.terminate()
+            stop_event.set()
+            drain.join()
+            service.stop()
+            shutil.rmtree(save_path, ignore_errors=True)
+
+        latencies = np.concatenate([result['latencies'] for result in camera_results] + [[]]) * 1e3
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0.0, 0.0)
+        return {
+            'fps': sum(result['frames_analysed'] for result in camera_results) / options['duration'],
+            'inferred_fps': sum(result['frames_inferred'] for result in camera_results) / options['duration'],
+            'p50_ms': float(p50),
+            'p99_ms': float(p99),
+            'timeouts': sum(result['timeouts'] for result in camera_results),
+            'alarms': len(records),
+            **usage,
+        }
+
+    @staticmethod
+    def drain(record_queue, records: list, stop_event: threading.Event):
+        # Stands in for the DetectionWriter so the benchmark leaves the database alone.
+        while not stop_event.is_set() or not record_queue.empty():
+            try:
+                records.append(record_queue.get(timeout=0.5))
+            except queue.Empty:
+                continue
+
+    @staticmethod
+    def sample_usage(worker_pids: list, server_pid: int, duration: float) -> dict:
+        """Mean CPU and peak RSS per camera worker and of the inference server, sampled every second."""
+        processes = [psutil.Process(pid) for pid in worker_pids]
+        server = psutil.Process(server_pid)
+        for process in processes + [server]:
+            process.cpu_percent()
+        cpu, server_cpu, rss, server_rss = [], [], {}, 0
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            time.sleep(1)
+            try:
+                cpu.append(np.mean([process.cpu_percent() for process in processes]))
+                server_cpu.append(server.cpu_percent())
+                for process in processes:
+                    rss[process.pid] = max(rss.get(process.pid, 0), process.memory_info().rss)
+                server_rss = max(server_rss, server.memory_info().rss)
+            except psutil.NoSuchProcess:
+                break
+        return {
+            'cpu_percent': float(np.mean(cpu)) if cpu else 0.0,
+            'rss_mib': float(np.mean(list(rss.values()))) / 2 ** 20 if rss else 0.0,
+            'server_cpu_percent': float(np.mean(server_cpu)) if server_cpu else 0.0,
+            'server_rss_mib': server_rss / 2 ** 20,
+        }
+
+    def compare(self, report: dict, baseline_path: str, tolerance: float):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if (baseline.get('backend'), baseline.get('fps')) != (report['backend'], report['fps']):
+            self.stderr.write(f"Baseline ran the {baseline.get('backend')} backend at {baseline.get('fps')} "
+                              f"frames/s; the comparison is only indicative")
+
+        regressions = []
+        for cameras, result in report['runs'].items():
+            previous = baseline['runs'].get(cameras)
+            if previous is None:
+                continue
+            for metric, higher_is_better in COMPARED.items():
+                if not previous.get(metric):
+                    continue
+                change = (result[metric] - previous[metric]) / previous[metric]
+                if (-change if higher_is_better else change) > tolerance:
+                    regressions.append(f"{cameras} cameras: {metric} {previous[metric]:.1f} -> "
+                                       f"{result[metric]:.1f} ({change:+.0%})")
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f"{len(regressions)} regressions against {baseline_path}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline_path}"))
@@ -0,0 +1,57 @@
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from daemon.inference.preprocessing import BatchBuffer, LetterboxPreprocessor, INPUT_SIZE
+
+
+def stretch_preprocess(frame: np.ndarray) -> np.ndarray:
+    """The previous path: stretch to 640x640, then the model's own stack, flip, transpose and scale."""
+    resized = cv2.resize(frame, (INPUT_SIZE, INPUT_SIZE), interpolation=cv2.INTER_LINEAR)
+    batch = np.stack([resized])
+    batch = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2))
+    return batch.astype(np.float32) / 255
+
+
+class Command(BaseCommand):
+    help = 'Compare per-frame time and allocations of the stretch and preallocated letterbox preprocessing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=1920)
+        parser.add_argument('--height', type=int, default=1080)
+        parser.add_argument('--frames', type=int, default=200)
+
+    def handle(self, *args, **options):
+        frame = np.random.randint(0, 255, (options['height'], options['width'], 3), dtype=np.uint8)
+        preprocessor = LetterboxPreprocessor()
+        batch_buffer = BatchBuffer(1)
+
+        def letterbox_preprocess(image):
+            buffer, _, _, _ = preprocessor.letterbox(image)
+            return batch_buffer.fill([buffer])
+
+        for name, preprocess in (('stretch', stretch_preprocess), ('letterbox', letterbox_preprocess)):
+            elapsed, allocated = self.measure(preprocess, frame, options['frames'])
+            self.stdout.write(f"{name:>10}: {elapsed * 1e3:7.3f} ms/frame, "
+                              f"{allocated / 1024:9.1f} KiB peak allocation/frame")
+
+    @staticmethod
+    def measure(preprocess, frame: np.ndarray, frames: int) -> tuple:
+        preprocess(frame)  # Warm up and create any lazily allocated buffers.
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            preprocess(frame)
+        elapsed = (time.perf_counter() - start) / frames
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        for _ in range(frames):
+            before = tracemalloc.get_traced_memory()[0]
+            preprocess(frame)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, peak - before
@@ -0,0 +1,152 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from safety_detection.metadata_registry import metadata_registry
+from safety_detection.models import DetectionClasses, Image
+from safety_detection.pagination import MAX_MERGED_PARTS, merged_sql, seek
+from safety_detection.views import (ALARM_COLUMNS, ALARM_ORDER_KEYS, export_queryset, filter_images,
+                                    latest_alarms)
+
+READS_IMAGE = re.compile(r'\b(SCAN|SEARCH) image\b|\bScan\b.* on image\b')
+FULL_SCAN = re.compile(r'\bSCAN image\b(?!.*\bUSING (COVERING )?INDEX\b)|\bSeq Scan on image\b')
+SORT = re.compile(r'USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY|^\s*(->\s*)?(Incremental )?Sort\b')
+
+
+def sqlite_sorts_image(plan: str) -> bool:
+    """
+    Whether a sort in an SQLite plan ("id parent notused detail" lines) orders rows read from image.
+
+    Sorts next to a scan of a subquery, such as the arms of a merged page, only order the at most
+    `LIMIT` rows that subquery returned.
+    """
+    children = {}
+    for line in plan.splitlines():
+        node_id, parent, _, detail = line.split(' ', 3)
+        children.setdefault(parent, []).append(detail)
+    return any(any(SORT.search(detail) for detail in details) and any(READS_IMAGE.search(detail)
+                                                                      for detail in details)
+               for details in children.values())
+
+
+def postgresql_sorts_image(plan: str) -> bool:
+    """Whether a Sort node in a PostgreSQL plan reads its rows straight from a scan of image."""
+    lines = plan.splitlines()
+    for index, line in enumerate(lines):
+        if SORT.search(line):
+            child = next((child for child in lines[index + 1:] if child.strip().startswith('->')), '')
+            if READS_IMAGE.search(child):
+                return True
+    return False
+
+
+PLAN_CHECKS = {
+    'sqlite': sqlite_sorts_image,
+    'postgresql': postgresql_sorts_image,
+}
+
+
+def plan_problems(plan: str, vendor: str) -> list:
+    if vendor not in PLAN_CHECKS:
+        return []
+    problems = ['full scan of image'] if FULL_SCAN.search(plan) else []
+    if PLAN_CHECKS[vendor](plan):
+        problems.append('sort')
+    return problems
+
+
+def explain(query) -> str:
+    """The plan of a queryset, or of an (sql, params) pair, formatted as `QuerySet.explain()` does."""
+    if not isinstance(query, tuple):
+        return query.explain()
+    sql, params = query
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+        return '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = ('Explain the queries behind alarm_show, alarm_index and the alarm export and check that they '
+            'read the image indexes instead of scanning and sorting the table')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--camera', default=None, help='Camera IP to filter on; the first camera by default')
+        parser.add_argument('--class', dest='class_name', default=None,
+                            help='Detection class to filter on; the first class by default')
+        parser.add_argument('--days', type=int, default=7, help='Length of the date range filter')
+        parser.add_argument('--some-cameras', type=int, default=5,
+                            help='Number of cameras in the case of a user who may see only some of them')
+        parser.add_argument('--no-analyze', action='store_true',
+                            help='Do not refresh the planner statistics before explaining')
+
+    def handle(self, *args, **options):
+        cameras = metadata_registry.cameras()
+        camera_ip = options['camera'] or next(iter(cameras), None)
+        if camera_ip not in cameras:
+            raise CommandError(f"No camera with IP {camera_ip}" if camera_ip else "There are no cameras")
+        class_name = options['class_name'] or DetectionClasses.objects.order_by('id').values_list(
+            'name', flat=True).first()
+        if metadata_registry.class_id(class_name) is None:
+            raise CommandError(f"No detection class {class_name}" if class_name else "There are no detection classes")
+
+        vendor = connection.vendor
+        if vendor not in PLAN_CHECKS:
+            self.stdout.write(self.style.WARNING(f"No plan checks for {vendor}; only showing the plans"))
+        elif not options['no_analyze']:
+            # Without statistics the planner may pick a worse index than it would on a live database.
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        today = timezone.localdate()
+        date_range = {'fromDate': str(today - timedelta(days=options['days'])), 'toDate': str(today)}
+        newest_first = [f'-{key}' for key in ALARM_ORDER_KEYS]
+        # The cursor of a page somewhere in the past, as the "next page" links carry it.
+        cursor = [timezone.now() - timedelta(days=1), 0]
+        camera_ids = [camera['id'] for camera in cameras.values()]
+        some_camera_ids = camera_ids[:options['some_cameras']]
+
+        def page(images):
+            return images.values(*ALARM_COLUMNS).order_by(*newest_first)[:21]
+
+        def merged_page(ids, after=None):
+            # The per-camera merge alarm_index uses for several cameras, as long as there are not too many.
+            images = Image.objects.filter(camera_id__in=ids).values(*ALARM_COLUMNS)
+            if after is not None:
+                images = seek(images, ALARM_ORDER_KEYS, after, older=True)
+            if 1 < len(ids) <= MAX_MERGED_PARTS:
+                return merged_sql(images, ('camera_id', ids), newest_first, 21)
+            return images.order_by(*newest_first)[:21]
+
+        queries = {
+            'alarm_show': latest_alarms(camera_ip),
+            'alarm_index, all cameras': merged_page(camera_ids),
+            'alarm_index, some cameras': merged_page(some_camera_ids),
+            'alarm_index, some cameras, next page': merged_page(some_camera_ids, after=cursor),
+            'alarm_index, merged page rows': Image.objects.filter(pk__in=[1, 2, 3]).values(*ALARM_COLUMNS),
+            'alarm_index, camera': page(filter_images({'cameraIP': [camera_ip]})),
+            'alarm_index, camera, next page': page(seek(filter_images({'cameraIP': [camera_ip]}), ALARM_ORDER_KEYS,
+                                                        cursor, older=True)),
+            'alarm_index, class': page(filter_images({'detectionClass': class_name})),
+            'alarm_index, dates': page(filter_images(date_range)),
+            'export, camera and dates': export_queryset(filter_images({'cameraIP': [camera_ip], **date_range})),
+            'export, class': export_queryset(filter_images({'detectionClass': class_name})),
+        }
+
+        failed = []
+        for name, query in queries.items():
+            plan = explain(query)
+            problems = plan_problems(plan, vendor)
+            if problems:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f"{name}: {', '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{name}: ok"))
+            if problems or options['verbosity'] > 1:
+                self.stdout.write(f"    {plan}".replace('\n', '\n    '))
+
+        if failed:
+            raise CommandError(f"{len(failed)} of {len(queries)} queries do not use the image indexes: "
+                               f"{', '.join(failed)}")
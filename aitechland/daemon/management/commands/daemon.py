@@ -1,12 +1,18 @@
+import os
+import signal
 import time
 import logging
 import multiprocessing
-from multiprocessing import Pool
-import threading
 from django.conf import settings
 from django.core.management.base import BaseCommand
-from daemon.camera_processing.camera_stream_viewer import CameraStreamViewer
-from safety_detection.models import Camera
+from daemon.camera_processing.camera_supervisor import CameraSupervisor
+from daemon.camera_processing.detection_saver import DetectionWriter
+from daemon.inference.backends import BACKENDS, configured_backend
+from daemon.inference.inference_server import InferenceService
+from daemon.inference.scheduler import InferenceScheduler
+from daemon.metrics import MetricsServer
+from daemon.tracing import tracer
+from safety_detection.metadata_registry import metadata_registry
 
 logging.basicConfig(level=logging.INFO)
 
@@ -16,111 +22,131 @@ class Command(BaseCommand):
 
     def __init__(self, stdout=None, stderr=None, no_color=False, force_color=False):
         super().__init__(stdout, stderr, no_color, force_color)
-        self.initial_cameras = None
+        self.inference_service = None
+        self.supervisor = None
+        self.detection_writer = None
+        self.metrics_server = None
 
     def handle(self, *args, **kwargs):
         self.stdout.write("Starting daemon...")
-        self.initial_cameras = set(Camera.objects.filter(is_run_daemon=True).values_list('ip_address', flat=True))
-        self.daemonize()
-
-    def daemonize(self):
-        # Start the process cameras in a separate thread
-        camera_thread = threading.Thread(target=self.run_camera_processing)
-        camera_thread.start()
-
-        while True:
-            try:
-                self.stdout.write("Daemon is working...")
-                self.check_for_new_cameras()
-            except Exception as e:
-                logging.error(f"Error in daemon process: {e}")
-            time.sleep(10)  # Sleep for 10 seconds
-
-    def run_camera_processing(self):
-        while True:
-            try:
-                self.process_cameras()
-            except Exception as e:
-                logging.error(f"Error processing cameras: {e}")
-            time.sleep(60)  # Refresh camera list every 60 seconds
-
-    def check_for_new_cameras(self):
-        current_cameras = set(Camera.objects.filter(is_run_daemon=True).values_list('ip_address', flat=True))
-        new_cameras = current_cameras - self.initial_cameras
-
-        if new_cameras:
-            for ip_address in new_cameras:
-                camera = Camera.objects.get(ip_address=ip_address)
-                camera_data = (camera.ip_address, camera.rtsp_port, camera.channel_id,
-                               camera.credential_for_ip.camera_login, camera.credential_for_ip.camera_password)
-                self.add_camera(camera_data)
-
-            self.initial_cameras = current_cameras
-
-    def process_cameras(self):
-        cameras = Camera.objects.select_related('credential_for_ip').filter(is_run_daemon=True)
-        camera_data = [(camera.ip_address, camera.rtsp_port, camera.channel_id,
-                        camera.credential_for_ip.camera_login, camera.credential_for_ip.camera_password)
-                       for camera in cameras]
-        self.start_processing(camera_data)
-
-    def start_processing(self, data):
-        num_cores = max(multiprocessing.cpu_count(), 8)  # Adjust as needed
         weights_path = getattr(settings, 'NEURAL_PATH', None)
         if not weights_path:
             logging.error("Weights path is not defined in settings.")
             return
+        backend, model_path = configured_backend()
+        if backend not in BACKENDS:
+            logging.error(f"Unknown inference backend in settings: {backend}")
+            return
 
-        with Pool(processes=num_cores) as pool:
-            pool.map(self.stream_camera, [(camera_data, weights_path) for camera_data in data])
-
-    @staticmethod
-    def stream_camera(args):
-        camera_data, weights_path = args
-        ip_address, rtsp_port, channel_id, camera_login, camera_password = camera_data
-        video_url = (
-            f"rtsp://{camera_login}:{camera_password}@{ip_address}:{rtsp_port}"
-            f"/cam/realmonitor?channel={channel_id}&subtype=0&unicast=true&proto=Onvif"
+        # Configured before any process is forked, so the inference server and workers inherit it.
+        self.configure_tracing()
+        self.inference_service = InferenceService(
+            backend,
+            model_path,
+            max_batch_size=getattr(settings, 'INFERENCE_MAX_BATCH_SIZE', 16),
+            max_wait=getattr(settings, 'INFERENCE_MAX_WAIT', 0.05),
+            timeout=getattr(settings, 'INFERENCE_TIMEOUT', 10),
+            ring_slots=getattr(settings, 'INFERENCE_RING_SLOTS', 8),
+            scheduler=InferenceScheduler(
+                budget=getattr(settings, 'SCHEDULER_BUDGET', 0.9),
+                active_interval=getattr(settings, 'SCHEDULER_ACTIVE_INTERVAL', 0.25),
+                base_interval=getattr(settings, 'SCHEDULER_BASE_INTERVAL', 1.0),
+                idle_interval=getattr(settings, 'SCHEDULER_IDLE_INTERVAL', 5.0),
+                max_interval=getattr(settings, 'SCHEDULER_MAX_INTERVAL', 30.0),
+                idle_after=getattr(settings, 'SCHEDULER_IDLE_AFTER', 120),
+                active_hold=getattr(settings, 'SCHEDULER_ACTIVE_HOLD', 30),
+                class_priority=getattr(settings, 'SCHEDULER_CLASS_PRIORITY', None),
+            ),
         )
-        logging.info(f"Processing camera: {video_url}")
-
-        viewer = CameraStreamViewer(video_url, weights_path)
+        self.inference_service.start()
+        # Every camera worker encodes its own JPEGs; the rows are written here in batches.
+        record_queue = multiprocessing.Queue(maxsize=getattr(settings, 'DETECTION_RECORD_QUEUE_SIZE', 10000))
+        self.detection_writer = DetectionWriter(
+            record_queue,
+            batch_size=getattr(settings, 'DETECTION_BATCH_SIZE', 100),
+            flush_interval=getattr(settings, 'DETECTION_FLUSH_INTERVAL', 1.0),
+        )
+        self.detection_writer.start()
+        metrics_port = getattr(settings, 'METRICS_PORT', None)
+        metrics_queue = multiprocessing.Queue(maxsize=1000) if metrics_port else None
+        self.supervisor = CameraSupervisor(
+            self.inference_service,
+            record_queue,
+            backoff_base=getattr(settings, 'CAMERA_RESTART_BACKOFF', 5),
+            backoff_max=getattr(settings, 'CAMERA_RESTART_BACKOFF_MAX', 300),
+            metrics_queue=metrics_queue,
+            metrics_interval=getattr(settings, 'METRICS_PUSH_INTERVAL', 5),
+        )
+        if metrics_port:
+            self.metrics_server = MetricsServer(
+                metrics_queue,
+                host=getattr(settings, 'METRICS_HOST', '127.0.0.1'),
+                port=metrics_port,
+                collectors=[
+                    self.inference_service.collect_metrics,
+                    self.supervisor.collect_metrics,
+                    lambda metrics: metrics.set('record_queue_depth', record_queue.qsize()),
+                ],
+            )
+            self.metrics_server.start()
         try:
-            viewer.start()
+            self.daemonize()
         finally:
-            viewer.release()
-
-    @staticmethod
-    def handle_new_camera(camera_data):
-        ip_address, rtsp_port, channel_id, camera_login, camera_password = camera_data
-        video_url = (
-            f"rtsp://{camera_login}:{camera_password}@{ip_address}:{rtsp_port}"
-            f"/cam/realmonitor?channel={channel_id}&subtype=0&unicast=true&proto=Onvif"
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+            self.supervisor.stop_all()
+            self.detection_writer.stop()
+            self.inference_service.stop()
+            self.remove_pid_file()
+
+    def configure_tracing(self):
+        tracer.configure(
+            getattr(settings, 'TRACE_ENABLED', False),
+            capacity=getattr(settings, 'TRACE_CAPACITY', 20000),
+            directory=str(getattr(settings, 'TRACE_DIR', 'traces')),
         )
-        logging.info(f"Handling new camera: {video_url}")
+        tracer.reset('daemon')
+        tracer.install(on_signal=self.forward_trace_signal)
+        # `dump_trace` finds the daemon through this file.
+        os.makedirs(tracer.directory, exist_ok=True)
+        with open(os.path.join(tracer.directory, 'daemon.pid'), 'w') as f:
+            f.write(str(os.getpid()))
+
+    def forward_trace_signal(self):
+        if self.supervisor is not None:
+            self.supervisor.signal_workers(signal.SIGUSR1)
+        server = self.inference_service.server if self.inference_service is not None else None
+        if server is not None and server.is_alive():
+            os.kill(server.pid, signal.SIGUSR1)
 
-        weights_path = getattr(settings, 'NEURAL_PATH', None)
-        if not weights_path:
-            logging.error("Weights path is not defined in settings.")
-            return
-
-        viewer = CameraStreamViewer(video_url, weights_path)
+    @staticmethod
+    def remove_pid_file():
         try:
-            viewer.start()
-        finally:
-            viewer.release()
+            os.remove(os.path.join(tracer.directory, 'daemon.pid'))
+        except FileNotFoundError:
+            pass
 
-    def add_camera(self, camera_data):
-        ip_address, rtsp_port, channel_id, camera_login, camera_password = camera_data
-        logging.info(f"Adding new camera: {ip_address}")
+    def daemonize(self):
+        while True:
+            try:
+                self.stdout.write("Daemon is working...")
+                self.supervisor.sync(self.get_camera_data())
+                self.supervisor.check_workers()
+                self.log_scheduler_status()
+            except Exception as e:
+                logging.error(f"Error in daemon process: {e}")
+            time.sleep(10)  # Sleep for 10 seconds
 
-        # Assuming Camera.objects.create(...) or similar logic to add a new camera to the database
-        # After adding the camera, call handle_new_camera to start processing the new camera
-        self.handle_new_camera(camera_data)
+    def log_scheduler_status(self):
+        status = self.inference_service.scheduler_status()
+        if not status.get('frame_cost'):
+            return
+        logging.info(f"Inference: {status['demand']:.1f} of {status['capacity']:.1f} frames/s, "
+                     f"{status['frame_cost'] * 1e3:.1f} ms/frame")
+        for camera_ip, camera in sorted(status['cameras'].items()):
+            logging.info(f"  {camera_ip}: every {camera['interval']:.2f}s, priority {camera['priority']}, "
+                         f"lag {camera['lag'] * 1e3:.0f} ms{', shed' if camera['shed'] else ''}")
 
     @staticmethod
-    def remove_camera(camera_ip):
-        logging.info(f"Removing camera: {camera_ip}")
-
-        # Assuming Camera.objects.filter(ip_address=camera_ip).delete() or similar logic to remove a camera
-        # Perform any cleanup tasks as needed
+    def get_camera_data():
+        return [camera for camera in metadata_registry.cameras().values() if camera['is_run_daemon']]
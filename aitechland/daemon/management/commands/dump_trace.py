@@ -0,0 +1,50 @@
+import glob
+import json
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from daemon.tracing import merge_traces
+
+
+class Command(BaseCommand):
+    help = 'Ask the running daemon to dump its frame traces and merge them into one Chrome/Perfetto trace file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pid', type=int, default=None, help='Daemon process; read from TRACE_DIR by default')
+        parser.add_argument('--wait', type=float, default=3, help='Seconds to wait for the processes to dump')
+        parser.add_argument('--output', default=None, help='Merged trace file; in TRACE_DIR by default')
+
+    def handle(self, *args, **options):
+        directory = str(getattr(settings, 'TRACE_DIR', 'traces'))
+        pid = options['pid'] or self.read_pid(directory)
+        requested_at = time.time()
+        try:
+            os.kill(pid, signal.SIGUSR1)
+        except ProcessLookupError:
+            raise CommandError(f"No daemon running with pid {pid}")
+
+        time.sleep(options['wait'])
+        paths = [path for path in glob.glob(os.path.join(directory, 'trace-*-*.json'))
+                 if os.path.getmtime(path) >= requested_at]
+        if not paths:
+            raise CommandError(f"No traces were dumped to {directory}; is TRACE_ENABLED set for the daemon?")
+
+        trace = merge_traces(paths)
+        output = options['output'] or os.path.join(directory, f"daemon-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(output, 'w') as f:
+            json.dump(trace, f)
+        spans = sum(1 for event in trace['traceEvents'] if event['ph'] == 'X')
+        self.stdout.write(self.style.SUCCESS(f"Merged {spans} spans from {len(paths)} processes into {output}; "
+                                             f"open it in ui.perfetto.dev or chrome://tracing"))
+
+    @staticmethod
+    def read_pid(directory: str) -> int:
+        try:
+            with open(os.path.join(directory, 'daemon.pid')) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            raise CommandError(f"No daemon pid file in {directory}; pass --pid")
@@ -0,0 +1,54 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from daemon.inference.backends import default_model_path, load_backend
+from daemon.inference.model_validation import compare_detections, load_sample_images, run_backend
+
+FORMATS = {'onnx': 'onnxruntime', 'openvino': 'openvino'}
+
+
+class Command(BaseCommand):
+    help = 'Export NEURAL_PATH to ONNX or OpenVINO and check that it agrees with the .pt model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='onnx')
+        parser.add_argument('--images', default=settings.MEDIA_ROOT,
+                            help='Directory with sample frames to validate on')
+        parser.add_argument('--samples', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=8)
+        parser.add_argument('--conf', type=float, default=0.25)
+        parser.add_argument('--min-recall', type=float, default=0.95,
+                            help='Fail when fewer of the .pt boxes are reproduced by the exported model')
+        parser.add_argument('--skip-export', action='store_true', help='Only validate an existing export')
+
+    def handle(self, *args, **options):
+        from ultralytics import YOLO
+
+        weights_path = settings.NEURAL_PATH
+        backend = FORMATS[options['format']]
+        model_path = default_model_path(backend, weights_path)
+
+        if not options['skip_export']:
+            # A dynamic batch axis lets the inference server send batches of any size.
+            YOLO(weights_path).export(format=options['format'], imgsz=640, dynamic=True, simplify=True)
+        if not os.path.exists(model_path):
+            raise CommandError(f"Exported model not found: {model_path}")
+        self.stdout.write(f"Exported model: {model_path}")
+
+        images = load_sample_images(options['images'], options['samples'])
+        if not images:
+            raise CommandError(f"No sample images found in {options['images']}")
+
+        reference = run_backend(load_backend('torch', weights_path, options['conf']), images, options['batch_size'])
+        candidate = run_backend(load_backend(backend, model_path, options['conf']), images, options['batch_size'])
+        report = compare_detections(reference, candidate)
+
+        self.stdout.write(f"{report['images']} images, {report['reference_boxes']} .pt boxes, "
+                          f"{report['candidate_boxes']} {backend} boxes, {report['matched']} matched")
+        self.stdout.write(f"recall {report['recall']:.3f}, precision {report['precision']:.3f}, "
+                          f"mean IoU {report['mean_iou']:.3f}, max confidence delta {report['max_conf_delta']:.3f}")
+        if report['recall'] < options['min_recall']:
+            raise CommandError(f"Exported model reproduces only {report['recall']:.1%} of the .pt detections")
+        self.stdout.write(self.style.SUCCESS("Exported model agrees with the .pt model"))
@@ -0,0 +1,121 @@
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from daemon.inference.backends import default_model_path, load_backend
+from daemon.inference.model_validation import compare_detections, load_sample_images, run_backend
+from daemon.inference.preprocessing import BatchBuffer
+
+
+class FrameCalibrationReader:
+    """Feeds letterboxed frames to the ONNX Runtime calibrator one at a time (a `CalibrationDataReader`)."""
+
+    def __init__(self, input_name: str, images: list):
+        self.input_name = input_name
+        self.images = iter(images)
+        self.batch_buffer = BatchBuffer(1)
+
+    def get_next(self):
+        image = next(self.images, None)
+        if image is None:
+            return None
+        return {self.input_name: self.batch_buffer.fill([image]).copy()}
+
+
+class Command(BaseCommand):
+    help = 'Quantize the ONNX export of NEURAL_PATH to INT8, calibrated on saved frames from MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', default=settings.MEDIA_ROOT,
+                            help='Directory with saved frames to calibrate and evaluate on')
+        parser.add_argument('--calibration-samples', type=int, default=300)
+        parser.add_argument('--holdout-samples', type=int, default=200)
+        parser.add_argument('--method', choices=('minmax', 'entropy', 'percentile'), default='percentile')
+        parser.add_argument('--quantize-head', action='store_true',
+                            help='Also quantize the detection head, which usually costs the most accuracy')
+        parser.add_argument('--conf', type=float, default=0.25)
+        parser.add_argument('--min-recall', type=float, default=0.9)
+
+    def handle(self, *args, **options):
+        import onnx
+        from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+
+        fp32_path = default_model_path('onnxruntime', settings.NEURAL_PATH)
+        int8_path = default_model_path('onnxruntime', settings.NEURAL_PATH, quantized=True)
+        if not os.path.exists(fp32_path):
+            raise CommandError(f"{fp32_path} not found, run `manage.py export_model --format onnx` first")
+
+        # Calibration and evaluation frames are disjoint, so the report is not measured on calibration data.
+        calibration_samples, holdout_samples = options['calibration_samples'], options['holdout_samples']
+        images = load_sample_images(options['images'], calibration_samples + holdout_samples)
+        calibration, holdout = images[:calibration_samples], images[calibration_samples:]
+        if not calibration or not holdout:
+            raise CommandError(f"Found {len(images)} frames in {options['images']}, "
+                               f"need both calibration and held-out frames")
+        self.stdout.write(f"Calibrating on {len(calibration)} frames, evaluating on {len(holdout)}")
+
+        preprocessed_path = f'{os.path.splitext(fp32_path)[0]}.preprocessed.onnx'
+        quant_pre_process(fp32_path, preprocessed_path)
+        model = onnx.load(preprocessed_path)
+        quantize_static(
+            preprocessed_path,
+            int8_path,
+            FrameCalibrationReader(model.graph.input[0].name, calibration),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method={
+                'minmax': CalibrationMethod.MinMax,
+                'entropy': CalibrationMethod.Entropy,
+                'percentile': CalibrationMethod.Percentile,
+            }[options['method']],
+            nodes_to_exclude=[] if options['quantize_head'] else self.head_nodes(model),
+        )
+        os.remove(preprocessed_path)
+        self.copy_metadata(fp32_path, int8_path)
+        self.stdout.write(f"Quantized model: {int8_path}")
+
+        fp32_time, reference = self.run(load_backend('onnxruntime', fp32_path, options['conf']), holdout)
+        int8_time, candidate = self.run(load_backend('onnxruntime', int8_path, options['conf']), holdout)
+        report = compare_detections(reference, candidate)
+
+        self.stdout.write(f"FP32 {fp32_time * 1e3:.1f} ms/frame, INT8 {int8_time * 1e3:.1f} ms/frame "
+                          f"({fp32_time / int8_time:.2f}x)")
+        self.stdout.write(f"INT8 vs FP32 on held-out frames: recall {report['recall']:.3f}, "
+                          f"precision {report['precision']:.3f}, mean IoU {report['mean_iou']:.3f}, "
+                          f"max confidence delta {report['max_conf_delta']:.3f}")
+        if report['recall'] < options['min_recall']:
+            raise CommandError(f"INT8 model reproduces only {report['recall']:.1%} of the FP32 detections")
+        self.stdout.write(self.style.SUCCESS("Set INFERENCE_BACKEND = 'onnxruntime' and INFERENCE_QUANTIZED = True "
+                                             "to run the quantized model"))
+
+    @staticmethod
+    def head_nodes(model) -> list:
+        """Names of the nodes in the last module of the network, the YOLOv8 Detect head."""
+        layers = {node.name: re.match(r'/model\.(\d+)/', node.name) for node in model.graph.node}
+        last = max(int(match.group(1)) for match in layers.values() if match)
+        return [name for name, match in layers.items() if match and int(match.group(1)) == last]
+
+    @staticmethod
+    def copy_metadata(source_path: str, target_path: str):
+        """Carry the class names and other export metadata over, the backend reads them from the model."""
+        import onnx
+
+        source, target = onnx.load(source_path), onnx.load(target_path)
+        existing = {prop.key for prop in target.metadata_props}
+        for prop in source.metadata_props:
+            if prop.key not in existing:
+                target.metadata_props.add(key=prop.key, value=prop.value)
+        onnx.save(target, target_path)
+
+    @staticmethod
+    def run(backend, images: list) -> tuple:
+        run_backend(backend, images[:1], 1)  # Warm up.
+        start = time.perf_counter()
+        detections = run_backend(backend, images, 1)
+        return (time.perf_counter() - start) / len(images), detections
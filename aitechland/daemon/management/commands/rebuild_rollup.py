@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from safety_detection.rollup import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute the hourly detection rollup behind the analysis dashboard from the Image table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        buckets = rebuild_rollup(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the detection rollup: {buckets} camera/class/hour buckets"))
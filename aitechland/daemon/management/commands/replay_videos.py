@@ -0,0 +1,120 @@
+import glob
+import multiprocessing
+import os
+import time
+
+from django import db
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from daemon.camera_processing.detection_saver import DetectionSaver
+from daemon.inference.backends import BACKENDS, configured_backend, default_model_path, load_backend
+from daemon.replay import ReplayPipeline, decode_videos
+from safety_detection.metadata_registry import metadata_registry
+
+VIDEO_EXTENSIONS = ('mp4', 'mkv', 'avi', 'mov', 'ts')
+
+
+class Command(BaseCommand):
+    help = 'Run the detection pipeline over recorded videos at full speed and save the alarms as replayed images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Video files or directories searched recursively')
+        parser.add_argument('--camera', required=True, help='IP address of the camera the footage belongs to')
+        parser.add_argument('--stride', type=int, default=5, help='Analyse every n-th frame of the videos')
+        parser.add_argument('--decoders', type=int, default=min(4, os.cpu_count() or 1),
+                            help='Processes decoding videos in parallel')
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'INFERENCE_MAX_BATCH_SIZE', 16))
+        parser.add_argument('--backend', choices=BACKENDS, default=None,
+                            help='Inference backend; INFERENCE_BACKEND by default')
+        parser.add_argument('--conf', type=float, default=0.6)
+        parser.add_argument('--start', default=None,
+                            help='Local date and time the footage of a single video starts at, e.g. '
+                                 '"2024-03-01 08:00:00"; by default its modification time less its duration')
+
+    def handle(self, *args, **options):
+        camera = metadata_registry.camera(options['camera'])
+        if camera is None:
+            raise CommandError(f"No camera with IP {options['camera']}")
+        videos = self.find_videos(options['paths'])
+        if not videos:
+            raise CommandError("No video files found")
+        if options['stride'] < 1:
+            raise CommandError("--stride must be at least 1")
+        start = None
+        if options['start']:
+            start = parse_datetime(options['start'])
+            if start is None:
+                raise CommandError(f"Invalid --start: {options['start']}")
+            if len(videos) > 1:
+                raise CommandError("--start needs a single video")
+            if timezone.is_naive(start):
+                start = timezone.make_aware(start)
+
+        if options['backend']:
+            backend_name = options['backend']
+            model_path = default_model_path(backend_name, settings.NEURAL_PATH)
+        else:
+            backend_name, model_path = configured_backend()
+        backend = load_backend(backend_name, model_path, options['conf'])
+        detection_saver = DetectionSaver(
+            settings.MEDIA_ROOT,
+            queue_size=getattr(settings, 'DETECTION_QUEUE_SIZE', 64),
+            encode_workers=getattr(settings, 'DETECTION_ENCODE_WORKERS', 2),
+            replayed=True,
+            block=True,
+        )
+        pipeline = ReplayPipeline(
+            backend, options['camera'], camera['rois'], detection_saver,
+            batch_size=options['batch_size'],
+            cooldown=getattr(settings, 'EVENT_COOLDOWN', 10),
+            max_duration=getattr(settings, 'EVENT_MAX_DURATION', 600),
+        )
+        for video_index, path in enumerate(videos):
+            pipeline.add_video(video_index, path, options['stride'], start)
+
+        # Bounded, so decoders wait for inference instead of filling the memory with frames.
+        frame_queue = multiprocessing.Queue(maxsize=options['batch_size'] * 4)
+        decoder_count = max(min(options['decoders'], len(videos)), 1)
+        # Forked children must not share the parent's database connections.
+        db.connections.close_all()
+        decoders = [multiprocessing.Process(target=decode_videos, name=f'replay-decoder-{index}', daemon=True,
+                                            args=(list(enumerate(videos))[index::decoder_count], options['stride'],
+                                                  camera['rois'], frame_queue))
+                    for index in range(decoder_count)]
+        for decoder in decoders:
+            decoder.start()
+
+        self.stdout.write(f"Replaying {len(videos)} videos with {decoder_count} decoders, every "
+                          f"{options['stride']} frames, {backend_name} backend")
+        start = time.perf_counter()
+        try:
+            pipeline.run(frame_queue, decoders, progress=self.report_video)
+        finally:
+            for decoder in decoders:
+                decoder.terminate()
+                decoder.join()
+            detection_saver.close()
+
+        elapsed = time.perf_counter() - start
+        frames = sum(video.frames for video in pipeline.videos.values())
+        events = sum(video.events for video in pipeline.videos.values())
+        self.stdout.write(self.style.SUCCESS(f"Analysed {frames} frames in {elapsed:.1f}s "
+                                             f"({frames / elapsed:.1f} frames/s), saved {events} alarms"))
+
+    def report_video(self, video):
+        self.stdout.write(f"{video.path}: {video.frames} frames, {video.events} alarms")
+
+    @staticmethod
+    def find_videos(paths: list) -> list:
+        videos = []
+        for path in paths:
+            if os.path.isdir(path):
+                videos.extend(sorted(found for extension in VIDEO_EXTENSIONS
+                                     for found in glob.glob(os.path.join(path, '**', f'*.{extension}'),
+                                                            recursive=True)))
+            elif os.path.isfile(path):
+                videos.append(path)
+        return videos
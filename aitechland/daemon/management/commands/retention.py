@@ -0,0 +1,122 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from daemon.camera_processing.media_store import MediaStore
+from safety_detection.models import Camera, DetectionClasses, Image
+from safety_detection.rollup import count_images, update_rollup
+
+
+def format_size(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TiB'
+
+
+class Command(BaseCommand):
+    help = 'Delete or archive alarm images older than their retention policy, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archive', action='store_true',
+                            help='Move files to IMAGE_ARCHIVE_ROOT and record the rows there instead of deleting')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between batches')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches; the next run resumes where this one stopped')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the images and the file sizes that would be removed')
+
+    def handle(self, *args, **options):
+        self.media_store = MediaStore(settings.MEDIA_ROOT)
+        self.archive_root = getattr(settings, 'IMAGE_ARCHIVE_ROOT', None) if options['archive'] else None
+        cameras = dict(Camera.objects.values_list('id', 'ip_address'))
+        classes = dict(DetectionClasses.objects.values_list('id', 'name'))
+        # Local midnight starting today; images older than the policy's days before it are removed.
+        today = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+
+        batches = total_rows = total_bytes = 0
+        for camera_id, camera_ip in cameras.items():
+            for class_id, class_name in classes.items():
+                cutoff = today - timedelta(days=self.retention_days(camera_ip, class_name))
+                expired = Image.objects.filter(camera_id=camera_id, class_name_id=class_id, created_at__lt=cutoff)
+                if options['dry_run']:
+                    rows = freed = 0
+                    for paths in expired.values_list('image_file', 'thumbnail_file').iterator(
+                            chunk_size=options['batch_size']):
+                        rows += 1
+                        freed += sum(self.media_store.size(path) for path in paths if path)
+                    if rows:
+                        self.stdout.write(f"{camera_ip} {class_name}: {rows} rows older than {cutoff.date()}, "
+                                          f"{format_size(freed)}")
+                    total_rows += rows
+                    total_bytes += freed
+                    continue
+
+                rows = freed = 0
+                while options['max_batches'] is None or batches < options['max_batches']:
+                    batch = list(expired.order_by('id').values('id', 'camera_id', 'class_name_id', 'image_file',
+                                                               'thumbnail_file', 'created_at')
+                                 [:options['batch_size']])
+                    if not batch:
+                        break
+                    freed += self.remove_batch(batch)
+                    rows += len(batch)
+                    batches += 1
+                    time.sleep(options['pause'])
+                if rows:
+                    self.stdout.write(f"{camera_ip} {class_name}: {rows} rows older than {cutoff.date()}, "
+                                      f"{format_size(freed)}")
+                total_rows += rows
+                total_bytes += freed
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"would remove {total_rows} images, would reclaim "
+                                                 f"{format_size(total_bytes)}"))
+            return
+        verb = 'archived' if self.archive_root else 'deleted'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total_rows} images, reclaimed {format_size(total_bytes)} "
+                                             f"in {batches} batches"))
+
+    @staticmethod
+    def retention_days(camera_ip: str, class_name: str) -> int:
+        """The longest of the camera's and the class's policies, or the default when neither is set."""
+        policies = [days for days in (getattr(settings, 'IMAGE_RETENTION_CAMERA_DAYS', {}).get(camera_ip),
+                                      getattr(settings, 'IMAGE_RETENTION_CLASS_DAYS', {}).get(class_name))
+                    if days is not None]
+        return max(policies) if policies else getattr(settings, 'IMAGE_RETENTION_DAYS', 90)
+
+    def remove_batch(self, batch: list) -> int:
+        """
+        Remove the files of a batch first, then its rows in one short transaction.
+
+        If the command stops in between, the rows are still there and the next run removes them;
+        files that are already gone are skipped.
+        """
+        freed = 0
+        for row in batch:
+            for path in (row['image_file'], row['thumbnail_file']):
+                if not path:
+                    continue
+                if self.archive_root:
+                    freed += self.media_store.archive(path, self.archive_root)
+                else:
+                    freed += self.media_store.delete(path)
+
+        if self.archive_root:
+            os.makedirs(self.archive_root, exist_ok=True)
+            with open(os.path.join(self.archive_root, 'images.jsonl'), 'a') as manifest:
+                for row in batch:
+                    manifest.write(json.dumps(row, default=str) + '\n')
+
+        with transaction.atomic():
+            Image.objects.filter(id__in=[row['id'] for row in batch]).delete()
+            update_rollup(count_images(batch), sign=-1)
+        return freed
@@ -0,0 +1,230 @@
+import bisect
+import logging
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(level=logging.INFO)
+
+PREFIX = 'aitech_'
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HELP = {
+    'capture_frames_grabbed_total': 'Frames grabbed from the camera stream.',
+    'capture_frames_retrieved_total': 'Grabbed frames converted to BGR for analysis.',
+    'capture_fps': 'Frames per second grabbed from the camera stream.',
+    'capture_grab_seconds': 'Time to grab (read and decode) one frame.',
+    'capture_retrieve_seconds': 'Time to convert one grabbed frame to BGR.',
+    'capture_reconnects_total': 'Reconnects to the camera stream.',
+    'camera_online': 'Whether the camera stream is online.',
+    'frames_processed_total': 'Frames that went through detection.',
+    'frames_skipped_total': 'Analysed frames that skipped detection, by reason.',
+    'preprocess_seconds': 'Time to crop and letterbox one frame.',
+    'inference_seconds': 'Round trip of one frame to the inference server.',
+    'inference_timeouts_total': 'Inference requests that timed out.',
+    'frame_errors_total': 'Frames whose processing failed with an error.',
+    'detections_dropped_total': 'Alarm images dropped, by queue.',
+    'persist_encode_seconds': 'Time from saving an alarm to its record being queued for the database.',
+    'encode_queue_depth': 'Alarm images waiting to be encoded.',
+    'db_insert_seconds': 'Time to insert one batch of Image rows.',
+    'db_rows_written_total': 'Image rows inserted.',
+    'record_queue_depth': 'Image records waiting to be inserted.',
+    'inference_queue_depth': 'Frames waiting for the inference server.',
+    'inference_frame_cost_seconds': 'Inference server time per frame.',
+    'inference_capacity_fps': 'Frames per second the inference budget allows.',
+    'inference_demand_fps': 'Frames per second the cameras ask for.',
+    'camera_interval_seconds': 'Seconds between analysed frames set by the scheduler.',
+    'camera_priority': 'Scheduler priority of the camera.',
+    'camera_lag_seconds': 'Time from sending a frame to the inference server to its answer.',
+    'worker_up': 'Whether the camera worker process is running.',
+    'worker_restarts': 'Consecutive restarts of the camera worker process.',
+}
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms of one process, keyed by name and labels.
+
+    Every daemon process has its own registry (`registry` below). Camera workers push snapshots of
+    theirs to the main process with a `MetricsPublisher`, where `MetricsServer` merges them.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts, made cumulative when rendered; the last one is +Inf.
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': {key: [list(counts), total, count] for key, (counts, total, count)
+                               in self.histograms.items()},
+                'buckets': self.buckets,
+            }
+
+
+registry = MetricsRegistry()
+
+
+class MetricsPublisher(threading.Thread):
+    """Pushes snapshots of this process's registry to the main daemon every `interval` seconds."""
+
+    def __init__(self, metrics_queue, source: str, interval: float = 5):
+        super().__init__(name='metrics-publisher', daemon=True)
+        self.metrics_queue = metrics_queue
+        self.source = source
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.publish()
+
+    def publish(self):
+        try:
+            self.metrics_queue.put_nowait((self.source, time.time(), registry.snapshot()))
+        except queue.Full:
+            pass
+
+    def stop(self):
+        self.stop_event.set()
+        self.publish()
+
+
+class MetricsServer:
+    """
+    Serves the merged metrics of the daemon in Prometheus text format on `http://host:port/metrics`.
+
+    Snapshots pushed by the camera workers replace the previous snapshot of the same worker; workers
+    that stopped reporting for `stale_after` seconds are dropped. The main process's own registry and
+    the `collectors`, callables run at scrape time that fill a registry with current values (queue
+    depths, scheduler state, worker status), are added on every scrape.
+    """
+
+    def __init__(self, metrics_queue, host: str = '127.0.0.1', port: int = 9108, collectors: list = None,
+                 stale_after: float = 60):
+        self.metrics_queue = metrics_queue
+        self.collectors = collectors or []
+        self.stale_after = stale_after
+        self.snapshots = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = server.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self._drain, name='metrics-drain', daemon=True).start()
+        threading.Thread(target=self.httpd.serve_forever, name='metrics-http', daemon=True).start()
+        logging.info(f"Serving metrics on http://{self.httpd.server_address[0]}:{self.httpd.server_address[1]}/metrics")
+
+    def _drain(self):
+        while not self.stop_event.is_set():
+            try:
+                source, reported_at, snapshot = self.metrics_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            with self.lock:
+                self.snapshots[source] = (reported_at, snapshot)
+
+    def render(self) -> str:
+        now = time.time()
+        with self.lock:
+            for source in [source for source, (reported_at, _) in self.snapshots.items()
+                           if now - reported_at > self.stale_after]:
+                del self.snapshots[source]
+            snapshots = [snapshot for _, snapshot in self.snapshots.values()]
+
+        scrape = MetricsRegistry(registry.buckets)
+        for collector in self.collectors:
+            try:
+                collector(scrape)
+            except Exception as e:
+                logging.error(f"Error collecting metrics: {e}")
+        return render(snapshots + [registry.snapshot(), scrape.snapshot()])
+
+    def stop(self):
+        self.stop_event.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{name}="{value}"' for name, value in labels + extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render(snapshots: list) -> str:
+    """Render registry snapshots in the Prometheus text exposition format."""
+    families = {}
+    for snapshot in snapshots:
+        for kind in ('counters', 'gauges'):
+            for (name, labels), value in snapshot[kind].items():
+                families.setdefault((name, kind), []).append(f'{PREFIX}{name}{_labels(labels)} {value}')
+        for (name, labels), (counts, total, count) in snapshot['histograms'].items():
+            lines = families.setdefault((name, 'histograms'), [])
+            cumulative = 0
+            for bound, bucket_count in zip(snapshot['buckets'] + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{PREFIX}{name}_bucket{_labels(labels, (("le", bound),))} {cumulative}')
+            lines.append(f'{PREFIX}{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{PREFIX}{name}_count{_labels(labels)} {count}')
+
+    types = {'counters': 'counter', 'gauges': 'gauge', 'histograms': 'histogram'}
+    output = []
+    for (name, kind), lines in sorted(families.items()):
+        if name in HELP:
+            output.append(f'# HELP {PREFIX}{name} {HELP[name]}')
+        output.append(f'# TYPE {PREFIX}{name} {types[kind]}')
+        output.extend(lines)
+    return '\n'.join(output) + '\n'
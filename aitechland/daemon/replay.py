@@ -0,0 +1,179 @@
+import logging
+import os
+import queue
+from datetime import datetime, timedelta
+
+import cv2
+from django.utils import timezone
+
+from daemon.camera_processing.event_aggregator import EventAggregator
+from daemon.camera_processing.frame_processor import FrameProcessor
+from daemon.camera_processing.roi_filter import ROIFilter
+from daemon.inference.detections import Detections
+from daemon.inference.inference_server import tracker_config, track
+from daemon.inference.preprocessing import BatchBuffer, LetterboxPreprocessor
+
+logging.basicConfig(level=logging.INFO)
+
+# What a decoder puts on the frame queue once its video is done, in place of a frame.
+END_OF_VIDEO = None
+
+
+def decode_video(video_index: int, path: str, stride: int, rois: list, frame_queue):
+    """
+    Decode every `stride`-th frame of a video, letterbox its ROI crops and queue them for inference.
+
+    Skipped frames are only grabbed, not converted. Items are (video index, frame number, frame,
+    regions, letterboxed crops); the last one carries `END_OF_VIDEO` as the frame number.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        logging.error(f"Cannot open video {path}")
+        frame_queue.put((video_index, END_OF_VIDEO, None, None, None))
+        return
+    roi_filter = ROIFilter(rois)
+    preprocessor = LetterboxPreprocessor()
+    frame_number = 0
+    try:
+        while capture.grab():
+            if frame_number % stride == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    regions = roi_filter.regions(frame.shape)
+                    # Copies: the preprocessor reuses its buffers for the next frame.
+                    letterboxed = [(buffer.copy(), scale, pad_x, pad_y) for buffer, scale, pad_x, pad_y
+                                   in (preprocessor.letterbox(frame[y0:y1, x0:x1], slot)
+                                       for slot, (x0, y0, x1, y1) in enumerate(regions))]
+                    frame_queue.put((video_index, frame_number, frame, regions, letterboxed))
+            frame_number += 1
+    finally:
+        capture.release()
+        frame_queue.put((video_index, END_OF_VIDEO, None, None, None))
+
+
+def decode_videos(videos: list, stride: int, rois: list, frame_queue):
+    """Decoder process: decode the (video index, path) pairs one after the other."""
+    for video_index, path in videos:
+        decode_video(video_index, path, stride, rois, frame_queue)
+
+
+def video_start(path: str, fps: float, frame_count: float) -> datetime:
+    """When recording of a video started, taken as its modification time less its duration."""
+    modified_at = datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.get_current_timezone())
+    return modified_at - timedelta(seconds=max(frame_count, 0) / fps)
+
+
+class VideoState:
+    """Trackers, incidents and counters of one video being replayed."""
+
+    def __init__(self, path: str, camera_ip: str, fps: float, stride: int, cooldown: float, max_duration: float,
+                 start: datetime):
+        self.path = path
+        self.fps = fps
+        self.start = start
+        self.stride = stride
+        self.trackers = {}
+        self.aggregator = EventAggregator(camera_ip, cooldown=cooldown, max_duration=max_duration)
+        self.frames = 0
+        self.events = 0
+
+
+class ReplayPipeline:
+    """
+    The daemon's detection pipeline, run offline over decoded video frames as fast as the model allows.
+
+    Frames of all videos are batched together for the backend; everything after inference (BYTETrack
+    per video and ROI crop, ROI filtering, incident aggregation, alarm images) is kept per video and
+    runs on video time, so cooldowns and incident lengths mean the same as on a live camera. Alarms
+    are saved with the time their incident began in the footage, counted from the video's `start`.
+    """
+
+    def __init__(self, backend, camera_ip: str, rois: list, detection_saver, batch_size: int = 16,
+                 cooldown: float = 10, max_duration: float = 600):
+        self.backend = backend
+        self.camera_ip = camera_ip
+        self.roi_filter = ROIFilter(rois)
+        self.detection_saver = detection_saver
+        self.batch_size = batch_size
+        self.cooldown = cooldown
+        self.max_duration = max_duration
+        self.batch_buffer = BatchBuffer(batch_size)
+        self.tracker_cfg = tracker_config()
+        self.videos = {}
+
+    def add_video(self, video_index: int, path: str, stride: int, start: datetime = None):
+        capture = cv2.VideoCapture(path)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25
+        frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        capture.release()
+        self.videos[video_index] = VideoState(path, self.camera_ip, fps, stride, self.cooldown, self.max_duration,
+                                              start or video_start(path, fps, frame_count))
+
+    def run(self, frame_queue, decoders: list, progress=None):
+        """Consume the decoders' frames until every video has ended; `progress` is called per finished video."""
+        remaining = len(self.videos)
+        pending = []
+        while remaining:
+            try:
+                item = frame_queue.get(timeout=0.1 if pending else 5)
+            except queue.Empty:
+                self._process(pending)
+                pending = []
+                if not any(decoder.is_alive() for decoder in decoders) and frame_queue.empty():
+                    logging.error("Decoders exited without finishing their videos")
+                    break
+                continue
+
+            video_index, frame_number, frame, regions, letterboxed = item
+            if frame_number is END_OF_VIDEO:
+                # Frames still pending for this video go first.
+                self._process(pending)
+                pending = []
+                self._finish(video_index)
+                remaining -= 1
+                if progress is not None:
+                    progress(self.videos[video_index])
+                continue
+            pending.append(item)
+            if sum(len(crops) for *_, crops in pending) >= self.batch_size:
+                self._process(pending)
+                pending = []
+        self._process(pending)
+
+    def _process(self, items: list):
+        crops = [buffer for *_, letterboxed in items for buffer, _, _, _ in letterboxed]
+        results = []
+        for start in range(0, len(crops), self.batch_size):
+            chunk = crops[start:start + self.batch_size]
+            results.extend(self.backend.predict(self.batch_buffer.fill(chunk)))
+
+        offset = 0
+        for video_index, frame_number, frame, regions, letterboxed in items:
+            video = self.videos[video_index]
+            region_boxes = [self._track(video, slot, result, buffer) for slot, (result, (buffer, _, _, _))
+                            in enumerate(zip(results[offset:offset + len(letterboxed)], letterboxed))]
+            offset += len(letterboxed)
+            boxes = FrameProcessor.merge_regions(regions, letterboxed, region_boxes)
+            boxes = self.roi_filter.filter_boxes(boxes, frame.shape)
+            video.frames += 1
+            self._save(video.aggregator.update(Detections(boxes, self.backend.names, frame),
+                                               now=frame_number / video.fps), video)
+
+    def _track(self, video: VideoState, slot: int, result, buffer):
+        from ultralytics.trackers.byte_tracker import BYTETracker
+
+        if len(result) and slot not in video.trackers:
+            frame_rate = max(round(video.fps / video.stride), 1)
+            video.trackers[slot] = BYTETracker(args=self.tracker_cfg, frame_rate=frame_rate)
+        return track(video.trackers.get(slot), result, buffer)
+
+    def _finish(self, video_index: int):
+        video = self.videos[video_index]
+        self._save(video.aggregator.close_all(), video)
+        video.trackers.clear()
+
+    def _save(self, events: list, video: VideoState):
+        for event in events:
+            video.events += 1
+            self.detection_saver.save_detection(event.best_detections.plot(conf=False), event.class_name,
+                                                event.camera_ip, video.start + timedelta(seconds=event.opened_at))
@@ -1,3 +1,272 @@
-from django.test import TestCase
+import json
+import os
+import queue
+import tempfile
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from daemon.camera_processing.detection_saver import DetectionWriter
+from daemon.camera_processing.event_aggregator import UNTRACKED, EventAggregator
+from daemon.camera_processing.frame_processor import FrameProcessor
+from daemon.camera_processing.roi_filter import ROIFilter, parse_roi_data
+from daemon.inference.detections import Detections
+from daemon.inference.frame_ring import FrameRing
+from daemon.inference.inference_server import UNREGISTER, InferenceService
+from daemon.inference.preprocessing import BatchBuffer, LetterboxPreprocessor
+from daemon.inference.scheduler import InferenceScheduler
+from daemon.replay import ReplayPipeline, video_start
+from daemon.tracing import tracer
+from safety_detection.models import DetectionRollup, Image
+from safety_detection.tests import AlarmDataTestCase, local
+
+
+class InferenceSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.scheduler = InferenceScheduler(active_interval=0.25, base_interval=1.0, idle_interval=5.0,
+                                            max_interval=30.0, idle_after=120, active_hold=30)
+        self.scheduler.register('10.0.0.1', now=0)
+
+    def test_active_camera_gets_active_interval(self):
+        self.scheduler.observe('10.0.0.1', 0, ['fire'], lag=0.1, now=1)
+        self.scheduler.rebalance(now=2)
+        self.assertEqual(self.scheduler.interval('10.0.0.1'), 0.25)
+
+    def test_quiet_camera_goes_idle(self):
+        self.scheduler.observe('10.0.0.1', 0, [], lag=0.1, now=1)
+        self.scheduler.rebalance(now=2)
+        self.assertEqual(self.scheduler.interval('10.0.0.1'), 1.0)
+        self.scheduler.observe('10.0.0.1', 0, [], lag=0.1, now=125)
+        self.scheduler.rebalance(now=125)
+        self.assertEqual(self.scheduler.interval('10.0.0.1'), 5.0)
+
+    def test_offline_camera_is_dropped_and_comes_back(self):
+        self.scheduler.observe('10.0.0.1', 0, ['fire'], lag=0.1, now=1)
+        self.scheduler.rebalance(now=2)
+
+        # No frames for longer than three maximum intervals.
+        self.scheduler.rebalance(now=200)
+        self.assertNotIn('10.0.0.1', self.scheduler.cameras)
+        self.assertEqual(self.scheduler.interval('10.0.0.1'), 1.0)
+
+        self.scheduler.observe('10.0.0.1', 0, ['smoke'], lag=0.1, now=201)
+        self.assertIn('10.0.0.1', self.scheduler.cameras)
+        self.scheduler.rebalance(now=202)
+        self.assertEqual(self.scheduler.interval('10.0.0.1'), 0.25)
+
+        # And it adapts again once the scene is quiet.
+        self.scheduler.observe('10.0.0.1', 0, [], lag=0.1, now=240)
+        self.scheduler.rebalance(now=240)
+        self.assertEqual(self.scheduler.interval('10.0.0.1'), 1.0)
+
+    def test_overload_sheds_lowest_priority_first(self):
+        self.scheduler.register('10.0.0.2', now=0)
+        self.scheduler.observe('10.0.0.1', 0, ['fire'], lag=0.1, now=1)
+        self.scheduler.observe('10.0.0.2', 0, [], lag=0.1, now=1)
+        # 0.2 s per frame: room for 4.5 frames/s, while the cameras want 4 + 1.
+        self.scheduler.observe_batch(0.2, 1)
+        self.scheduler.rebalance(now=2)
+        self.assertEqual(self.scheduler.interval('10.0.0.1'), 0.25)
+        self.assertAlmostEqual(self.scheduler.interval('10.0.0.2'), 2.0)
+        self.assertTrue(self.scheduler.cameras['10.0.0.2'].shed)
+
+
+NAMES = {0: 'smoke', 1: 'head', 2: 'fire'}
+
+
+def detections(*boxes):
+    """Detections of (class index, track id, confidence) boxes."""
+    return Detections(np.array([[0, 0, 10, 10, conf, cls, track_id] for cls, track_id, conf in boxes],
+                               dtype=np.float32).reshape(-1, 7), NAMES)
+
+
+class EventAggregatorTests(SimpleTestCase):
+    def setUp(self):
+        self.aggregator = EventAggregator('10.0.0.1', cooldown=10, max_duration=60)
+
+    def test_track_keeps_its_best_frame_until_cooldown(self):
+        best = detections((2, 1, 0.9))
+        self.assertEqual(self.aggregator.update(detections((2, 1, 0.7)), now=0), [])
+        self.aggregator.update(best, now=1)
+        self.aggregator.update(detections((2, 1, 0.8)), now=2)
+        self.assertEqual(self.aggregator.update(detections(), now=11), [])
+
+        [event] = self.aggregator.update(detections(), now=12)
+        self.assertEqual((event.class_name, event.track_id, event.frames, event.opened_at), ('fire', 1, 3, 0))
+        self.assertIs(event.best_detections, best)
+
+    def test_untracked_boxes_hand_over_to_the_first_track(self):
+        self.aggregator.update(detections((0, UNTRACKED, 0.7)), now=0)
+        self.aggregator.update(detections((0, 5, 0.8)), now=1)
+        self.aggregator.update(detections((0, UNTRACKED, 0.6)), now=2)
+        [event] = self.aggregator.close_all()
+        self.assertEqual((event.track_id, event.frames), (5, 3))
+
+    def test_long_incidents_close_after_max_duration(self):
+        for now in range(0, 60, 5):
+            self.assertEqual(self.aggregator.update(detections((1, 1, 0.7)), now=now), [])
+        self.assertEqual(len(self.aggregator.update(detections((1, 1, 0.7)), now=60)), 1)
+        self.assertEqual(len(self.aggregator.update(detections((1, 1, 0.7)), now=61)), 0)
+        self.assertEqual(len(self.aggregator.events), 1)
+
+
+class PreprocessingTests(SimpleTestCase):
+    def test_letterbox_round_trip(self):
+        image = np.zeros((480, 640, 3), np.uint8)
+        image[240:, 320:] = 255
+        buffer, scale, pad_x, pad_y = LetterboxPreprocessor().letterbox(image)
+        self.assertEqual((scale, pad_x, pad_y), (1.0, 0, 80))
+        self.assertTrue((buffer[:80] == 114).all() and (buffer[560:] == 114).all())
+        self.assertTrue((buffer[80 + 240:560, 320:] == 255).all())
+
+        boxes = np.array([[320, 320, 640, 560, 0.9, 2, 1]], dtype=np.float32)
+        LetterboxPreprocessor.unletterbox(boxes, scale, pad_x, pad_y)
+        np.testing.assert_array_equal(boxes[0, :4], [320, 240, 640, 480])
+
+    def test_batch_buffer_is_normalised_rgb(self):
+        image = np.zeros((640, 640, 3), np.uint8)
+        image[..., 2] = 255
+        batch = BatchBuffer(2).fill([image])
+        self.assertEqual(batch.shape, (1, 3, 640, 640))
+        self.assertTrue((batch[0, 0] == 1).all() and (batch[0, 1:] == 0).all())
+
+
+class InferenceServiceTests(SimpleTestCase):
+    def setUp(self):
+        self.service = InferenceService('ultralytics', 'model.pt', ring_slots=2)
+        self.addCleanup(self.service.manager.shutdown)
+
+    def test_restarted_workers_reuse_the_client(self):
+        client = self.service.client('10.0.0.1')
+        self.assertIs(self.service.client('10.0.0.1'), client)
+        ring = self.service.rings['10.0.0.1']
+        self.assertEqual(client.ring_name, ring.name)
+
+        self.service.release('10.0.0.1')
+        self.assertEqual(self.service.request_queue.get(timeout=5), (UNREGISTER, '10.0.0.1'))
+        self.assertNotIn('10.0.0.1', self.service.rings)
+        self.assertIsNot(self.service.client('10.0.0.1'), client)
+        self.service.release('10.0.0.1')
+
+    def test_new_writer_does_not_reuse_sequence_numbers(self):
+        ring = FrameRing(2)
+        self.addCleanup(ring.close)
+        sequence = ring.publish(0)
+        writer = FrameRing(2, name=ring.name)
+        writer.reset()
+        self.assertFalse(ring.is_current(0, sequence))
+        self.assertGreater(writer.publish(0), sequence)
+        writer.close()
+
+
+class FakeInferenceClient:
+    camera_ip = '10.0.0.1'
+    interval = None
+
+    def __init__(self):
+        self.frames = []
+
+    def frame_slot(self, slot):
+        return None
+
+    def infer_many(self, frames, seq=None):
+        self.frames.extend(frames)
+        return [Detections(np.zeros((0, 7), dtype=np.float32), NAMES, frame, seq) for frame in frames]
+
+
+class FakeDetectionSaver:
+    def __init__(self):
+        self.saved = []
+
+    def save_detection(self, frame, class_name, camera_ip, created_at=None, seq=None):
+        self.saved.append((class_name, camera_ip, created_at))
+
+
+class ROITests(SimpleTestCase):
+    def test_parse_roi_data(self):
+        rectangle = parse_roi_data(json.dumps([{'x': 10, 'y': 20, 'width': -5, 'height': 30}]))
+        np.testing.assert_array_equal(rectangle[0], [[5, 20], [10, 20], [10, 50], [5, 50]])
+        self.assertEqual(len(parse_roi_data("[{'points': [[0, 0], [10, 0], [10, 10]]}]")), 1)
+        # Degenerate polygons and unreadable data are ignored.
+        self.assertEqual(parse_roi_data(json.dumps([[[0, 0], [10, 0], [20, 0]]])), [])
+        self.assertEqual(parse_roi_data('not an roi'), [])
+
+    def test_regions_scale_and_merge(self):
+        roi_filter = ROIFilter([json.dumps([{'x': 0, 'y': 0, 'width': 100, 'height': 100},
+                                            {'x': 50, 'y': 50, 'width': 100, 'height': 100}])])
+        self.assertEqual(roi_filter.regions((960, 1280, 3)), [(0, 0, 301, 301)])
+        self.assertEqual(ROIFilter().regions((480, 640, 3)), [(0, 0, 640, 480)])
+
+    def test_rois_outside_the_frame_give_no_detections(self):
+        client = FakeInferenceClient()
+        roi_filter = ROIFilter([json.dumps([{'points': [[700, 500], [800, 500], [800, 600]]}])])
+        detections = FrameProcessor(client, 5, roi_filter=roi_filter)._detect(np.zeros((480, 640, 3), np.uint8))
+        self.assertEqual(len(detections), 0)
+        self.assertEqual(client.frames, [])
+
+    @mock.patch('daemon.replay.tracker_config', dict)
+    def test_replay_survives_rois_outside_the_frame(self):
+        saver = FakeDetectionSaver()
+        backend = mock.Mock(names=NAMES)
+        rois = [json.dumps([{'points': [[700, 500], [800, 500], [800, 600]]}])]
+        pipeline = ReplayPipeline(backend, '10.0.0.1', rois, saver)
+        pipeline.add_video(0, 'missing.mp4', 5, start=local(2024, 3, 1, 8))
+        frame = np.zeros((480, 640, 3), np.uint8)
+        regions = pipeline.roi_filter.regions(frame.shape)
+        self.assertEqual(regions, [])
+
+        pipeline._process([(0, 0, frame, regions, [])])
+        pipeline._finish(0)
+        self.assertEqual(pipeline.videos[0].frames, 1)
+        self.assertEqual(saver.saved, [])
+        backend.predict.assert_not_called()
+
+
+class TracingTests(SimpleTestCase):
+    def tearDown(self):
+        tracer.configure(False)
+        tracer.events.clear()
+
+    def test_frame_spans_carry_camera_and_seq(self):
+        tracer.configure(True)
+        frame = np.zeros((480, 640, 3), np.uint8)
+        detections = FrameProcessor(FakeInferenceClient(), 5, roi_filter=ROIFilter())._detect(frame, 7)
+        self.assertEqual(detections.seq, 7)
+        spans = {event['name']: event['args'] for event in tracer.trace_events() if event['ph'] == 'X'}
+        for name in ('preprocess', 'inference'):
+            self.assertEqual((spans[name]['camera'], spans[name]['seq']), ('10.0.0.1', 7))
+
+
+class ReplayTimeTests(AlarmDataTestCase):
+    def test_replayed_alarms_keep_the_footage_time(self):
+        created_at = local(2024, 3, 1, 8, 15, 30)
+        writer = DetectionWriter(queue.Queue(), replayed=True)
+        writer._save_to_database([('10.0.0.1', 'fire', 'alarm.jpeg', 'thumb.webp', created_at, None)])
+        image = Image.objects.get()
+        self.assertEqual(image.created_at, created_at)
+        self.assertEqual((image.create_date, image.create_time), (created_at.date(), created_at.time()))
+        self.assertTrue(image.replayed)
+        self.assertEqual(DetectionRollup.objects.get().hour, local(2024, 3, 1, 8))
+
+    def test_video_start_is_modification_time_less_duration(self):
+        with tempfile.NamedTemporaryFile(suffix='.mp4') as video:
+            ended_at = local(2024, 3, 1, 9)
+            os.utime(video.name, (ended_at.timestamp(), ended_at.timestamp()))
+            self.assertEqual(video_start(video.name, 25, 25 * 3600), ended_at - timedelta(hours=1))
+
+
+class RetentionTests(AlarmDataTestCase):
+    def test_dry_run_reports_the_space_it_would_reclaim(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with open(os.path.join(media_root, 'old.jpeg'), 'wb') as image_file:
+                image_file.write(b'x' * 2048)
+            image = self.add_image(local(2020, 1, 1), image_file='old.jpeg')
+            out = StringIO()
+            call_command('retention', dry_run=True, stdout=out)
+            self.assertIn('would remove 1 images, would reclaim 2.0 KiB', out.getvalue())
+            self.assertTrue(os.path.exists(os.path.join(media_root, 'old.jpeg')))
+            self.assertTrue(Image.objects.filter(id=image.id).exists())
@@ -0,0 +1,124 @@
+import collections
+import contextlib
+import json
+import logging
+import os
+import signal
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+# Entering it hands out a throwaway dict, like the args of a real span.
+NULL_SPAN = contextlib.nullcontext({})
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.monotonic_ns()
+        return self.args
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.tracer.record(self.name, self.start, time.monotonic_ns(), self.args)
+
+
+class Tracer:
+    """
+    Opt-in timeline of the stages a frame goes through in one process.
+
+    `span(name, **args)` times a block and yields its args, for values only known inside it. Spans
+    of one frame carry its `camera` and `seq`, the camera's grab count, so a dump links the
+    capture, infer and save spans of each frame. Finished spans go to a ring of the last `capacity`
+    spans, so memory stays bounded however long the daemon runs. While disabled `span` hands out a
+    shared no-op context and records nothing. `dump` writes the ring as Chrome trace JSON, which opens in
+    chrome://tracing and ui.perfetto.dev; timestamps come from the system-wide monotonic clock, so
+    dumps of several processes line up when merged.
+    """
+
+    def __init__(self, capacity: int = 20000):
+        self.enabled = False
+        self.directory = 'traces'
+        self.label = 'daemon'
+        self.events = collections.deque(maxlen=capacity)
+        self.thread_names = {}
+
+    def configure(self, enabled: bool, capacity: int = None, directory: str = None):
+        self.enabled = enabled
+        self.directory = directory or self.directory
+        if capacity is not None and capacity != self.events.maxlen:
+            self.events = collections.deque(maxlen=capacity)
+
+    def reset(self, label: str):
+        """Start an empty ring under a new process label; forked workers inherit their parent's spans."""
+        self.label = label
+        self.events.clear()
+        self.thread_names = {}
+
+    def span(self, name: str, **args):
+        return _Span(self, name, args) if self.enabled else NULL_SPAN
+
+    def record(self, name: str, start_ns: int, end_ns: int, args: dict = None):
+        thread_id = threading.get_native_id()
+        if thread_id not in self.thread_names:
+            self.thread_names[thread_id] = threading.current_thread().name
+        self.events.append((name, start_ns, end_ns - start_ns, thread_id, args))
+
+    def trace_events(self) -> list:
+        pid = os.getpid()
+        # Copying the deque is a single C call, so threads appending meanwhile cannot break it.
+        spans = tuple(self.events)
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': self.label}}]
+        events.extend({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': name}}
+                      for thread_id, name in list(self.thread_names.items()))
+        events.extend({'name': name, 'ph': 'X', 'ts': start / 1000, 'dur': duration / 1000, 'pid': pid,
+                       'tid': thread_id, 'args': args or {}}
+                      for name, start, duration, thread_id, args in spans)
+        return events
+
+    def dump(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'trace-{self.label}-{os.getpid()}.json')
+        events = self.trace_events()
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        os.replace(path + '.tmp', path)
+        logging.info(f"Dumped {len(events)} trace events to {path}")
+        return path
+
+    def install(self, on_signal=None):
+        """
+        Dump on SIGUSR1, after calling `on_signal` (the main daemon forwards the signal to its children).
+
+        Installed whether or not tracing is enabled, so the signal never falls back to its default
+        action, which would kill the process.
+        """
+        def handle(signum, frame):
+            if on_signal is not None:
+                on_signal()
+            if not self.enabled:
+                logging.info("Tracing is disabled, set TRACE_ENABLED to record spans")
+                return
+            try:
+                self.dump()
+            except OSError as e:
+                logging.error(f"Error dumping trace: {e}")
+
+        signal.signal(signal.SIGUSR1, handle)
+
+
+def merge_traces(paths: list) -> dict:
+    events = []
+    for path in paths:
+        with open(path) as f:
+            events.extend(json.load(f)['traceEvents'])
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+tracer = Tracer()
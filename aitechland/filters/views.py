@@ -1,26 +1,6 @@
 from django.http import JsonResponse
 from django.shortcuts import redirect
-from safety_detection.models import Permission
-
-
-def get_camera_info(user):
-    camera_info = {}
-    permissions = Permission.objects.filter(user_id=user.id)
-    for permission in permissions:
-        camera = permission.camera
-        camera_credential = camera.credential_for_ip
-        detect_names = list(camera.detect_names.values_list('name', flat=True))
-        # Retrieve the area name associated with the camera
-        area_name = camera.area_name if camera.area_name else None
-        camera_info[camera.ip_address] = {
-            'rtsp_port': camera.rtsp_port,
-            'channel_id': camera.channel_id,
-            'camera_login': camera_credential.camera_login,
-            'camera_password': camera_credential.camera_password,
-            'detect_names': detect_names,
-            'area_name': area_name,  # Include the area name in the dictionary
-        }
-    return camera_info
+from safety_detection.views import get_camera_info
 
 
 def get_camera_ips(request):
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SafetyDetectionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'safety_detection'
+
+    def ready(self):
+        # Connect the signal handlers that keep the metadata registry fresh.
+        from safety_detection import metadata_registry  # noqa: F401
@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from safety_detection.models import Camera, CameraCredential, DetectionClasses, ROICoordinates
+
+VERSION_KEY = 'metadata_registry_version'
+
+
+class MetadataRegistry:
+    """
+    In-process cache of the small camera and detection-class tables.
+
+    Lookups are served from a snapshot keyed by camera IP and by class name. Saving or deleting a
+    `Camera`, `CameraCredential`, `DetectionClasses` or `ROICoordinates` bumps a version number in the shared
+    `metadata` cache; every process compares its snapshot against that version at most once per
+    `check_interval` seconds and reloads the tables when it changed.
+    """
+
+    def __init__(self, cache_alias: str = 'metadata', check_interval: float = 5):
+        self.cache_alias = cache_alias
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        self._checked_at = 0.0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _get_snapshot(self) -> dict:
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < self.check_interval:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot is not None and now - self._checked_at < self.check_interval:
+                return self._snapshot
+            version = self.cache.get(VERSION_KEY, 0)
+            if self._snapshot is None or version != self._version:
+                self._snapshot = self._load()
+                self._version = version
+            self._checked_at = now
+            return self._snapshot
+
+    @staticmethod
+    def _load() -> dict:
+        cameras = {}
+        cameras_qs = Camera.objects.select_related('credential_for_ip').prefetch_related('detect_names',
+                                                                                        'roicoordinates_set')
+        for camera in cameras_qs:
+            credential = camera.credential_for_ip
+            cameras[camera.ip_address] = {
+                'id': camera.id,
+                'ip_address': camera.ip_address,
+                'area_name': camera.area_name,
+                'rtsp_port': camera.rtsp_port,
+                'channel_id': camera.channel_id,
+                'camera_login': credential.camera_login,
+                'camera_password': credential.camera_password,
+                'detect_names': [detection_class.name for detection_class in camera.detect_names.all()],
+                'is_run_daemon': camera.is_run_daemon,
+                'motion_threshold': camera.motion_threshold,
+                'dual_stream': camera.dual_stream,
+                'rois': [roi.roi_data for roi in camera.roicoordinates_set.all()],
+            }
+        classes = dict(DetectionClasses.objects.values_list('name', 'id'))
+        logging.debug(f"Metadata registry loaded {len(cameras)} cameras and {len(classes)} classes")
+        return {'cameras': cameras, 'classes': classes}
+
+    def camera(self, camera_ip: str):
+        return self._get_snapshot()['cameras'].get(camera_ip)
+
+    def cameras(self) -> dict:
+        return self._get_snapshot()['cameras']
+
+    def class_id(self, class_name: str):
+        return self._get_snapshot()['classes'].get(class_name)
+
+    def invalidate(self):
+        self._snapshot = None
+        try:
+            self.cache.incr(VERSION_KEY)
+        except ValueError:
+            self.cache.set(VERSION_KEY, 1, timeout=None)
+
+
+metadata_registry = MetadataRegistry()
+
+
+@receiver(post_save, sender=Camera)
+@receiver(post_delete, sender=Camera)
+@receiver(post_save, sender=CameraCredential)
+@receiver(post_delete, sender=CameraCredential)
+@receiver(post_save, sender=DetectionClasses)
+@receiver(post_delete, sender=DetectionClasses)
+@receiver(post_save, sender=ROICoordinates)
+@receiver(post_delete, sender=ROICoordinates)
+@receiver(m2m_changed, sender=Camera.detect_names.through)
+def invalidate_metadata_registry(sender, **kwargs):
+    metadata_registry.invalidate()
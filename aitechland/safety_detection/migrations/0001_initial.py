@@ -0,0 +1,98 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CameraCredential',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('credential_name', models.CharField(max_length=256, null=True)),
+                ('camera_login', models.CharField(max_length=256)),
+                ('camera_password', models.CharField(max_length=256)),
+            ],
+            options={
+                'db_table': 'camera_credential',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='CameraState',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('camera_ip', models.CharField(max_length=100, unique=True)),
+                ('state', models.CharField(default='Online', max_length=100)),
+                ('create_date', models.DateField(auto_now=True)),
+                ('create_time', models.TimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'camera_state',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='DetectionClasses',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+            ],
+            options={
+                'db_table': 'detection_class',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='Camera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area_name', models.CharField(max_length=256)),
+                ('ip_address', models.CharField(max_length=100)),
+                ('rtsp_port', models.IntegerField()),
+                ('channel_id', models.IntegerField()),
+                ('credential_for_ip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='safety_detection.cameracredential')),
+                ('detect_names', models.ManyToManyField(to='safety_detection.detectionclasses')),
+            ],
+            options={
+                'db_table': 'camera',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='Image',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_file', models.CharField(max_length=100)),
+                ('create_date', models.DateField(auto_now_add=True)),
+                ('create_time', models.TimeField(auto_now_add=True)),
+                ('camera', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='safety_detection.camera')),
+                ('class_name', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='safety_detection.detectionclasses')),
+            ],
+            options={
+                'db_table': 'image',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='Permission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('camera', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='safety_detection.camera')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'permission',
+                'managed': True,
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety_detection', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camera',
+            name='motion_threshold',
+            field=models.FloatField(default=0.005, help_text='Share of changed pixels that counts as motion and triggers detection. Lower is more sensitive; 0 runs detection on every analysed frame.'),
+        ),
+    ]
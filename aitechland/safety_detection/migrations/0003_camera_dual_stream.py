@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety_detection', '0002_camera_motion_threshold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camera',
+            name='dual_stream',
+            field=models.BooleanField(default=False, help_text='Run detection on the low-resolution sub-stream and take alarm images from the main stream.'),
+        ),
+    ]
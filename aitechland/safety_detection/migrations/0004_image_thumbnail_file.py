@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety_detection', '0003_camera_dual_stream'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='thumbnail_file',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety_detection', '0004_image_thumbnail_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='replayed',
+            field=models.BooleanField(default=False, help_text='Found by `manage.py replay_videos` in recorded footage rather than on the live stream.'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:38
+
+from datetime import datetime, time
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+
+def fill_rollup(apps, schema_editor):
+    Image = apps.get_model('safety_detection', 'Image')
+    DetectionRollup = apps.get_model('safety_detection', 'DetectionRollup')
+    groups = (Image.objects.annotate(hour=ExtractHour('create_time'))
+              .values('camera_id', 'class_name_id', 'create_date', 'hour')
+              .annotate(count=Count('id'))
+              .order_by())
+    DetectionRollup.objects.bulk_create(
+        [DetectionRollup(camera_id=group['camera_id'], class_name_id=group['class_name_id'],
+                         hour=timezone.make_aware(datetime.combine(group['create_date'], time(group['hour']))),
+                         count=group['count'])
+         for group in groups.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety_detection', '0005_image_replayed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('camera', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='safety_detection.camera')),
+                ('class_name', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='safety_detection.detectionclasses')),
+            ],
+            options={
+                'db_table': 'detection_rollup',
+                'managed': True,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='detectionrollup',
+            constraint=models.UniqueConstraint(fields=('camera', 'class_name', 'hour'), name='detection_rollup_unique'),
+        ),
+        migrations.RunPython(fill_rollup, migrations.RunPython.noop),
+    ]
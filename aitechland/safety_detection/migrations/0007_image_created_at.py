@@ -0,0 +1,64 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:41
+
+from datetime import datetime
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_created_at(apps, schema_editor):
+    Image = apps.get_model('safety_detection', 'Image')
+    connection = schema_editor.connection
+    table = connection.ops.quote_name(Image._meta.db_table)
+    last_id = 0
+    while True:
+        batch = list(Image.objects.filter(id__gt=last_id).order_by('id')
+                     .values_list('id', 'create_date', 'create_time')[:5000])
+        if not batch:
+            break
+        # A plain parameterised UPDATE per row: `bulk_update` spends far longer building its CASE than the
+        # database spends running it.
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {table} SET created_at = %s WHERE id = %s',
+                [(connection.ops.adapt_datetimefield_value(
+                    timezone.make_aware(datetime.combine(create_date, create_time))), image_id)
+                 for image_id, create_date, create_time in batch],
+            )
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety_detection', '0006_detection_rollup'),
+    ]
+
+    # The column is added empty, filled in batches and only then made required and indexed, so the
+    # indexes are built once over the filled table instead of being updated row by row.
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='image',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['created_at', 'id'], name='image_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['camera', 'created_at', 'id'], name='image_camera_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['class_name', 'created_at', 'id'], name='image_class_created_idx'),
+        ),
+    ]
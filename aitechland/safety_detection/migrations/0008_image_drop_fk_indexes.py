@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety_detection', '0007_image_created_at'),
+    ]
+
+    # The single-column foreign key indexes are prefixes of the created_at indexes; besides costing
+    # every insert, they tempt the planner into sorting when it has no statistics, so refresh those too.
+    operations = [
+        migrations.AlterField(
+            model_name='image',
+            name='camera',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='safety_detection.camera'),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='class_name',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='safety_detection.detectionclasses'),
+        ),
+        migrations.RunSQL('ANALYZE', migrations.RunSQL.noop),
+    ]
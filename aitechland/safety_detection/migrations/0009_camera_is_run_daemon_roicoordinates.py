@@ -0,0 +1,54 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_missing(apps, schema_editor):
+    # Databases set up from an earlier 0001_initial already have these; the committed database and
+    # others created before the ROI editor existed do not.
+    connection = schema_editor.connection
+    Camera = apps.get_model('safety_detection', 'Camera')
+    ROICoordinates = apps.get_model('safety_detection', 'ROICoordinates')
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        columns = [column.name for column in connection.introspection.get_table_description(
+            cursor, Camera._meta.db_table)]
+    if 'is_run_daemon' not in columns:
+        schema_editor.add_field(Camera, Camera._meta.get_field('is_run_daemon'))
+    if ROICoordinates._meta.db_table not in tables:
+        schema_editor.create_model(ROICoordinates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety_detection', '0008_image_drop_fk_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='camera',
+                    name='is_run_daemon',
+                    field=models.BooleanField(default=False),
+                ),
+                migrations.CreateModel(
+                    name='ROICoordinates',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False,
+                                                   verbose_name='ID')),
+                        ('roi_data', models.TextField(default='[]')),
+                        ('camera', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                     to='safety_detection.camera')),
+                    ],
+                    options={
+                        'db_table': 'roi_coordinates',
+                        'managed': True,
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_missing, migrations.RunPython.noop),
+    ]
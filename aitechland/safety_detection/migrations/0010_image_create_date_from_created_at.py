@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety_detection', '0009_camera_is_run_daemon_roicoordinates'),
+    ]
+
+    # Only `auto_now_add` goes, which the columns do not reflect; SQLite would rebuild the image table twice.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='image',
+                    name='create_date',
+                    field=models.DateField(editable=False),
+                ),
+                migrations.AlterField(
+                    model_name='image',
+                    name='create_time',
+                    field=models.TimeField(editable=False),
+                ),
+            ],
+        ),
+    ]
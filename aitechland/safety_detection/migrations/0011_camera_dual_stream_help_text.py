@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('safety_detection', '0010_image_create_date_from_created_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='camera',
+            name='dual_stream',
+            field=models.BooleanField(default=False, help_text='Run detection on the low-resolution sub-stream, which alarm images are then taken from too.'),
+        ),
+    ]
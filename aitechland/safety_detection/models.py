@@ -3,6 +3,7 @@ from django.contrib.auth.models import User as AuthUser
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django import forms
 
 
@@ -38,6 +39,13 @@ class Camera(models.Model):
     channel_id = models.IntegerField()
     credential_for_ip = models.ForeignKey(CameraCredential, on_delete=models.CASCADE)
     is_run_daemon = models.BooleanField(default=False)  # Add this line
+    motion_threshold = models.FloatField(
+        default=0.005,
+        help_text='Share of changed pixels that counts as motion and triggers detection. '
+                  'Lower is more sensitive; 0 runs detection on every analysed frame.')
+    dual_stream = models.BooleanField(
+        default=False,
+        help_text='Run detection on the low-resolution sub-stream, which alarm images are then taken from too.')
 
     def __str__(self):
         return f'{self.area_name} {self.ip_address}'
@@ -84,18 +92,60 @@ class Permission(models.Model):
 
 
 class Image(models.Model):
-    camera = models.ForeignKey(Camera, on_delete=models.CASCADE)
-    class_name = models.ForeignKey(DetectionClasses, on_delete=models.CASCADE)
+    # Indexed as the first column of the (camera|class_name, created_at, id) indexes below.
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE, db_index=False)
+    class_name = models.ForeignKey(DetectionClasses, on_delete=models.CASCADE, db_index=False)
     image_file = models.CharField(max_length=100)
-    create_date = models.DateField(auto_now_add=True)  # Separate field for date
-    create_time = models.TimeField(auto_now_add=True)  # Separate field for time
+    thumbnail_file = models.CharField(max_length=100, blank=True, default='')
+    replayed = models.BooleanField(
+        default=False,
+        help_text='Found by `manage.py replay_videos` in recorded footage rather than on the live stream.')
+    # Local date and time of `created_at`, filled by `set_local_time`.
+    create_date = models.DateField(editable=False)  # Separate field for date
+    create_time = models.TimeField(editable=False)  # Separate field for time
+    # The same moment as one indexed timestamp: what the alarm pages filter, sort and page on.
+    created_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f'Image for {self.camera} - Class: {self.class_name}'
 
+    def set_local_time(self):
+        """Fill `create_date` and `create_time` from `created_at`; `bulk_create` callers must call it themselves."""
+        created_at = timezone.localtime(self.created_at)
+        self.create_date, self.create_time = created_at.date(), created_at.time()
+
+    def save(self, *args, **kwargs):
+        self.set_local_time()
+        super().save(*args, **kwargs)
+
     class Meta:
         db_table = 'image'
         managed = True
+        # Newest alarms overall, of one camera or of one class, read backwards from an index in the
+        # (created_at, id) order the pages use, so neither the time nor the id tie-break needs a sort.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='image_created_idx'),
+            models.Index(fields=['camera', 'created_at', 'id'], name='image_camera_created_idx'),
+            models.Index(fields=['class_name', 'created_at', 'id'], name='image_class_created_idx'),
+        ]
+
+
+class DetectionRollup(models.Model):
+    """Number of `Image` rows per camera, class and hour, kept up to date as images are written and removed."""
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE)
+    class_name = models.ForeignKey(DetectionClasses, on_delete=models.CASCADE)
+    hour = models.DateTimeField()  # Start of the hour the images were taken in
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.camera} {self.class_name} {self.hour}: {self.count}'
+
+    class Meta:
+        db_table = 'detection_rollup'
+        managed = True
+        constraints = [
+            models.UniqueConstraint(fields=['camera', 'class_name', 'hour'], name='detection_rollup_unique'),
+        ]
 
 
 class CameraState(models.Model):
@@ -0,0 +1,171 @@
+import base64
+import hashlib
+import json
+import math
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+# Most values a partitioned page merges per-value queries for; SQLite allows 500 SELECTs in one statement.
+MAX_MERGED_PARTS = 100
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps([str(value) for value in values]).encode()).decode()
+
+
+def decode_cursor(cursor: str, fields: list):
+    """The key values in a cursor converted by their model `fields`, or None if it is not a valid cursor."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(fields) or None in values:
+            return None
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def seek(queryset, keys: tuple, values: list, older: bool):
+    """
+    Rows strictly after `values` in the newest-first order of `keys` (`older`), or strictly before it.
+
+    The redundant bound on the first key turns the OR of the tie-breaks into a filter on one index range
+    scan, which still returns rows in order; without it the database merges several scans and sorts.
+    """
+    lookup = 'lt' if older else 'gt'
+    condition = Q()
+    for index, key in enumerate(keys):
+        condition |= Q(**{k: v for k, v in zip(keys[:index], values)}, **{f'{key}__{lookup}': values[index]})
+    return queryset.filter(condition, **{f'{keys[0]}__{lookup}e': values[0]})
+
+
+def merged_sql(queryset, partition: tuple, order: list, limit: int) -> tuple:
+    """
+    SQL and params selecting the `order` keys of the first `limit` rows of `queryset` in `order`, as a
+    UNION ALL of one `LIMIT limit` query per value of the `partition` (field, values) pair.
+
+    Each part is an equality plus range seek that an index on (field, *order keys) returns in order, so
+    the database reads at most `limit` rows per value and merges those, where one query over every value
+    would sort all matching rows.
+    """
+    field, values = partition
+    connection = connections[queryset.db]
+    quote_name = connection.ops.quote_name
+    keys = [key.lstrip('-') for key in order]
+    parts, params = [], []
+    for index, value in enumerate(values):
+        part = queryset.filter(**{field: value}).order_by(*order).values_list(*keys)[:limit]
+        sql, part_params = part.query.get_compiler(queryset.db).as_sql()
+        parts.append(f'SELECT * FROM ({sql}) {quote_name(f"part{index}")}')
+        params.extend(part_params)
+    ordering = ', '.join(f"{quote_name(queryset.model._meta.get_field(key.lstrip('-')).column)} "
+                         f"{'DESC' if key.startswith('-') else 'ASC'}" for key in order)
+    return f"{' UNION ALL '.join(parts)} ORDER BY {ordering} LIMIT {int(limit)}", params
+
+
+def merged_rows(queryset, partition: tuple, order: list, limit: int) -> list:
+    """The first `limit` rows of a values() queryset in `order`, found with `merged_sql`; the last key is the pk."""
+    sql, params = merged_sql(queryset, partition, order, limit)
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        pks = [row[-1] for row in cursor.fetchall()]
+    pk_name = order[-1].lstrip('-')
+    rows = {row[pk_name]: row for row in queryset.filter(pk__in=pks)}
+    return [rows[pk] for pk in pks]
+
+
+def cached_count(queryset, timeout: int = 60) -> int:
+    """`count()` of the queryset, cached per query for `timeout` seconds, so paging does not recount."""
+    key = 'count:' + hashlib.sha1(str(queryset.query).encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class KeysetPage:
+    """
+    One page of rows ordered newest first by `keys`, found by seeking from the edge of the previous page.
+
+    Unlike `Paginator`, which counts and then skips `OFFSET` rows, every page costs one index range
+    scan of `per_page` rows, however deep it is. The links carry the keys of the first or last row
+    as an opaque cursor (`after`/`before`) plus the page number for display; `last` seeks from the
+    oldest end. The total, and so the number of pages, comes from a cached count and may lag behind
+    new rows by the cache timeout. `transform` turns each row into what the template shows.
+
+    `partition` is an optional (field, values) pair the queryset is limited to, such as the cameras a
+    user may see; the rows of each value are then sought separately and merged (see `merged_sql`).
+    The queryset must be a values() queryset whose last key is the primary key.
+    """
+
+    def __init__(self, queryset, keys: tuple, params, per_page: int = 20, count_timeout: int = 60,
+                 transform=None, partition: tuple = None):
+        self.keys = keys
+        self.per_page = per_page
+        self.partition = partition
+        self.count = cached_count(queryset, count_timeout)
+        self.num_pages = max(math.ceil(self.count / per_page), 1)
+        newest_first = [f'-{key}' for key in keys]
+        oldest_first = list(keys)
+
+        # A cursor that does not decode to valid keys (edited or truncated links) shows the first page.
+        fields = [queryset.model._meta.get_field(key) for key in keys]
+        after = decode_cursor(params.get('after', ''), fields)
+        before = decode_cursor(params.get('before', ''), fields)
+        rows = None
+        if after is not None:
+            rows = self.fetch(seek(queryset, keys, after, older=True), newest_first, per_page + 1)
+            self.has_previous, self.has_next = True, len(rows) > per_page
+            rows = rows[:per_page]
+        elif before is not None or params.get('last'):
+            newer_rows = seek(queryset, keys, before, older=False) if before is not None else queryset
+            rows = self.fetch(newer_rows, oldest_first, per_page + 1)
+            self.has_previous, self.has_next = len(rows) > per_page, before is not None
+            rows = rows[:per_page][::-1]
+            if before is not None and len(rows) < per_page:
+                # Reached the newest rows: show a full first page instead of a short one.
+                rows, before = None, None
+        if rows is None:
+            rows = self.fetch(queryset, newest_first, per_page + 1)
+            self.has_previous, self.has_next = False, len(rows) > per_page
+            rows = rows[:per_page]
+        self.first_cursor = encode_cursor([rows[0][key] for key in keys]) if rows else None
+        self.last_cursor = encode_cursor([rows[-1][key] for key in keys]) if rows else None
+        self.rows = [transform(row) for row in rows] if transform else rows
+
+        if params.get('last') and before is None:
+            self.number = self.num_pages
+        elif after is None and before is None:
+            self.number = 1
+        else:
+            try:
+                self.number = min(max(int(params.get('page', 1)), 1), self.num_pages)
+            except ValueError:
+                self.number = 1
+
+    def fetch(self, queryset, order: list, limit: int) -> list:
+        if self.partition is not None and 1 < len(self.partition[1]) <= MAX_MERGED_PARTS:
+            return merged_rows(queryset, self.partition, order, limit)
+        return list(queryset.order_by(*order)[:limit])
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def next_query(self) -> str:
+        return urlencode({'after': self.last_cursor, 'page': self.number + 1}) if self.last_cursor else ''
+
+    @property
+    def previous_query(self) -> str:
+        return urlencode({'before': self.first_cursor, 'page': self.number - 1}) if self.first_cursor else ''
+
+    @property
+    def last_query(self) -> str:
+        return urlencode({'last': 1})
@@ -0,0 +1,68 @@
+from collections import Counter
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from safety_detection.models import DetectionRollup, Image
+
+
+def hour_bucket(created_at: datetime) -> datetime:
+    """Start of the local hour an image was taken in."""
+    return timezone.localtime(created_at).replace(minute=0, second=0, microsecond=0)
+
+
+def count_images(rows) -> Counter:
+    """
+    Count images per (camera id, class id, hour).
+
+    `rows` are `Image` instances or dicts with camera_id, class_name_id and created_at.
+    """
+    counts = Counter()
+    for row in rows:
+        if isinstance(row, dict):
+            counts[row['camera_id'], row['class_name_id'], hour_bucket(row['created_at'])] += 1
+        else:
+            counts[row.camera_id, row.class_name_id, hour_bucket(row.created_at)] += 1
+    return counts
+
+
+def update_rollup(counts: Counter, sign: int = 1):
+    """
+    Add (`sign=1`) or subtract (`sign=-1`) per-hour image counts.
+
+    Meant to run in the transaction that inserts or deletes the images, so the rollup never drifts
+    from the table. Buckets that drop to zero are deleted.
+
+    When two writers add the first images of the same bucket at once, the second one's insert hits
+    the unique constraint; it is undone on its own savepoint, so the caller's images are kept, and
+    the count is added to the bucket the other writer created.
+    """
+    for (camera_id, class_id, hour), count in counts.items():
+        bucket = DetectionRollup.objects.filter(camera_id=camera_id, class_name_id=class_id, hour=hour)
+        if bucket.update(count=F('count') + sign * count) or sign < 0:
+            continue
+        try:
+            with transaction.atomic():
+                DetectionRollup.objects.create(camera_id=camera_id, class_name_id=class_id, hour=hour, count=count)
+        except IntegrityError:
+            bucket.update(count=F('count') + count)
+    if sign < 0:
+        DetectionRollup.objects.filter(count__lte=0).delete()
+
+
+def rebuild_rollup(batch_size: int = 1000) -> int:
+    """Recompute the whole rollup from `Image` with one grouped query; returns the number of buckets."""
+    groups = (Image.objects.annotate(hour=TruncHour('created_at'))
+              .values('camera_id', 'class_name_id', 'hour')
+              .annotate(count=Count('id'))
+              .order_by())
+    buckets = [DetectionRollup(camera_id=group['camera_id'], class_name_id=group['class_name_id'],
+                               hour=group['hour'], count=group['count'])
+               for group in groups.iterator()]
+    with transaction.atomic():
+        DetectionRollup.objects.all().delete()
+        DetectionRollup.objects.bulk_create(buckets, batch_size=batch_size)
+    return len(buckets)
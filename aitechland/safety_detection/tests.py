@@ -1,3 +1,202 @@
-from django.test import TestCase
+import base64
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from safety_detection.models import (Camera, CameraCredential, DetectionClasses, DetectionRollup, Image,
+                                     Permission)
+from safety_detection.pagination import KeysetPage, decode_cursor, encode_cursor, merged_rows
+from safety_detection.rollup import count_images, hour_bucket, rebuild_rollup, update_rollup
+from safety_detection.views import ALARM_COLUMNS, ALARM_ORDER_KEYS
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-default'},
+    'metadata': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-metadata'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AlarmDataTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        credential = CameraCredential.objects.create(credential_name='test', camera_login='admin',
+                                                     camera_password='admin')
+        cls.camera = Camera.objects.create(area_name='Yard', ip_address='10.0.0.1', rtsp_port=554, channel_id=1,
+                                           credential_for_ip=credential)
+        cls.other_camera = Camera.objects.create(area_name='Gate', ip_address='10.0.0.2', rtsp_port=554,
+                                                 channel_id=1, credential_for_ip=credential)
+        cls.fire = DetectionClasses.objects.create(name='fire')
+        cls.head = DetectionClasses.objects.create(name='head')
+
+    def setUp(self):
+        # Counts are cached per query, and the same queries run against different rows in each test.
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def add_image(self, created_at, camera=None, class_name=None, image_file='alarm.jpeg'):
+        return Image.objects.create(camera=camera or self.camera, class_name=class_name or self.fire,
+                                    image_file=image_file, created_at=created_at)
+
+
+def local(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class RollupTests(AlarmDataTestCase):
+    def test_hour_bucket_is_start_of_local_hour(self):
+        self.assertEqual(hour_bucket(local(2026, 10, 18, 14, 35, 12, 5)), local(2026, 10, 18, 14))
+
+    def test_count_images_groups_by_camera_class_and_hour(self):
+        images = [
+            Image(camera=self.camera, class_name=self.fire, created_at=local(2026, 10, 18, 14, 1)),
+            Image(camera=self.camera, class_name=self.fire, created_at=local(2026, 10, 18, 14, 59)),
+            Image(camera=self.camera, class_name=self.fire, created_at=local(2026, 10, 18, 15, 0)),
+            Image(camera=self.camera, class_name=self.head, created_at=local(2026, 10, 18, 14, 30)),
+        ]
+        rows = [{'camera_id': self.camera.id, 'class_name_id': self.fire.id, 'created_at': local(2026, 10, 18, 14)}]
+        self.assertEqual(count_images(images), Counter({
+            (self.camera.id, self.fire.id, local(2026, 10, 18, 14)): 2,
+            (self.camera.id, self.fire.id, local(2026, 10, 18, 15)): 1,
+            (self.camera.id, self.head.id, local(2026, 10, 18, 14)): 1,
+        }))
+        self.assertEqual(count_images(rows), Counter({(self.camera.id, self.fire.id, local(2026, 10, 18, 14)): 1}))
+
+    def test_update_rollup_adds_and_removes(self):
+        hour = local(2026, 10, 18, 14)
+        key = (self.camera.id, self.fire.id, hour)
+        update_rollup(Counter({key: 2}))
+        update_rollup(Counter({key: 3}))
+        self.assertEqual(DetectionRollup.objects.get(hour=hour).count, 5)
+        update_rollup(Counter({key: 4}), sign=-1)
+        self.assertEqual(DetectionRollup.objects.get(hour=hour).count, 1)
+        update_rollup(Counter({key: 1}), sign=-1)
+        self.assertFalse(DetectionRollup.objects.exists())
+
+    def test_concurrent_first_insert_keeps_the_images(self):
+        hour = local(2026, 10, 18, 14)
+        update = QuerySet.update
+        raced = []
+
+        def racing_update(queryset, **kwargs):
+            if queryset.model is DetectionRollup and not raced:
+                # Another writer creates the bucket between this UPDATE and the INSERT after it.
+                raced.append(True)
+                DetectionRollup.objects.create(camera=self.camera, class_name=self.fire, hour=hour, count=2)
+                return 0
+            return update(queryset, **kwargs)
+
+        with transaction.atomic(), mock.patch.object(QuerySet, 'update', racing_update):
+            image = self.add_image(local(2026, 10, 18, 14, 20))
+            update_rollup(count_images([image]))
+        self.assertTrue(raced)
+        self.assertTrue(Image.objects.filter(id=image.id).exists())
+        self.assertEqual(DetectionRollup.objects.get(hour=hour).count, 3)
+
+    def test_rebuild_matches_images(self):
+        self.add_image(local(2026, 10, 18, 14, 5))
+        self.add_image(local(2026, 10, 18, 14, 55))
+        self.add_image(local(2026, 10, 18, 15, 5), class_name=self.head)
+        self.add_image(local(2026, 10, 18, 15, 5), camera=self.other_camera)
+        DetectionRollup.objects.create(camera=self.camera, class_name=self.fire, hour=local(2020, 1, 1), count=9)
+
+        self.assertEqual(rebuild_rollup(), 3)
+        self.assertEqual(
+            set(DetectionRollup.objects.values_list('camera_id', 'class_name_id', 'hour', 'count')),
+            {(self.camera.id, self.fire.id, local(2026, 10, 18, 14), 2),
+             (self.camera.id, self.head.id, local(2026, 10, 18, 15), 1),
+             (self.other_camera.id, self.fire.id, local(2026, 10, 18, 15), 1)},
+        )
+
+
+class CursorTests(AlarmDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fields = [Image._meta.get_field(key) for key in ALARM_ORDER_KEYS]
+
+    def test_round_trip(self):
+        created_at = local(2026, 10, 18, 14, 35, 12, 5)
+        self.assertEqual(decode_cursor(encode_cursor([created_at, 42]), self.fields), [created_at, 42])
+
+    def test_invalid_cursors(self):
+        for cursor in ['', 'not base64!', base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+                       encode_cursor(['x', 'y']), encode_cursor([local(2026, 1, 1)]),
+                       base64.urlsafe_b64encode(json.dumps([None, None]).encode()).decode()]:
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor, self.fields))
+
+
+class AlarmPaginationTests(AlarmDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('operator', password='secret')
+        Permission.objects.create(user=self.user, camera=self.camera)
+        Permission.objects.create(user=self.user, camera=self.other_camera)
+        third_camera = Camera.objects.create(area_name='Roof', ip_address='10.0.0.3', rtsp_port=554, channel_id=1,
+                                             credential_for_ip=self.camera.credential_for_ip)
+        cameras = [self.camera, self.other_camera, third_camera]
+        start = local(2026, 10, 1)
+        for index in range(60):
+            # Every fifth alarm shares its time with the one before, so pages split between ties.
+            created_at = start + timedelta(minutes=index - index % 5 // 4)
+            self.add_image(created_at, camera=cameras[index % 3], image_file=f'{index}.jpeg')
+        self.expected = [f'/media/{name}' for name in
+                         Image.objects.filter(camera__in=cameras[:2]).order_by('-created_at', '-id')
+                         .values_list('image_file', flat=True)]
+        self.client.force_login(self.user)
+        self.url = reverse('safety_detection:alarm_index')
+
+    def get_page(self, query=''):
+        response = self.client.get(f'{self.url}?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj']
+
+    def test_next_and_previous_round_trip(self):
+        page = self.get_page()
+        pages = [page]
+        while page.has_next:
+            page = self.get_page(page.next_query)
+            pages.append(page)
+        self.assertEqual([row['image_link'] for page in pages for row in page], self.expected)
+        self.assertEqual([page.number for page in pages], [1, 2])
+        self.assertEqual(pages[-1].num_pages, 2)
+
+        back = self.get_page(pages[-1].previous_query)
+        self.assertEqual([row['image_link'] for row in back], [row['image_link'] for row in pages[0]])
+        self.assertFalse(back.has_previous)
+
+    def test_last_page(self):
+        page = self.get_page('last=1')
+        self.assertEqual([row['image_link'] for row in page], self.expected[20:])
+        self.assertFalse(page.has_next)
+
+    def test_bad_cursor_shows_first_page(self):
+        first = [row['image_link'] for row in self.get_page()]
+        for query in ['after=WyJ4IiwgInkiXQ==', 'before=WyJ4IiwgInkiXQ==', 'after=%%%', 'before=bnVsbA==',
+                      'after=WyIyMDI2LTEwLTAxIiwgIngiXQ==&page=x']:
+            with self.subTest(query=query):
+                page = self.get_page(query)
+                self.assertEqual([row['image_link'] for row in page], first)
+                self.assertEqual(page.number, 1)
+
+    def test_merged_partition_matches_single_query(self):
+        images = Image.objects.filter(camera__in=[self.camera, self.other_camera]).values(*ALARM_COLUMNS)
+        partition = ('camera_id', [self.camera.id, self.other_camera.id])
+        newest_first = ['-created_at', '-id']
+        self.assertEqual(merged_rows(images, partition, newest_first, 7),
+                         list(images.order_by(*newest_first)[:7]))
+        self.assertEqual(merged_rows(images, partition, ['created_at', 'id'], 7),
+                         list(images.order_by('created_at', 'id')[:7]))
+
+        plain = KeysetPage(images, ALARM_ORDER_KEYS, {}, per_page=5)
+        merged = KeysetPage(images, ALARM_ORDER_KEYS, {'after': plain.last_cursor, 'page': 2}, per_page=5,
+                            partition=partition)
+        self.assertEqual(merged.rows, list(images.order_by(*newest_first)[5:10]))
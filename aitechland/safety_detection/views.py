@@ -1,168 +1,209 @@
 import ast
+import csv
 import json
-from datetime import datetime
-from io import BytesIO
+import tempfile
+from datetime import datetime, timedelta
 
 import cv2
 import openpyxl
 from django.conf import settings
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
-from django.http import HttpResponse
+from django.db.models import Q, Sum
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.http.response import JsonResponse, HttpResponseBadRequest
 from django.shortcuts import render, get_object_or_404
+from django.utils import timezone
 
-from safety_detection.models import Permission, Image, CameraState, Camera, ROICoordinates
+from safety_detection.metadata_registry import metadata_registry
+from safety_detection.models import (Permission, Image, CameraState, Camera, ROICoordinates, DetectionClasses,
+                                     DetectionRollup)
+from safety_detection.pagination import KeysetPage
+
+# Newest alarms first; the id breaks ties between alarms saved in the same microsecond. Both are read
+# in order from the `created_at` indexes, which carry the id as well.
+ALARM_ORDER_KEYS = ('created_at', 'id')
+ALARM_COLUMNS = ('id', 'created_at', 'image_file', 'thumbnail_file',
+                 'camera__area_name', 'camera__ip_address', 'class_name__name')
 
 
 def get_camera_info(user):
     camera_info = {}
-    permissions = Permission.objects.filter(user_id=user.id)
-
-    # Filter permissions based on the provided cameraIP, if any
-
-    for permission in permissions:
-        camera = permission.camera
-        camera_credential = camera.credential_for_ip
-        detect_names = list(camera.detect_names.values_list('name', flat=True))
-        # Retrieve the area name associated with the camera
-        area_name = camera.area_name if camera.area_name else None
-        camera_info[camera.ip_address] = {
-            'rtsp_port': camera.rtsp_port,
-            'channel_id': camera.channel_id,
-            'camera_login': camera_credential.camera_login,
-            'camera_password': camera_credential.camera_password,
-            'detect_names': detect_names,
-            'area_name': area_name,  # Include the area name in the dictionary
+    camera_ips = Permission.objects.filter(user_id=user.id).values_list('camera__ip_address', flat=True)
+
+    for camera_ip in camera_ips:
+        camera = metadata_registry.camera(camera_ip)
+        if camera is None:
+            continue
+        camera_info[camera_ip] = {
+            'rtsp_port': camera['rtsp_port'],
+            'channel_id': camera['channel_id'],
+            'camera_login': camera['camera_login'],
+            'camera_password': camera['camera_password'],
+            'detect_names': camera['detect_names'],
+            'area_name': camera['area_name'] or None,  # Include the area name in the dictionary
         }
     return camera_info
 
 
+def latest_alarms(camera_ip, limit=9):
+    """The camera's newest images, read backwards from the (camera, created_at) index."""
+    camera = metadata_registry.camera(camera_ip)
+    if camera is None:
+        return Image.objects.none()
+    return (Image.objects.filter(camera_id=camera['id']).select_related('camera', 'class_name')
+            .order_by('-created_at', '-id')[:limit])
+
+
 def alarm_show(request, camera_ip):
     # Filter Image instances based on the camera_ip, ordered by creation date descending
-    images = Image.objects.filter(camera__ip_address=camera_ip).order_by('-create_date', '-create_time')[:9]
+    images = latest_alarms(camera_ip)
 
     # Constructing the list of dictionaries with related values
     image_data = []
     for image in images:
+        created_at = timezone.localtime(image.created_at)
         image_dict = {
             'object': image.camera.area_name,
             'camera_ip': image.camera.ip_address,
             'alarm': image.class_name.name,
-            'date': image.create_date,
-            'time': image.create_time,
+            'date': created_at.date(),
+            'time': created_at.time(),
             # Use the image filename directly as the link
-            'image_link': settings.MEDIA_URL + image.image_file
+            'image_link': settings.MEDIA_URL + image.image_file,
+            # Images saved before thumbnails existed fall back to the full image
+            'thumbnail_link': settings.MEDIA_URL + (image.thumbnail_file or image.image_file),
         }
         image_data.append(image_dict)
     # Convert list of dictionaries to JSON and return as response
     return JsonResponse(image_data, safe=False)
 
 
+def alarm_images(request, filter_param=None) -> tuple:
+    """
+    The images the alarm page lists, those matching the filter in the URL or else all of the user's
+    cameras, and the ids of the cameras they are limited to (None for any camera).
+    """
+    if not filter_param:
+        camera_ids = list(Permission.objects.filter(user_id=request.user.id).values_list('camera_id', flat=True))
+        return Image.objects.filter(camera_id__in=camera_ids), camera_ids
+
+    filter_param = ast.literal_eval(filter_param)
+    return filter_images(filter_param), filter_camera_ids(filter_param)
+
+
+def filter_camera_ids(filter_param: dict):
+    """Ids of the cameras picked in the alarm page filter, or None when it does not pick any."""
+    camera_ips = filter_param.get('cameraIP')
+    if not camera_ips:
+        return None
+    cameras = (metadata_registry.camera(ip) for ip in camera_ips)
+    return [camera['id'] for camera in cameras if camera is not None]
+
+
+def filter_images(filter_param: dict):
+    """
+    Images matching the alarm page filter.
+
+    Cameras and classes are looked up by id and the dates turned into a `created_at` range, so the
+    filters land on the image indexes instead of joins and per-row date functions.
+    """
+    camera_ids = filter_camera_ids(filter_param)
+    from_date = filter_param.get('fromDate')
+    to_date = filter_param.get('toDate')
+    detection_class = filter_param.get('detectionClass')
+
+    filters = Q()
+    if camera_ids is not None:
+        filters &= Q(camera_id__in=camera_ids)
+    if from_date:
+        filters &= Q(created_at__gte=timezone.make_aware(datetime.strptime(from_date, '%Y-%m-%d')))
+    if to_date:
+        # The whole of the last day.
+        filters &= Q(created_at__lt=timezone.make_aware(datetime.strptime(to_date, '%Y-%m-%d') + timedelta(days=1)))
+    if detection_class:
+        filters &= Q(class_name_id=metadata_registry.class_id(detection_class))
+    return Image.objects.filter(filters)
+
+
 def alarm_index(request, filter_param=None):
-    permissions = Permission.objects.filter(user_id=request.user.id)
-    camera_ids = [permission.camera.id for permission in permissions]
-
-    if filter_param:
-        filter_param = ast.literal_eval(filter_param)
-
-        camera_ip = filter_param.get('cameraIP')
-        from_date = filter_param.get('fromDate')
-        to_date = filter_param.get('toDate')
-        detection_class = filter_param.get('detectionClass')
-
-        filters = Q()
-        if camera_ip:
-            filters &= Q(camera__ip_address__in=camera_ip)
-        if from_date:
-            filters &= Q(create_date__gte=datetime.strptime(from_date, '%Y-%m-%d'))
-        if to_date:
-            filters &= Q(create_date__lte=datetime.strptime(to_date, '%Y-%m-%d'))
-        if detection_class:
-            filters &= Q(class_name__name=detection_class)
-
-        images = Image.objects.filter(filters)
-    else:
-        images = Image.objects.filter(camera_id__in=camera_ids)
+    # One joined query per page: only the listed columns, seeking from the previous page instead of OFFSET.
+    # Several cameras are first sought camera by camera and merged, so each reads its (camera, created_at)
+    # index instead of sorting every image of the cameras.
+    images, camera_ids = alarm_images(request, filter_param)
+    page = KeysetPage(images.values(*ALARM_COLUMNS), ALARM_ORDER_KEYS, request.GET, per_page=20,
+                      count_timeout=getattr(settings, 'ALARM_COUNT_CACHE_TIMEOUT', 60), transform=alarm_row,
+                      partition=('camera_id', camera_ids) if camera_ids else None)
+    return render(request, 'safety_detection/alarm.html', {'page_obj': page})
+
+
+def alarm_row(image: dict) -> dict:
+    created_at = timezone.localtime(image['created_at'])
+    return {
+        'object': image['camera__area_name'],
+        'camera_ip': image['camera__ip_address'],
+        'alarm': image['class_name__name'],
+        'date': created_at.date(),
+        'time': created_at.time(),
+        # Use the image filename directly as the link
+        'image_link': settings.MEDIA_URL + image['image_file'],
+        # Images saved before thumbnails existed fall back to the full image
+        'thumbnail_link': settings.MEDIA_URL + (image['thumbnail_file'] or image['image_file']),
+    }
 
-    image_data = []
-    for image in images:
-        image_dict = {
-            'object': image.camera.area_name,
-            'camera_ip': image.camera.ip_address,
-            'alarm': image.class_name.name,
-            'date': image.create_date,
-            'time': image.create_time,
-            # Use the image filename directly as the link
-            'image_link': settings.MEDIA_URL + image.image_file
-        }
-        image_data.append(image_dict)
 
-    paginator = Paginator(image_data, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+EXPORT_HEADER = ['Object', 'Camera IP', 'Alarm', 'Date', 'Time', 'Image Link']
 
-    return render(request, 'safety_detection/alarm.html',
-                  {'page_obj': page_obj, 'image_data': image_data})
 
+def export_queryset(images):
+    return images.order_by('-created_at', '-id').values_list(
+        'camera__area_name', 'camera__ip_address', 'class_name__name', 'created_at', 'image_file',
+    )
 
-def alarm_index_export(request, filter_param=None):
-    permissions = Permission.objects.filter(user_id=request.user.id)
-    camera_ids = [permission.camera.id for permission in permissions]
-
-    if filter_param:
-        filter_param = ast.literal_eval(filter_param)
-
-        camera_ip = filter_param.get('cameraIP')
-        from_date = filter_param.get('fromDate')
-        to_date = filter_param.get('toDate')
-        detection_class = filter_param.get('detectionClass')
-
-        filters = Q()
-        if camera_ip:
-            filters &= Q(camera__ip_address__in=camera_ip)
-        if from_date:
-            filters &= Q(create_date__gte=datetime.strptime(from_date, '%Y-%m-%d'))
-        if to_date:
-            filters &= Q(create_date__lte=datetime.strptime(to_date, '%Y-%m-%d'))
-        if detection_class:
-            filters &= Q(class_name__name=detection_class)
-
-        images = Image.objects.filter(filters)
-    else:
-        images = Image.objects.filter(camera_id__in=camera_ids)
 
-    image_data = []
-    for image in images:
-        image_dict = {
-            'object': image.camera.area_name,
-            'camera_ip': image.camera.ip_address,
-            'alarm': image.class_name.name,
-            'date': image.create_date,
-            'time': image.create_time,
-            # Use the image filename directly as the link
-            'image_link': settings.MEDIA_URL + image.image_file
-        }
-        image_data.append(image_dict)
+def export_rows(images):
+    """Export rows straight from a database cursor, so memory does not grow with the number of alarms."""
+    rows = export_queryset(images)
+    for area_name, camera_ip, class_name, created_at, image_file in rows.iterator(chunk_size=2000):
+        created_at = timezone.localtime(created_at)
+        yield [area_name, camera_ip, class_name, created_at.date(), created_at.time(), settings.MEDIA_URL + image_file]
 
-    # Create an Excel workbook and add data to it
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.append(['Object', 'Camera IP', 'Alarm', 'Date', 'Time', 'Image Link'])
-    for item in image_data:
-        worksheet.append(
-            [item['object'], item['camera_ip'], item['alarm'], item['date'], item['time'], item['image_link']])
 
-    # Save the workbook to a BytesIO buffer
-    excel_buffer = BytesIO()
-    workbook.save(excel_buffer)
+class Echo:
+    """File-like object that hands back what is written, for `csv.writer` feeding a streaming response."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def alarm_index_export(request, filter_param=None):
+    images, _ = alarm_images(request, filter_param)
 
-    # Create an HttpResponse with the Excel file as an attachment
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=alarm_data.xlsx'
-    response.write(excel_buffer.getvalue())
+    if request.GET.get('format') == 'csv':
+        # Streamed row by row: the first bytes leave before the query has been read to the end.
+        response = StreamingHttpResponse(stream_csv(export_rows(images)), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename=alarm_data.csv'
+        return response
 
-    return response
+    # A write-only workbook keeps rows on disk instead of building every cell in memory; the
+    # finished file is then streamed from disk in chunks.
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    worksheet.append(EXPORT_HEADER)
+    for row in export_rows(images):
+        worksheet.append(row)
+    excel_file = tempfile.TemporaryFile()
+    workbook.save(excel_file)
+    excel_file.seek(0)
+
+    return FileResponse(excel_file, as_attachment=True, filename='alarm_data.xlsx',
+                        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
 
 def monitoring_index(request):
@@ -174,13 +215,7 @@ def monitoring_index(request):
     camera_states = CameraState.objects.filter(camera_ip__in=camera_ips)
 
     # Get area names for each camera_ip
-    area_name_dict = {}
-    for camera_ip in camera_ips:
-        try:
-            camera = Camera.objects.get(ip_address=camera_ip)
-            area_name_dict[camera_ip] = camera.area_name
-        except Camera.DoesNotExist:
-            area_name_dict[camera_ip] = 'Unknown'
+    area_name_dict = {camera_ip: info['area_name'] or 'Unknown' for camera_ip, info in camera_info.items()}
 
     data = []
     for state in camera_states:
@@ -202,41 +237,32 @@ def monitoring_index(request):
 
 
 def analysis(request):
+    # Every count comes from the hourly rollup in one grouped query instead of scanning `image` per camera.
+    totals = (DetectionRollup.objects.values('camera_id', 'class_name__name')
+              .annotate(count=Sum('count')).order_by())
+    camera_counts = {}
+    class_counts = {name: 0 for name in DetectionClasses.objects.order_by('id').values_list('name', flat=True)}
+    for total in totals:
+        camera_counts.setdefault(total['camera_id'], {})[total['class_name__name']] = total['count']
+        class_counts[total['class_name__name']] = class_counts.get(total['class_name__name'], 0) + total['count']
+
     # Detection Statistics
-    detection_counts = list(Image.objects.values('class_name__name').annotate(count=Count('class_name__name')))
+    detection_counts = [{'class_name__name': name, 'count': count} for name, count in class_counts.items()]
 
     # Camera Overview with Alert Counts
-    cameras = Camera.objects.all()
-
-    # Initialize a list to store data for each camera
-    chart_data = []
-
-    for camera in cameras:
-        # Filter images for the current camera
-        camera_images = Image.objects.filter(camera=camera)
-
-        # Count detections for each type
-        head_count = camera_images.filter(class_name__name='head').count()
-        fire_count = camera_images.filter(class_name__name='fire').count()
-        smoke_count = camera_images.filter(class_name__name='smoke').count()
-
-        # Format the area_name and ip_address
-        area_name_ip = f"{camera.area_name} ({camera.ip_address})"
-
-        # Prepare data for the chart
-        chart_data.append({
-            'area_name_ip': area_name_ip,
-            'head_count': head_count,
-            'fire_count': fire_count,
-            'smoke_count': smoke_count
-        })
-
-    # Serialize chart_data to JSON
-    chart_data_json = json.dumps(chart_data)
+    cameras = list(Camera.objects.all())
+    chart_data = {
+        'classes': list(class_counts),
+        'cameras': [{
+            # Format the area_name and ip_address
+            'area_name_ip': f"{camera.area_name} ({camera.ip_address})",
+            'counts': {name: camera_counts.get(camera.id, {}).get(name, 0) for name in class_counts},
+        } for camera in cameras],
+    }
 
     context = {
         'detection_counts': detection_counts,
-        'chart_data_json': chart_data_json,  # Pass JSON string to template
+        'chart_data_json': json.dumps(chart_data),  # Pass JSON string to template
         'cameras': cameras,
     }
 